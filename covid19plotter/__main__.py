@@ -5,111 +5,87 @@ Covid19Plotter
 Module for plotting trends about the novel coronavirus in various locations.
 The data comes from John Hopkins University:
 https://github.com/CSSEGISandData/COVID-19
-"""
 
-from datetime import datetime
-import pandas as pd
+Run without any arguments for the interactive app (with ``--profile`` to time
+each stage, see :mod:`~covid19plotter.profiling`), or see
+:mod:`~covid19plotter.cli` for the command line interface.
+"""
 
+import sys
+
+from covid19plotter import cli
+
+from covid19plotter.charts import get_index
+from covid19plotter.charts import get_kind
+from covid19plotter.charts import get_plotter
+from covid19plotter.data import DatasetRegistry
+from covid19plotter.data.aggregates import COUNTRY_LEVEL
+from covid19plotter.data.sources import CONFIRMED
+from covid19plotter.data.sources import DATE_FORMAT
+from covid19plotter.data.sources import DEATHS
+from covid19plotter.data.sources import GLOBAL
+from covid19plotter.data.sources import RECOVERED
+from covid19plotter.data.sources import US
 from covid19plotter.mode import Mode
-from covid19plotter.plotters import Plotter
-from covid19plotter.plotters import USPlotter
+from covid19plotter.profiling import get_parser as get_profile_parser
+from covid19plotter.profiling import profile
 from covid19plotter.utils import DEFAULT_INPUT_ERROR
 from covid19plotter.utils import input_and_validate
 from covid19plotter.utils import input_with_prompt
 
-BASE_URL = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data" \
-           "/csse_covid_19_time_series/time_series_covid19_%s_%s.csv "
-
-DATE_FORMAT = "%m/%d/%y"
-
-GLOBAL = "global"
-US = "US"
-
-CONFIRMED = "confirmed"
-DEATHS = "deaths"
-RECOVERED = "recovered"
-
-COUNTRY = "Country/Region"
-
 
 class AppRunner:
     def __init__(self):
         print("Loading...")
-        self.global_confirmed_df = pd.read_csv(BASE_URL % (CONFIRMED, GLOBAL))
-        self.global_deaths_df = pd.read_csv(BASE_URL % (DEATHS, GLOBAL))
-        self.global_recoveries_df = pd.read_csv(BASE_URL % (RECOVERED, GLOBAL))
-        self.us_confirmed_df = pd.read_csv(BASE_URL % (CONFIRMED, US))
-        self.us_deaths_df = pd.read_csv(BASE_URL % (DEATHS, US))
-
-        dates = []
+        self._registry = DatasetRegistry()
 
-        for df in [self.global_confirmed_df, self.global_deaths_df,
-                   self.global_recoveries_df, self.us_confirmed_df,
-                   self.us_deaths_df]:
+        # Only the header lines are needed to know when the data was updated
+        last_updated = self._registry.get_last_updated()
+        print("Last Updated: %s\n" % last_updated.strftime(DATE_FORMAT))
 
-            dates.append(datetime.strptime(df.columns[-1], DATE_FORMAT))
-
-        print("Last Updated: %s\n" % max(dates).strftime(DATE_FORMAT))
+        # Warm up the data frames in the background while the user picks a
+        # mode, most commonly used first
+        self._registry.prefetch((CONFIRMED, GLOBAL), (CONFIRMED, US),
+                                (DEATHS, GLOBAL), (DEATHS, US),
+                                (RECOVERED, GLOBAL))
 
     def run(self):
         while True:
             mode = self._prompt_for_mode()
 
-            # Gets the global data frame based on the mode (confirmed cases,
+            # Gets the global index based on the mode (confirmed cases,
             # deaths, or recoveries)
-            global_df = self._get_global_df(mode)
+            global_index = self._get_global_index(mode)
 
             # Prompt user for country
-            country = self._prompt_for_country(global_df)
-
-            # There is a separate data frame for the US, so get the US data
-            # frame if appropriate, otherwise just use the global data frame
-            df = self._get_country_df(mode, country, global_df)
+            country = self._prompt_for_country(global_index)
 
-            if country == US and not Mode.is_recoveries_mode(mode):
-                plotter = USPlotter()
-            else:
-                plotter = Plotter()
+            # There is a separate file for the US, so get the US index if
+            # appropriate, otherwise just use the global index
+            index = get_index(self._registry, mode, country)
 
-            plotter.plot(df, mode, country)
+            plotter = get_plotter(mode, country)
+            plotter.plot(index, mode, country)
 
-    def _get_global_df(self, mode):
+    def _get_global_index(self, mode):
         """
-        Gets the global :class:`~pd.DataFrame` associated with the given mode.
+        Gets the global :class:`~covid19plotter.data.AggregateIndex` associated
+        with the given mode.
 
         Args:
             mode (int): Plotting mode.
 
         Returns:
-            :class:`~pd.DataFrame`
+            :class:`~covid19plotter.data.AggregateIndex`
         """
 
-        if Mode.is_deaths_mode(mode):
-            return self.global_deaths_df
-        elif Mode.is_recoveries_mode(mode):
-            return self.global_recoveries_df
-        return self.global_confirmed_df
+        kind = get_kind(mode)
 
-    def _get_country_df(self, mode, country, global_df):
-        """
-        Gets the :class:`~pd.DataFrame` for the given country.
-
-        Args:
-            mode (int): Plotting mode.
-            country (str): Country to plot.
-            global_df (:class:`~pd.DataFrame`): :class:`~pd.DataFrame` for the
-                whole world.
-
-        Returns:
-            :class:`~pd.DataFrame`
-        """
+        if not Mode.is_recoveries_mode(mode):
+            # The US data frame for the same mode is likely to be needed next
+            self._registry.prefetch((kind, US))
 
-        if country == US and not Mode.is_recoveries_mode(mode):
-            if Mode.is_deaths_mode(mode):
-                return self.us_deaths_df
-            return self.us_confirmed_df
-        else:
-            return global_df[global_df[COUNTRY] == country]
+        return self._registry.get(kind, GLOBAL)
 
     def _prompt_for_mode(self):
         """
@@ -135,13 +111,13 @@ class AppRunner:
 
         return int(mode)
 
-    def _prompt_for_country(self, global_df):
+    def _prompt_for_country(self, global_index):
         """
         Gets the desired country/region from the user.
 
         Args:
-            global_df (:class:`~pd.DataFrame`): `~pd.DataFrame` for non-US
-                countries.
+            global_index (:class:`~covid19plotter.data.AggregateIndex`): Index
+                for non-US countries.
 
         Returns:
             str
@@ -150,10 +126,17 @@ class AppRunner:
         prompt = "Which country do you want to view? (Type OPTIONS to " \
                  "see all available options)"
 
-        return input_and_validate(
-            prompt=prompt, options=global_df[COUNTRY].tolist())
+        countries = global_index.get_option_index(COUNTRY_LEVEL)
+
+        return input_and_validate(prompt=prompt, options=countries)
 
 
 if __name__ == "__main__":
-    plotter = AppRunner()
-    plotter.run()
+    options, args = get_profile_parser().parse_known_args(sys.argv[1:])
+
+    if args:
+        sys.exit(cli.main(sys.argv[1:]))
+
+    with profile(options.profile):
+        plotter = AppRunner()
+        plotter.run()
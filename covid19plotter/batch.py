@@ -0,0 +1,656 @@
+"""
+Batch Rendering
+===============
+
+Renders many charts to image files without any interaction. Charts are drawn
+with the Agg canvas directly, so no windows are opened. Each type of plot gets
+a template figure, set up once (see :mod:`~covid19plotter.plots.base`), and
+every chart only updates the lines, titles and limits of the template of its
+type, so neither time nor memory is spent building figures for every chart.
+
+Large batches can be split across a pool of worker processes with
+:class:`ParallelRenderer`. Everything the charts need is loaded once in the
+parent process before the pool starts, and the rolling statistics they plot
+(e.g. the daily changes and their moving averages) are computed there too;
+where processes are forked, the workers share that data with the parent
+(copy-on-write) instead of each loading, computing or receiving their own
+copy. Each worker renders whole chunks of charts onto its
+own reused figure, and the results come back in the order of the specs.
+
+A chart that cannot be rendered (e.g. its location is not in the data) does
+not stop the batch: its error is recorded in its :class:`RenderResult`, and
+the rest of the charts are still rendered.
+
+Usage::
+
+    python -m covid19plotter.batch specs.json --out charts --format svg \\
+        --processes 4
+
+where ``specs.json`` is a list of charts, e.g.::
+
+    [{"mode": "new-deaths", "country": "US", "state": "Michigan",
+      "region": "Detroit", "per_capita": true},
+     {"mode": "total-confirmed", "country": "Italy", "path": "italy.png"}]
+
+A chart can also compare several locations of the same country on one figure
+(see :mod:`~covid19plotter.plots.comparison`), e.g.::
+
+    {"mode": "new-deaths", "country": "US", "state": "Michigan",
+     "compare": [{"region": "Detroit"}, {"county": "Kent"}],
+     "normalize": "peak", "align": true}
+
+where each compared location fills in the parts of the chart's location it
+adds (with no country, the compared locations are countries).
+
+With ``--compare-templates``, the charts are rendered both with a new figure
+for each chart and with the templates, and the time per chart of each is
+printed.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+from matplotlib import rc_context
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from covid19plotter.charts import ChartSpec
+from covid19plotter.charts import get_dataset_key
+from covid19plotter.charts import get_index
+from covid19plotter.charts import get_plotter
+from covid19plotter.data import DatasetRegistry
+from covid19plotter.data import Location
+from covid19plotter.data.stats import ONE_WEEK
+from covid19plotter.mode import Mode
+from covid19plotter.plots import ComparisonPlot
+from covid19plotter.profiling import timed
+
+PNG = "png"
+SVG = "svg"
+FORMATS = [PNG, SVG]
+
+DEFAULT_OUTPUT_DIR = "."
+
+# Leave the creation date out of SVG files and use a fixed salt for their
+# element ids, so rendering the same chart twice gives identical files
+SVG_METADATA = {"Date": None}
+SVG_HASH_SALT = "covid19plotter"
+
+# Longest file name written for a chart without a path, without the extension,
+# and the length of the hash ending longer names
+MAX_NAME_LENGTH = 200
+HASH_LENGTH = 8
+
+# Part of the file names of charts per 100,000 people
+PER_CAPITA_NAME = "per-100k"
+
+FORK = "fork"
+
+# Number of chunks each worker process gets on average, so that workers that
+# finish early can pick up more work
+CHUNKS_PER_PROCESS = 4
+
+# Renderer of a worker process of a ParallelRenderer
+_worker_renderer = None
+
+# Indexes inherited by worker processes when they are forked
+_shared_indexes = None
+
+RenderResult = namedtuple("RenderResult",
+                          ["spec", "path", "seconds", "error"])
+RenderResult.__new__.__defaults__ = (None,)
+RenderResult.__doc__ = """
+Result of rendering a single chart: its spec, the file it was written to, how
+long it took to render, and the message of the error that stopped it from
+being rendered, or None if it was rendered.
+"""
+
+
+class BatchRenderer:
+    """
+    BatchRenderer class. See module documentation for more information.
+
+    Attributes:
+        _registry (:class:`~covid19plotter.data.DatasetRegistry`): Registry
+            to get the data from.
+        _output_dir (str): Directory charts without a path are written to.
+        _format (str): Format of charts without a path ("png" or "svg").
+        _reuse_templates (bool): Whether template figures are reused across
+            charts, rather than a new figure being built for each chart.
+    """
+
+    def __init__(self, registry=None, output_dir=DEFAULT_OUTPUT_DIR,
+                 fmt=PNG, reuse_templates=True):
+        self._registry = registry or DatasetRegistry()
+        self._output_dir = output_dir
+        self._format = fmt
+        self._reuse_templates = reuse_templates
+
+    def render(self, specs):
+        """
+        Renders the given charts to files.
+
+        Args:
+            specs (list): :class:`~covid19plotter.charts.ChartSpec` of each
+                chart.
+
+        Returns:
+            list: :class:`RenderResult` of each chart, including those that
+            could not be rendered.
+        """
+
+        os.makedirs(self._output_dir, exist_ok=True)
+
+        templates = {}
+        results = []
+
+        try:
+            for spec in specs:
+                start = time.perf_counter()
+                path = None
+                error = None
+
+                try:
+                    path = spec.path or self._get_path(spec)
+                    self.render_one(templates, spec, path)
+                except Exception as e:
+                    error = _get_error(e)
+
+                    # The chart may have been left half drawn on its template,
+                    # so the templates are set up again for the next charts
+                    for fig in templates.values():
+                        fig.clf()
+
+                    templates.clear()
+
+                results.append(RenderResult(spec, path,
+                                            time.perf_counter() - start,
+                                            error))
+        finally:
+            for fig in templates.values():
+                fig.clf()
+
+        return results
+
+    def render_one(self, templates, spec, path):
+        """
+        Renders a single chart onto the template figure of its type of plot
+        and saves it.
+
+        Args:
+            templates (dict): Template figures keyed by the type of plot, see
+                :meth:`draw_template`.
+            spec (:class:`~covid19plotter.charts.ChartSpec`): Chart to render.
+            path (str): Path of the file to write.
+        """
+
+        fmt = os.path.splitext(path)[1][1:].lower() or self._format
+
+        fig = self.draw_template(templates, spec)
+        save_figure(fig, path, fmt)
+
+    def draw_template(self, templates, spec):
+        """
+        Draws a single chart onto the template figure of its type of plot,
+        without saving it. The template is created and set up the first time
+        its type of plot is drawn, and only updated after that.
+
+        Args:
+            templates (dict): Template figures keyed by the type of plot. New
+                templates are added to it.
+            spec (:class:`~covid19plotter.charts.ChartSpec`): Chart to draw.
+
+        Returns:
+            :class:`~matplotlib.figure.Figure`: The template the chart was
+            drawn onto.
+        """
+
+        plotter = get_plotter(spec.mode, spec.location.country)
+
+        # The lines of a comparison depend on the locations compared, so it is
+        # drawn again from scratch on its template every time
+        if spec.compare:
+            plot_type = ComparisonPlot
+        else:
+            plot_type = type(plotter.get_plot(spec.mode))
+
+        fig = templates.get(plot_type) if self._reuse_templates else None
+
+        if fig is None:
+            fig = Figure()
+            FigureCanvasAgg(fig)
+            self.draw(fig, spec)
+            templates[plot_type] = fig
+        elif spec.compare:
+            self.draw(fig, spec)
+        else:
+            self.draw(fig, spec, update=True)
+
+        return fig
+
+    def draw(self, fig, spec, update=False):
+        """
+        Draws a single chart onto the given figure, without saving it.
+
+        Args:
+            fig (:class:`~matplotlib.figure.Figure`): Figure to draw onto. It
+                is cleared first, unless updating it.
+            spec (:class:`~covid19plotter.charts.ChartSpec`): Chart to draw.
+            update (bool): Whether the figure already holds the same type of
+                plot, which is then only updated with the data of this chart.
+        """
+
+        country = spec.location.country
+
+        index = get_index(self._registry, spec.mode, country)
+        plotter = get_plotter(spec.mode, country)
+
+        if not update:
+            fig.clf()
+
+        if spec.compare:
+            plotter.compare(fig, index, spec.mode, spec.location, spec.compare,
+                            spec.normalize, spec.align, spec.per_capita)
+        else:
+            plotter.draw(fig, index, spec.mode, spec.location, update,
+                         spec.per_capita)
+
+    def _get_path(self, spec):
+        """
+        Gets the path of the file to write the given chart to, based on its
+        mode and location.
+
+        Args:
+            spec (:class:`~covid19plotter.charts.ChartSpec`): Chart to render.
+
+        Returns:
+            str
+        """
+
+        parts = [Mode.get_name(spec.mode)] + \
+                [part for part in spec.location if part]
+
+        if spec.per_capita:
+            parts.append(PER_CAPITA_NAME)
+
+        if spec.compare:
+            parts += ["vs"] + [_get_name(location)
+                               for location in spec.compare]
+
+        name = "_".join(re.sub(r"[^\w.-]+", "-", part) for part in parts)
+
+        # Keep long comparisons within the limits of file names
+        if len(name) > MAX_NAME_LENGTH:
+            digest = hashlib.sha1(name.encode()).hexdigest()[:HASH_LENGTH]
+            name = "%s_%s" % (name[:MAX_NAME_LENGTH - HASH_LENGTH - 1],
+                              digest)
+
+        return os.path.join(self._output_dir, "%s.%s" % (name, self._format))
+
+
+class ParallelRenderer:
+    """
+    ParallelRenderer class. See module documentation for more information.
+
+    Attributes:
+        _registry (:class:`~covid19plotter.data.DatasetRegistry`): Registry
+            to get the data from.
+        _output_dir (str): Directory charts without a path are written to.
+        _format (str): Format of charts without a path ("png" or "svg").
+        _processes (int): Maximum number of worker processes.
+        _chunk_size (int): Number of charts sent to a worker at a time, or None
+            to choose it based on the number of charts.
+    """
+
+    def __init__(self, registry=None, output_dir=DEFAULT_OUTPUT_DIR,
+                 fmt=PNG, processes=None, chunk_size=None):
+        self._registry = registry or DatasetRegistry()
+        self._output_dir = output_dir
+        self._format = fmt
+        self._processes = processes or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+
+    def render(self, specs):
+        """
+        Renders the given charts to files, in parallel.
+
+        Args:
+            specs (list): :class:`~covid19plotter.charts.ChartSpec` of each
+                chart.
+
+        Returns:
+            list: :class:`RenderResult` of each chart, in the same order as
+            ``specs``, including those that could not be rendered.
+        """
+
+        global _shared_indexes
+
+        all_specs = list(specs)
+
+        # Load everything up front so the workers never load anything. Charts
+        # of files that cannot be loaded fail without being sent to a worker
+        keys = sorted(set(get_dataset_key(spec.mode, spec.location.country)
+                          for spec in all_specs))
+        errors = {}
+
+        for key in keys:
+            try:
+                self._registry.get(*key)
+            except Exception as e:
+                errors[key] = _get_error(e)
+
+        specs = [spec for spec in all_specs
+                 if get_dataset_key(spec.mode, spec.location.country)
+                 not in errors]
+
+        if not specs:
+            return [RenderResult(spec, None, 0, errors[get_dataset_key(
+                spec.mode, spec.location.country)]) for spec in all_specs]
+
+        indexes = self._registry.get_loaded()
+        _compute_stats(indexes, specs)
+
+        processes = min(self._processes, len(specs))
+        chunk_size = self._chunk_size or \
+            int(math.ceil(len(specs) / (processes * CHUNKS_PER_PROCESS)))
+        chunks = [specs[i:i + chunk_size]
+                  for i in range(0, len(specs), chunk_size)]
+
+        if FORK in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context(FORK)
+            _shared_indexes = indexes
+            initargs = (self._output_dir, self._format, None)
+        else:
+            # Each worker gets its own copy of the indexes, once
+            context = multiprocessing.get_context()
+            initargs = (self._output_dir, self._format, indexes)
+
+        os.makedirs(self._output_dir, exist_ok=True)
+
+        try:
+            with context.Pool(processes, _init_worker, initargs) as pool:
+                results = pool.map(_render_chunk, chunks, chunksize=1)
+        finally:
+            _shared_indexes = None
+
+        rendered = iter([result for chunk in results for result in chunk])
+        all_results = []
+
+        for spec in all_specs:
+            key = get_dataset_key(spec.mode, spec.location.country)
+
+            if key in errors:
+                all_results.append(RenderResult(spec, None, 0, errors[key]))
+            else:
+                all_results.append(next(rendered))
+
+        return all_results
+
+
+@timed("save")
+def save_figure(fig, f, fmt):
+    """
+    Saves the given figure, so that saving the same chart always gives the
+    same output.
+
+    Args:
+        fig (:class:`~matplotlib.figure.Figure`): Figure to save.
+        f (str or file): Path or file-like object to write to.
+        fmt (str): Image format (e.g. "png" or "svg").
+    """
+
+    if fmt == SVG:
+        with rc_context({"svg.hashsalt": SVG_HASH_SALT}):
+            fig.savefig(f, format=fmt, metadata=SVG_METADATA)
+    else:
+        fig.savefig(f, format=fmt)
+
+
+def _get_name(location):
+    """
+    Gets the most specific part of the given location.
+
+    Args:
+        location (:class:`~covid19plotter.data.aggregates.Location`): Location
+            to name.
+
+    Returns:
+        str
+    """
+
+    return [part for part in location if part][-1]
+
+
+def _get_error(e):
+    """
+    Gets the message of an error that stopped a chart from being rendered. The
+    message, rather than the exception, is kept so results can be sent back
+    from worker processes.
+
+    Args:
+        e (Exception): Error raised while rendering.
+
+    Returns:
+        str
+    """
+
+    message = str(e)
+
+    if message:
+        return "%s: %s" % (type(e).__name__, message)
+    return type(e).__name__
+
+
+def _compute_stats(indexes, specs):
+    """
+    Computes the rolling statistics the given charts need, so that the workers
+    of a :class:`ParallelRenderer` share them rather than each computing their
+    own copy.
+
+    Args:
+        indexes (dict): Loaded indexes keyed by (kind, region).
+        specs (list): :class:`~covid19plotter.charts.ChartSpec` of each chart.
+    """
+
+    for spec in specs:
+        index = indexes[get_dataset_key(spec.mode, spec.location.country)]
+
+        try:
+            stats = index.get_per_capita_stats() if spec.per_capita else \
+                index.stats
+        except ValueError:
+            # Left for the chart to report
+            continue
+
+        for daily in [False, True]:
+            stats.get_starting_days(daily)
+
+        if Mode.is_new_mode(spec.mode):
+            stats.get_daily()
+            stats.get_mean(ONE_WEEK, center=True)
+
+
+def _init_worker(output_dir, fmt, indexes):
+    """
+    Sets up the renderer of a worker process of a :class:`ParallelRenderer`.
+
+    Args:
+        output_dir (str): Directory charts without a path are written to.
+        fmt (str): Format of charts without a path ("png" or "svg").
+        indexes (dict): Loaded indexes keyed by (kind, region), or None to use
+            the ones inherited from the parent process.
+    """
+
+    global _worker_renderer
+
+    if indexes is None:
+        indexes = _shared_indexes
+
+    registry = DatasetRegistry(indexes=indexes)
+    _worker_renderer = BatchRenderer(registry, output_dir, fmt)
+
+
+def _render_chunk(specs):
+    """
+    Renders a chunk of charts in a worker process of a
+    :class:`ParallelRenderer`.
+
+    Args:
+        specs (list): :class:`~covid19plotter.charts.ChartSpec` of each
+            chart.
+
+    Returns:
+        list: :class:`RenderResult` of each chart.
+    """
+
+    return _worker_renderer.render(specs)
+
+
+def print_report(results):
+    """
+    Prints how long each chart took to render, and in total.
+
+    Args:
+        results (list): :class:`RenderResult` of each chart.
+    """
+
+    for result in results:
+        if result.error:
+            print("%8.3fs  error: %s" % (result.seconds, result.error))
+        else:
+            print("%8.3fs  %s" % (result.seconds, result.path))
+
+    total = sum(result.seconds for result in results)
+    mean = total / len(results) if results else 0
+
+    print("%d charts in %.3fs (%.3fs per chart)" % (len(results), total, mean))
+
+
+def compare_templates(specs, output_dir=DEFAULT_OUTPUT_DIR, fmt=PNG):
+    """
+    Renders the given charts twice, first building a new figure for every
+    chart and then reusing template figures, to measure the speedup of the
+    templates. The data is loaded before either run.
+
+    Args:
+        specs (list): :class:`~covid19plotter.charts.ChartSpec` of each
+            chart.
+        output_dir (str): Directory charts without a path are written to.
+        fmt (str): Format of charts without a path ("png" or "svg").
+
+    Returns:
+        tuple: :class:`RenderResult` of each chart without and with templates.
+    """
+
+    registry = DatasetRegistry()
+
+    for key in sorted(set(get_dataset_key(spec.mode, spec.location.country)
+                          for spec in specs)):
+        registry.get(*key)
+
+    results = []
+
+    for reuse_templates in (False, True):
+        renderer = BatchRenderer(registry, output_dir, fmt, reuse_templates)
+        results.append(renderer.render(specs))
+
+    return tuple(results)
+
+
+def print_comparison(baseline, results):
+    """
+    Prints how long each chart took to render without and with templates, and
+    the speedup.
+
+    Args:
+        baseline (list): :class:`RenderResult` of each chart without
+            templates.
+        results (list): :class:`RenderResult` of each chart with templates.
+    """
+
+    for before, after in zip(baseline, results):
+        print("%8.3fs %8.3fs  %s" % (before.seconds, after.seconds,
+                                     after.path or "error: " + after.error))
+
+    before = sum(result.seconds for result in baseline)
+    after = sum(result.seconds for result in results)
+    count = len(results) or 1
+
+    print("%d charts: %.3fs per chart without templates, %.3fs with "
+          "templates (%.2fx)" % (len(results), before / count, after / count,
+                                 before / after if after else 0))
+
+
+def load_specs(path):
+    """
+    Loads chart specs from the given JSON file.
+
+    Args:
+        path (str): Path of the JSON file.
+
+    Returns:
+        list: :class:`~covid19plotter.charts.ChartSpec` of each chart.
+    """
+
+    with open(path) as f:
+        items = json.load(f)
+
+    specs = []
+
+    for item in items:
+        location = Location(item.get("country"), item.get("state"),
+                            item.get("region"), item.get("county"))
+        compare = item.get("compare")
+
+        if compare:
+            compare = [location._replace(**parts) for parts in compare]
+
+        specs.append(ChartSpec(Mode.from_name(str(item["mode"])), location,
+                               item.get("path"), compare,
+                               item.get("normalize"),
+                               item.get("align", False),
+                               item.get("per_capita", False)))
+
+    return specs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Renders COVID-19 charts to image files.")
+    parser.add_argument("specs", help="JSON file listing the charts")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_DIR,
+                        help="directory to write the charts to")
+    parser.add_argument("--format", default=PNG, choices=FORMATS,
+                        help="image format of the charts")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="number of processes to render with (0 for one "
+                             "per CPU)")
+    parser.add_argument("--compare-templates", action="store_true",
+                        help="render every chart without and with template "
+                             "figures, and print the speedup")
+    args = parser.parse_args()
+
+    if args.compare_templates:
+        print_comparison(*compare_templates(load_specs(args.specs), args.out,
+                                            args.format))
+        sys.exit()
+
+    if args.processes == 1:
+        renderer = BatchRenderer(output_dir=args.out, fmt=args.format)
+    else:
+        renderer = ParallelRenderer(output_dir=args.out, fmt=args.format,
+                                    processes=args.processes)
+
+    results = renderer.render(load_specs(args.specs))
+    print_report(results)
+
+    if any(result.error for result in results):
+        sys.exit(1)
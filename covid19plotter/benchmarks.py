@@ -0,0 +1,499 @@
+"""
+Benchmarks
+==========
+
+Benchmarks of the hot paths of the app: parsing a time series file, building
+its aggregates, filtering and summing rows, computing rolling statistics,
+validating a county typed at a prompt, ranking every county, and rendering
+charts. They run against synthetic files with the same layout as the JHU ones,
+with any number of rows (locations) and date columns (days), so performance
+work can be measured at the sizes that matter rather than at the size of
+today's files.
+
+Each benchmark is timed over several runs, and then run once more with
+:mod:`tracemalloc` to record the peak memory it allocates (as traced by
+Python, which includes NumPy arrays). The results are written to a JSON file.
+Given the results of an earlier run as a baseline, any benchmark that got
+slower, or needs more memory, by more than the tolerance is flagged as a
+regression, and the exit status is 1.
+
+Usage::
+
+    python -m covid19plotter.benchmarks --locations 3000 --days 400 \\
+        --out baseline.json
+
+    python -m covid19plotter.benchmarks --locations 3000 --days 400 \\
+        --out results.json --baseline baseline.json
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.batch import BatchRenderer
+from covid19plotter.batch import PNG
+from covid19plotter.batch import save_figure
+from covid19plotter.charts import ChartSpec
+from covid19plotter.data import AggregateIndex
+from covid19plotter.data import DatasetRegistry
+from covid19plotter.data import Location
+from covid19plotter.data import SeriesMatrix
+from covid19plotter.data.aggregates import COUNTY_LEVEL
+from covid19plotter.data.rankings import GROWTH
+from covid19plotter.data.rankings import rank
+from covid19plotter.data.sources import CONFIRMED
+from covid19plotter.data.sources import COUNTRY
+from covid19plotter.data.sources import COUNTY
+from covid19plotter.data.sources import GLOBAL
+from covid19plotter.data.sources import STATE
+from covid19plotter.data.sources import US
+from covid19plotter.data.sources import US_COUNTRY
+from covid19plotter.data.sources import US_STATE
+from covid19plotter.data.stats import ONE_WEEK
+from covid19plotter.data.stats import RollingStats
+from covid19plotter.data.stream import read_matrix
+from covid19plotter.mode import Mode
+from covid19plotter.regions import REGIONS
+from covid19plotter.utils import OptionIndex
+from covid19plotter.utils import input_and_validate
+
+DEFAULT_LOCATIONS = 3000
+DEFAULT_DAYS = 365
+DEFAULT_REPEAT = 5
+
+# Fraction by which a benchmark can be slower, or use more memory, than the
+# baseline before it is flagged
+DEFAULT_TOLERANCE = 0.2
+
+FIRST_DAY = datetime(2020, 1, 22)
+SEED = 0
+
+NUM_STATES = 50
+
+# Every other country of the global file is split into this many provinces
+PROVINCES_PER_COUNTRY = 4
+
+# State whose counties are named after those of its regions, so that regions
+# are aggregated too
+REGIONS_STATE = "Michigan"
+
+
+def get_labels(days):
+    """
+    Gets the date columns of a time series file with the given number of days,
+    written the way the JHU files write them (e.g. "3/21/20").
+
+    Args:
+        days (int): Number of days.
+
+    Returns:
+        list
+    """
+
+    labels = []
+
+    for day in range(days):
+        date = FIRST_DAY + timedelta(days=day)
+        labels.append("%d/%d/%s" % (date.month, date.day, date.strftime("%y")))
+
+    return labels
+
+
+def get_values(rng, locations, days):
+    """
+    Gets random running totals for the given number of locations and days.
+
+    Args:
+        rng (:class:`~np.random.RandomState`): Random number generator.
+        locations (int): Number of locations.
+        days (int): Number of days.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    # Daily increases that ramp up over time, at a different rate everywhere
+    rates = rng.gamma(1.0, 20.0, size=(locations, 1))
+    ramp = np.linspace(0, 1, days)
+
+    return rng.poisson(rates * ramp).cumsum(axis=1)
+
+
+def make_global_frame(locations, days, rng):
+    """
+    Makes a data frame laid out like the global time series files.
+
+    Args:
+        locations (int): Number of rows.
+        days (int): Number of days.
+        rng (:class:`~np.random.RandomState`): Random number generator.
+
+    Returns:
+        :class:`~pd.DataFrame`
+    """
+
+    states = []
+    countries = []
+    number = 0
+
+    while len(countries) < locations:
+        country = "Country %d" % number
+
+        if number % 2:
+            for i in range(PROVINCES_PER_COUNTRY):
+                states.append("%s Province %d" % (country, i))
+                countries.append(country)
+        else:
+            states.append(np.nan)
+            countries.append(country)
+
+        number += 1
+
+    columns = {STATE: states[:locations], COUNTRY: countries[:locations],
+               "Lat": rng.uniform(-90, 90, locations),
+               "Long": rng.uniform(-180, 180, locations)}
+    meta = pd.DataFrame(columns, columns=list(columns))
+    values = pd.DataFrame(get_values(rng, locations, days),
+                          columns=get_labels(days))
+
+    return pd.concat([meta, values], axis=1)
+
+
+def make_us_frame(locations, days, rng):
+    """
+    Makes a data frame laid out like the US time series files, with counties
+    spread evenly over the states.
+
+    Args:
+        locations (int): Number of rows (counties).
+        days (int): Number of days.
+        rng (:class:`~np.random.RandomState`): Random number generator.
+
+    Returns:
+        :class:`~pd.DataFrame`
+    """
+
+    region_counties = [county for counties in REGIONS[REGIONS_STATE].values()
+                       for county in counties]
+
+    states = []
+    counties = []
+
+    for i in range(locations):
+        state = i % NUM_STATES
+        number = i // NUM_STATES
+
+        if state == 0:
+            states.append(REGIONS_STATE)
+        else:
+            states.append("State %d" % state)
+
+        if state == 0 and number < len(region_counties):
+            counties.append(region_counties[number])
+        else:
+            counties.append("County %d" % number)
+
+    fips = 1000 * (np.arange(locations) % NUM_STATES + 1) + \
+        np.arange(locations) // NUM_STATES
+
+    columns = {
+        "UID": 84000000 + fips,
+        "iso2": US,
+        "iso3": "USA",
+        "code3": 840,
+        "FIPS": fips.astype(np.float64),
+        COUNTY: counties,
+        US_STATE: states,
+        US_COUNTRY: US,
+        "Lat": rng.uniform(20, 70, locations),
+        "Long_": rng.uniform(-160, -70, locations),
+        "Combined_Key": ["%s, %s, %s" % (county, state, US)
+                         for county, state in zip(counties, states)],
+    }
+    meta = pd.DataFrame(columns, columns=list(columns))
+    values = pd.DataFrame(get_values(rng, locations, days),
+                          columns=get_labels(days))
+
+    return pd.concat([meta, values], axis=1)
+
+
+def write_fixtures(directory, locations, days):
+    """
+    Writes a synthetic global and US time series file to the given directory.
+
+    Args:
+        directory (str): Directory to write the files to.
+        locations (int): Number of rows in each file.
+        days (int): Number of days in each file.
+
+    Returns:
+        dict: Path of each file, keyed by the region ("global" or "US").
+    """
+
+    rng = np.random.RandomState(SEED)
+    paths = {}
+
+    for region, make_frame in ((GLOBAL, make_global_frame),
+                               (US, make_us_frame)):
+        path = os.path.join(directory, "%s_%s.csv" % (CONFIRMED, region))
+        make_frame(locations, days, rng).to_csv(path, index=False)
+        paths[region] = path
+
+    return paths
+
+
+def get_benchmarks(paths):
+    """
+    Gets the benchmarks to run against the given fixture files.
+
+    Args:
+        paths (dict): Path of each fixture file, keyed by the region.
+
+    Returns:
+        list: (name, function) of each benchmark, where the function takes no
+        arguments.
+    """
+
+    matrices = {region: read_matrix(path) for region, path in paths.items()}
+    indexes = {(CONFIRMED, region): AggregateIndex(matrix)
+               for region, matrix in matrices.items()}
+
+    us_matrix = matrices[US]
+    us_index = indexes[(CONFIRMED, US)]
+
+    states = us_index.get_states(US)
+    state = Location(US, REGIONS_STATE)
+    counties = us_index.get_option_index(COUNTY_LEVEL, US, REGIONS_STATE)
+
+    # A name typed in lower case, as users do
+    typed_county = counties.options[-1].lower()
+    all_counties = sorted(set(us_matrix.meta[COUNTY].dropna()))
+
+    registry = DatasetRegistry(indexes=indexes)
+    renderer = BatchRenderer(registry)
+    templates = {}
+    specs = [ChartSpec(Mode.TOTAL_CONFIRMED, state),
+             ChartSpec(Mode.NEW_CONFIRMED, state),
+             ChartSpec(Mode.NEW_CONFIRMED,
+                       Location(matrices[GLOBAL].meta[COUNTRY][0]))]
+
+    def parse_frame():
+        SeriesMatrix.from_frame(pd.read_csv(paths[US]))
+
+    def parse_stream():
+        read_matrix(paths[US])
+
+    def aggregate():
+        AggregateIndex(us_matrix)
+
+    def filter_rows():
+        for name in states:
+            us_matrix.sum_rows(us_matrix.select({US_STATE: name}))
+
+    def get_series():
+        for name in states:
+            us_index.get_values(Location(US, name))
+
+    def rolling_stats():
+        stats = RollingStats(us_matrix.values)
+        stats.get_mean(ONE_WEEK, center=True)
+        stats.get_starting_days(daily=True)
+
+    def validate_county():
+        with mock.patch("builtins.input", return_value=typed_county):
+            input_and_validate(options=OptionIndex(all_counties))
+
+    def rank_counties():
+        rank(us_index, COUNTY_LEVEL, GROWTH, parent=Location(US))
+
+    def render():
+        for spec in specs:
+            buffer = io.BytesIO()
+            save_figure(renderer.draw_template(templates, spec), buffer, PNG)
+
+    return [("parse_frame", parse_frame),
+            ("parse_stream", parse_stream),
+            ("aggregate", aggregate),
+            ("filter_rows", filter_rows),
+            ("get_series", get_series),
+            ("rolling_stats", rolling_stats),
+            ("validate_county", validate_county),
+            ("rank", rank_counties),
+            ("render", render)]
+
+
+def run_benchmark(function, repeat=DEFAULT_REPEAT):
+    """
+    Times the given function over several runs, and records the peak memory
+    it allocates.
+
+    Args:
+        function (function): Function to run.
+        repeat (int): Number of timed runs.
+
+    Returns:
+        dict: Median and minimum seconds per run, and peak bytes allocated.
+    """
+
+    # Warm up caches (e.g. the templates of the renderer) first
+    function()
+
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": statistics.median(times), "min_seconds": min(times),
+            "peak_bytes": peak}
+
+
+def run_all(locations=DEFAULT_LOCATIONS, days=DEFAULT_DAYS,
+            repeat=DEFAULT_REPEAT, names=None):
+    """
+    Runs the benchmarks against fixture files of the given size.
+
+    Args:
+        locations (int): Number of rows in each fixture file.
+        days (int): Number of days in each fixture file.
+        repeat (int): Number of timed runs of each benchmark.
+        names (list): Names of the benchmarks to run. Defaults to all.
+
+    Returns:
+        dict: The size of the fixtures, and the results of each benchmark
+        keyed by its name.
+    """
+
+    results = {"locations": locations, "days": days, "repeat": repeat,
+               "benchmarks": {}}
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_fixtures(directory, locations, days)
+
+        for name, function in get_benchmarks(paths):
+            if names and name not in names:
+                continue
+
+            results["benchmarks"][name] = run_benchmark(function, repeat)
+
+    return results
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares the given results against a baseline.
+
+    Args:
+        results (dict): Results, as returned by :func:`run_all`.
+        baseline (dict): Results of an earlier run.
+        tolerance (float): Fraction by which a benchmark can be slower, or use
+            more memory, before it is flagged.
+
+    Returns:
+        list: Description of each regression.
+
+    Raises:
+        ValueError: If the baseline was run with fixtures of another size.
+    """
+
+    for key in ("locations", "days"):
+        if results[key] != baseline.get(key):
+            raise ValueError("The baseline was run with %s=%s, not %s" %
+                             (key, baseline.get(key), results[key]))
+
+    regressions = []
+
+    for name, result in sorted(results["benchmarks"].items()):
+        before = baseline["benchmarks"].get(name)
+
+        if before is None:
+            continue
+
+        for key, desc, fmt in (("seconds", "time", "%.4fs"),
+                               ("peak_bytes", "peak memory", "%d bytes")):
+            if result[key] > before[key] * (1 + tolerance):
+                regressions.append("%s: %s went from %s to %s" % (
+                    name, desc, fmt % before[key], fmt % result[key]))
+
+    return regressions
+
+
+def print_results(results):
+    """
+    Prints the results of each benchmark.
+
+    Args:
+        results (dict): Results, as returned by :func:`run_all`.
+    """
+
+    print("%d locations x %d days" % (results["locations"], results["days"]))
+
+    for name, result in results["benchmarks"].items():
+        print("%-16s %9.4fs (min %9.4fs)  peak %8.1f MB" %
+              (name, result["seconds"], result["min_seconds"],
+               result["peak_bytes"] / 1024.0 / 1024.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m covid19plotter.benchmarks",
+        description="Benchmarks the hot paths against synthetic time series "
+                    "files.")
+    parser.add_argument("--locations", type=int, default=DEFAULT_LOCATIONS,
+                        help="number of rows in each fixture file")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS,
+                        help="number of days in each fixture file")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="number of timed runs of each benchmark")
+    parser.add_argument("--only", nargs="+", metavar="NAME",
+                        help="names of the benchmarks to run")
+    parser.add_argument("--out", help="JSON file to write the results to")
+    parser.add_argument("--baseline",
+                        help="JSON file with the results of an earlier run to "
+                             "compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="fraction by which a benchmark can be slower, or "
+                             "use more memory, than the baseline")
+    args = parser.parse_args()
+
+    results = run_all(args.locations, args.days, args.repeat, args.only)
+    print_results(results)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        try:
+            regressions = find_regressions(results, baseline, args.tolerance)
+        except ValueError as e:
+            parser.error(str(e))
+
+        for regression in regressions:
+            print("REGRESSION %s" % regression, file=sys.stderr)
+
+        sys.exit(1 if regressions else 0)
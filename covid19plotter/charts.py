@@ -0,0 +1,116 @@
+"""
+Charts
+======
+
+Works out which data and which plotter to use for a given mode and location.
+Shared by the interactive app and the non-interactive entry points.
+"""
+
+from collections import namedtuple
+
+from covid19plotter.data.sources import CONFIRMED
+from covid19plotter.data.sources import DEATHS
+from covid19plotter.data.sources import GLOBAL
+from covid19plotter.data.sources import RECOVERED
+from covid19plotter.data.sources import US
+from covid19plotter.mode import Mode
+from covid19plotter.plotters import Plotter
+from covid19plotter.plotters import USPlotter
+
+ChartSpec = namedtuple("ChartSpec", ["mode", "location", "path", "compare",
+                                     "normalize", "align", "per_capita"])
+ChartSpec.__new__.__defaults__ = (None, None, None, False, False)
+ChartSpec.__doc__ = """
+Specification of a single chart: the plotting mode, the
+:class:`~covid19plotter.data.aggregates.Location` to plot and, optionally, the
+path of the file to render it to and whether to plot the values per 100,000
+people.
+
+For a comparison chart, ``compare`` lists the locations to compare, which are
+part of ``location``, and ``normalize`` and ``align`` are the options of the
+:class:`~covid19plotter.plots.ComparisonPlot`.
+"""
+
+
+def get_kind(mode):
+    """
+    Gets the kind of data (confirmed, deaths, or recovered) associated with the
+    given mode.
+
+    Args:
+        mode (int): Plotting mode.
+
+    Returns:
+        str
+    """
+
+    if Mode.is_deaths_mode(mode):
+        return DEATHS
+    elif Mode.is_recoveries_mode(mode):
+        return RECOVERED
+    return CONFIRMED
+
+
+def uses_us_data(mode, country):
+    """
+    Returns whether the given mode and country are plotted from the separate
+    US files. There is no US file for recoveries.
+
+    Args:
+        mode (int): Plotting mode.
+        country (str): Country to plot.
+
+    Returns:
+        bool
+    """
+
+    return country == US and not Mode.is_recoveries_mode(mode)
+
+
+def get_dataset_key(mode, country):
+    """
+    Gets the (kind, region) of the file holding the data for the given mode
+    and country.
+
+    Args:
+        mode (int): Plotting mode.
+        country (str): Country to plot.
+
+    Returns:
+        tuple
+    """
+
+    region = US if uses_us_data(mode, country) else GLOBAL
+    return get_kind(mode), region
+
+
+def get_index(registry, mode, country):
+    """
+    Gets the index holding the data for the given mode and country.
+
+    Args:
+        registry (:class:`~covid19plotter.data.DatasetRegistry`): Registry to
+            get the index from.
+        mode (int): Plotting mode.
+        country (str): Country to plot.
+
+    Returns:
+        :class:`~covid19plotter.data.AggregateIndex`
+    """
+
+    return registry.get(*get_dataset_key(mode, country))
+
+
+def get_plotter(mode, country):
+    """
+    Gets the plotter to use for the given mode and country.
+
+    Args:
+        mode (int): Plotting mode.
+        country (str): Country to plot.
+
+    Returns:
+        :class:`~covid19plotter.plotters.Plotter`
+    """
+
+    return USPlotter() if uses_us_data(mode, country) else Plotter()
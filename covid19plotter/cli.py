@@ -0,0 +1,787 @@
+"""
+Command Line Interface
+======================
+
+Non-interactive interface for scripted use (e.g. from cron or another
+program). Each query names the mode and location of a chart, which is resolved
+and rendered straight to a file without any prompts. Any number of queries can
+be given in one invocation, so the data is only loaded once for all of them.
+
+Usage::
+
+    python -m covid19plotter --mode new-deaths --country US --state MI \\
+        --region Detroit --out detroit.png
+
+    python -m covid19plotter --queries queries.txt --out-dir charts
+
+where each line of ``queries.txt`` (or of stdin, for ``--queries -``) holds the
+options of one chart, e.g.::
+
+    --mode total-confirmed --country Italy
+    --mode new-deaths --country US --state MI --county Wayne --out wayne.png
+
+Names are matched case-insensitively, and US states can also be given by their
+abbreviation. With ``--compare``, the given parts of the location (states of a
+country, regions or counties of a state, ...) are compared on one chart,
+optionally normalized to their peaks and aligned on their starting days::
+
+    python -m covid19plotter --mode new-deaths --country US --state MI \\
+        --compare Detroit Kent Ottawa --normalize peak --align
+
+With ``--per-capita``, the values are plotted per 100,000 people. With
+``--regions FILE``, the regions defined in a JSON or CSV file (see
+:mod:`~covid19plotter.data.regions`) can be plotted and compared as well.
+
+With ``--rank``, the parts of the location at ``--level`` (by default, those
+one level below it: the states of a country, or the counties of a state or
+region) are ranked by a metric of their latest data instead, and the ``--top``
+of them are printed as a table, and drawn as a bar chart with ``--out`` (see
+:mod:`~covid19plotter.data.rankings`)::
+
+    python -m covid19plotter --mode new-deaths --country US --rank average \\
+        --level county --top 10 --per-capita --out top-counties.png
+
+With ``--store``, the data is read from a shared series store
+(see :mod:`~covid19plotter.data.store`) where it is there.
+
+With ``--archive``, ``--snapshot`` adds the current version of every file to a
+snapshot archive (see :mod:`~covid19plotter.data.archive`), and ``--as-of``
+renders the charts from the files as they were on an earlier date::
+
+    python -m covid19plotter --archive archive --snapshot
+    python -m covid19plotter --archive archive --as-of 2020-03-21 \\
+        --mode total-confirmed --country Italy
+
+With ``--profile``, the time spent in each stage (downloading, parsing,
+aggregating, drawing, ...) is printed when done, see
+:mod:`~covid19plotter.profiling`.
+
+Running the module without any arguments (other than ``--profile``) starts the
+interactive app instead.
+"""
+
+import argparse
+import os
+import shlex
+import sys
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from covid19plotter.aliases import STATE_ABBREVIATIONS
+from covid19plotter.batch import BatchRenderer
+from covid19plotter.batch import DEFAULT_OUTPUT_DIR
+from covid19plotter.batch import FORMATS
+from covid19plotter.batch import PNG
+from covid19plotter.batch import ParallelRenderer
+from covid19plotter.batch import save_figure
+from covid19plotter.charts import ChartSpec
+from covid19plotter.charts import get_dataset_key
+from covid19plotter.charts import get_index
+from covid19plotter.charts import get_kind
+from covid19plotter.charts import get_plotter
+from covid19plotter.data import DataLoader
+from covid19plotter.data import DatasetRegistry
+from covid19plotter.data import Location
+from covid19plotter.data.aggregates import COUNTRY_LEVEL
+from covid19plotter.data.aggregates import COUNTY_LEVEL
+from covid19plotter.data.aggregates import LEVELS
+from covid19plotter.data.aggregates import REGION_LEVEL
+from covid19plotter.data.aggregates import STATE_LEVEL
+from covid19plotter.data.archive import SnapshotArchive
+from covid19plotter.data.compact import format_bytes
+from covid19plotter.data.population import load_population_table
+from covid19plotter.data.rankings import DEFAULT_TOP
+from covid19plotter.data.rankings import METRICS
+from covid19plotter.data.rankings import METRIC_DESCS
+from covid19plotter.data.rankings import get_name
+from covid19plotter.data.rankings import rank
+from covid19plotter.data.regions import RegionDefinitions
+from covid19plotter.data.regions import get_default_regions
+from covid19plotter.data.sources import DATASETS
+from covid19plotter.data.sources import GLOBAL
+from covid19plotter.data.sources import get_url
+from covid19plotter.data.store import SeriesStore
+from covid19plotter.mode import Mode
+from covid19plotter.plots.comparison import NORMALIZATIONS
+from covid19plotter.profiling import get_parser as get_profile_parser
+from covid19plotter.profiling import profile
+
+STDIN = "-"
+COMMENT = "#"
+
+LEVEL_PLURALS = {
+    COUNTRY_LEVEL: "countries",
+    STATE_LEVEL: "states",
+    REGION_LEVEL: "regions",
+    COUNTY_LEVEL: "counties",
+}
+
+
+def get_query_parser():
+    """
+    Gets the parser for the options of a single query.
+
+    Returns:
+        :class:`~argparse.ArgumentParser`
+    """
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--mode",
+                        help="type of data to plot, one of %s (or 1-6)" %
+                             ", ".join(Mode.NAMES.values()))
+    parser.add_argument("--country", help="country/region to plot")
+    parser.add_argument("--state", help="state/province to plot")
+    parser.add_argument("--region", help="region of the state to plot")
+    parser.add_argument("--county", help="county of the state to plot")
+    parser.add_argument("--out", help="file to write the chart to")
+    parser.add_argument("--compare", nargs="+", metavar="NAME",
+                        help="compare these parts of the location on one "
+                             "chart (countries if no --country is given)")
+    parser.add_argument("--normalize", choices=NORMALIZATIONS,
+                        help="normalize the compared series")
+    parser.add_argument("--align", action="store_true",
+                        help="align the compared series on their starting "
+                             "days")
+    parser.add_argument("--per-capita", action="store_true",
+                        help="plot the values per 100,000 people")
+    parser.add_argument("--rank", choices=METRICS,
+                        help="rank the parts of the location by this metric "
+                             "instead")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP,
+                        help="number of locations to rank")
+    parser.add_argument("--level", choices=LEVELS,
+                        help="level of the locations to rank")
+
+    return parser
+
+
+def get_parser():
+    """
+    Gets the parser for the command line.
+
+    Returns:
+        :class:`~argparse.ArgumentParser`
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m covid19plotter",
+        description="Renders COVID-19 charts to image files.",
+        parents=[get_query_parser(), get_profile_parser()])
+    parser.add_argument("--queries",
+                        help="file with the options of one chart per line "
+                             "(- for stdin)")
+    parser.add_argument("--out-dir", default=DEFAULT_OUTPUT_DIR,
+                        help="directory to write charts without --out to")
+    parser.add_argument("--format", default=PNG, choices=FORMATS,
+                        help="image format of charts without --out")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="number of processes to render with (0 for one "
+                             "per CPU)")
+    parser.add_argument("--store",
+                        help="directory of a shared series store to read the "
+                             "data from")
+    parser.add_argument("--memory", action="store_true",
+                        help="print how much memory the loaded data takes")
+    parser.add_argument("--archive",
+                        help="directory of a snapshot archive")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="add the current data to the snapshot archive")
+    parser.add_argument("--as-of",
+                        help="render the data as it was on this date "
+                             "(YYYY-MM-DD), from the snapshot archive")
+    parser.add_argument("--regions",
+                        help="JSON or CSV file defining more regions of US "
+                             "states")
+
+    return parser
+
+
+def parse_queries(lines):
+    """
+    Parses the options of one query per line. Empty lines and lines starting
+    with "#" are skipped.
+
+    Args:
+        lines (iterable): Lines to parse.
+
+    Returns:
+        list: :class:`~argparse.Namespace` of each query.
+    """
+
+    parser = get_query_parser()
+    queries = []
+
+    for line in lines:
+        line = line.strip()
+
+        if line and not line.startswith(COMMENT):
+            queries.append(parser.parse_args(shlex.split(line)))
+
+    return queries
+
+
+def resolve_location(index, country, state=None, region=None, county=None):
+    """
+    Resolves the given names, as typed by a user, to a location of the given
+    index.
+
+    Args:
+        index (:class:`~covid19plotter.data.AggregateIndex`): Index of the data
+            to plot.
+        country (str): Name of the country.
+        state (str): Name or abbreviation of the state.
+        region (str): Name of the region.
+        county (str): Name of the county.
+
+    Returns:
+        :class:`~covid19plotter.data.Location`
+
+    Raises:
+        ValueError: If any of the names is not valid.
+    """
+
+    country = _match(country, index.get_option_index(COUNTRY_LEVEL),
+                     "country")
+
+    if not state:
+        if region or county:
+            raise ValueError("A state is needed for a region or county")
+
+        return Location(country)
+
+    state = STATE_ABBREVIATIONS.get(state.upper(), state)
+    state = _match(state, index.get_option_index(STATE_LEVEL, country),
+                   "state")
+
+    if region:
+        regions = index.get_option_index(REGION_LEVEL, country, state)
+        region = _match(region, regions, "region")
+
+    if county:
+        counties = index.get_option_index(COUNTY_LEVEL, country, state,
+                                          region)
+        county = _match(county, counties, "county")
+
+        return Location(country, state, county=county)
+
+    return Location(country, state, region)
+
+
+def resolve_child(index, location, name):
+    """
+    Resolves the given name, as typed by a user, to a location one level below
+    the given location of the given index: a state of a country, a region or
+    county of a state, or a county of a region.
+
+    Args:
+        index (:class:`~covid19plotter.data.AggregateIndex`): Index of the data
+            to plot.
+        location (:class:`~covid19plotter.data.Location`): Location the name
+            is part of.
+        name (str): Name of the location.
+
+    Returns:
+        :class:`~covid19plotter.data.Location`
+
+    Raises:
+        ValueError: If the name is not valid.
+    """
+
+    country, state, region, county = location
+
+    if county:
+        raise ValueError("A county has no parts to compare")
+
+    if not state:
+        state = STATE_ABBREVIATIONS.get(name.upper(), name)
+        state = _match(state, index.get_option_index(STATE_LEVEL, country),
+                       "state")
+
+        return Location(country, state)
+
+    if not region:
+        # Regions are matched before the counties of the state
+        match = index.get_option_index(REGION_LEVEL, country, state).get(name)
+
+        if match is not None:
+            return Location(country, state, match)
+
+    counties = index.get_option_index(COUNTY_LEVEL, country, state, region)
+    desc = "county" if region else "region or county"
+
+    return Location(country, state, county=_match(name, counties, desc))
+
+
+def resolve_query(registry, query):
+    """
+    Resolves a query to the spec of the chart to render.
+
+    Args:
+        registry (:class:`~covid19plotter.data.DatasetRegistry`): Registry to
+            get the data from.
+        query (:class:`~argparse.Namespace`): Options of the query.
+
+    Returns:
+        :class:`~covid19plotter.charts.ChartSpec`
+
+    Raises:
+        ValueError: If the query is not valid.
+    """
+
+    if not query.mode or not (query.country or query.compare):
+        raise ValueError("--mode and --country are required")
+
+    mode = Mode.from_name(query.mode)
+
+    # Countries are always listed in the global file
+    global_index = registry.get(get_kind(mode), GLOBAL)
+
+    if not query.country:
+        if query.state or query.region or query.county:
+            raise ValueError("A country is needed for a state, region or "
+                             "county")
+
+        countries = global_index.get_option_index(COUNTRY_LEVEL)
+        locations = [Location(_match(name, countries, "country"))
+                     for name in query.compare]
+
+        if query.per_capita:
+            _check_populations(global_index, locations)
+
+        return ChartSpec(mode, Location(None), query.out, locations,
+                         query.normalize, query.align, query.per_capita)
+
+    country = _match(query.country,
+                     global_index.get_option_index(COUNTRY_LEVEL), "country")
+
+    index = get_index(registry, mode, country)
+    location = resolve_location(index, country, query.state, query.region,
+                                query.county)
+
+    if not query.compare:
+        if query.per_capita:
+            _check_populations(index, [location])
+
+        return ChartSpec(mode, location, query.out,
+                         per_capita=query.per_capita)
+
+    locations = [resolve_child(index, location, name)
+                 for name in query.compare]
+
+    if query.per_capita:
+        _check_populations(index, locations)
+
+    return ChartSpec(mode, location, query.out, locations, query.normalize,
+                     query.align, query.per_capita)
+
+
+def resolve_ranking(registry, query):
+    """
+    Resolves a ranking query to the index, location and level of the
+    locations to rank.
+
+    Args:
+        registry (:class:`~covid19plotter.data.DatasetRegistry`): Registry to
+            get the data from.
+        query (:class:`~argparse.Namespace`): Options of the query.
+
+    Returns:
+        tuple: The :class:`~covid19plotter.data.AggregateIndex` of the data,
+        the :class:`~covid19plotter.data.Location` the ranked locations are
+        part of, and their level.
+
+    Raises:
+        ValueError: If the query is not valid.
+    """
+
+    if not query.mode:
+        raise ValueError("--mode is required")
+
+    if query.compare:
+        raise ValueError("--rank and --compare cannot be combined")
+
+    mode = Mode.from_name(query.mode)
+
+    if not query.country:
+        if query.state or query.region or query.county:
+            raise ValueError("A country is needed for a state, region or "
+                             "county")
+
+        # Countries are always listed in the global file
+        index = registry.get(get_kind(mode), GLOBAL)
+        location = Location(None)
+    else:
+        country = _match(query.country,
+                         registry.get(get_kind(mode), GLOBAL)
+                         .get_option_index(COUNTRY_LEVEL), "country")
+
+        index = get_index(registry, mode, country)
+        location = resolve_location(index, country, query.state,
+                                    query.region, query.county)
+
+    return index, location, query.level or _get_child_level(location)
+
+
+def rank_query(registry, query, fmt=PNG):
+    """
+    Ranks the locations of a ranking query, prints the ranking as a table to
+    stdout, and draws it as a bar chart to the file of the query, if any.
+
+    Args:
+        registry (:class:`~covid19plotter.data.DatasetRegistry`): Registry to
+            get the data from.
+        query (:class:`~argparse.Namespace`): Options of the query.
+        fmt (str): Image format of the chart, if the file has no extension.
+
+    Raises:
+        ValueError: If the query is not valid, or there is nothing to rank.
+    """
+
+    index, location, level = resolve_ranking(registry, query)
+    entries = rank(index, level, query.rank, query.top, location,
+                   query.per_capita)
+
+    if not entries:
+        raise ValueError("No %s to rank" % LEVEL_PLURALS[level])
+
+    print_ranking(index, Mode.from_name(query.mode), location, level,
+                  entries, query.rank, query.per_capita)
+
+    if query.out:
+        mode = Mode.from_name(query.mode)
+
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        get_plotter(mode, location.country).rank(
+            fig, index, mode, location, entries, query.rank,
+            query.per_capita)
+
+        save_figure(fig, query.out,
+                    os.path.splitext(query.out)[1][1:].lower() or fmt)
+        print(query.out)
+
+
+def print_ranking(index, mode, location, level, entries, metric,
+                  per_capita=False):
+    """
+    Prints a ranking as a table to stdout.
+
+    Args:
+        index (:class:`~covid19plotter.data.AggregateIndex`): Index of the
+            ranked data.
+        mode (int): Plotting mode.
+        location (:class:`~covid19plotter.data.Location`): Location the ranked
+            locations are part of.
+        level (str): Level of the ranked locations.
+        entries (list): :class:`~covid19plotter.data.rankings.RankEntry` of
+            each ranked location, from the first.
+        metric (str): Metric the locations are ranked by.
+        per_capita (bool): Whether the values are per 100,000 people.
+    """
+
+    parent = ", ".join(part for part in reversed(location) if part)
+    data = Mode.get_name(mode) + (" per 100k" if per_capita else "")
+
+    print("Top %d %s%s by %s (%s) as of %s" %
+          (len(entries), LEVEL_PLURALS[level],
+           " of " + parent if parent else "", METRIC_DESCS[metric].lower(),
+           data, index.labels[-1]))
+
+    names = [get_name(entry.location, location) for entry in entries]
+    width = max(len(name) for name in names)
+
+    for entry, name in zip(entries, names):
+        print("%4d  %-*s  %s" % (entry.rank, width, name,
+                                 _format_value(entry.value)))
+
+
+def main(args=None):
+    """
+    Runs the command line interface.
+
+    Args:
+        args (list): Command line arguments. Defaults to ``sys.argv``.
+
+    Returns:
+        int: Exit status.
+    """
+
+    parser = get_parser()
+    options = parser.parse_args(args)
+
+    with profile(options.profile):
+        return _run(parser, options)
+
+
+def take_snapshot(archive):
+    """
+    Loads the current version of every file and adds it to the given
+    snapshot archive.
+
+    Args:
+        archive (:class:`~covid19plotter.data.archive.SnapshotArchive`):
+            Archive to add the snapshots to.
+    """
+
+    loader = DataLoader()
+
+    for key in DATASETS:
+        archive.add(key, loader.load_matrix(get_url(*key)))
+
+    print("Added snapshots of %d files to %s" % (len(DATASETS),
+                                                 archive.directory),
+          file=sys.stderr)
+
+
+def print_memory_report(memory):
+    """
+    Prints how much memory each loaded file takes, as a parsed frame (before
+    compacting), as a matrix and as an index, to stderr. Files read from a
+    store or archive are only reported as an index.
+
+    Args:
+        memory (dict): :class:`~covid19plotter.data.registry.MemoryUsage`
+            keyed by (kind, region).
+    """
+
+    preloaded = False
+
+    for key, usage in sorted(memory.items()):
+        sizes = [format_bytes(size) if size is not None else "-"
+                 for size in usage]
+        preloaded = preloaded or usage.frame is None
+
+        print("%-18s frame %10s  matrix %10s  index %10s" %
+              (("%s_%s" % key,) + tuple(sizes)), file=sys.stderr)
+
+    if preloaded:
+        print("(files read from a store or archive were not parsed, so only "
+              "their index is reported)", file=sys.stderr)
+
+
+def _run(parser, options):
+    """
+    Runs the command line interface with the given options.
+
+    Args:
+        parser (:class:`~argparse.ArgumentParser`): Parser of the command line,
+            for reporting errors.
+        options (:class:`~argparse.Namespace`): Parsed options.
+
+    Returns:
+        int: Exit status.
+    """
+
+    queries = []
+
+    if options.mode or options.country or options.rank:
+        queries.append(options)
+
+    if options.queries == STDIN:
+        queries.extend(parse_queries(sys.stdin))
+    elif options.queries:
+        with open(options.queries) as f:
+            queries.extend(parse_queries(f))
+
+    if (options.snapshot or options.as_of) and not options.archive:
+        parser.error("--snapshot and --as-of need --archive")
+
+    status = 0
+
+    if options.snapshot:
+        try:
+            take_snapshot(SnapshotArchive(options.archive))
+        except (IOError, ValueError) as e:
+            print("error: cannot take snapshot: %s" % e, file=sys.stderr)
+            status = 1
+
+    if not queries:
+        if options.snapshot:
+            return status
+
+        parser.error("no queries given")
+
+    regions = None
+
+    if options.regions:
+        try:
+            regions = get_default_regions() + \
+                RegionDefinitions.load(options.regions)
+        except (IOError, ValueError) as e:
+            parser.error("cannot load regions: %s" % e)
+
+    if options.as_of:
+        archive = SnapshotArchive(options.archive)
+        populations = None
+
+        # The lookup table is only loaded if anything is plotted per capita
+        if any(query.per_capita for query in queries):
+            populations = load_population_table(DataLoader())
+
+        indexes = archive.load_all(options.as_of, regions=regions,
+                                   populations=populations)
+    elif options.store:
+        indexes = SeriesStore(options.store).load_all()
+    else:
+        indexes = None
+
+    registry = DatasetRegistry(indexes=indexes, regions=regions)
+
+    # Start loading every file needed up front, in the order they are used
+    keys = []
+
+    for query in queries:
+        try:
+            mode = Mode.from_name(query.mode or "")
+        except ValueError:
+            continue
+
+        for key in [(get_kind(mode), GLOBAL),
+                    get_dataset_key(mode, query.country)]:
+            if key not in keys:
+                keys.append(key)
+
+    if options.as_of:
+        for key in keys:
+            if key not in indexes:
+                parser.error("no snapshot of %s_%s as of %s" %
+                             (key + (options.as_of,)))
+
+    registry.prefetch(*keys)
+
+    specs = []
+
+    for query in queries:
+        try:
+            if query.rank:
+                rank_query(registry, query, options.format)
+            else:
+                specs.append(resolve_query(registry, query))
+        except (IOError, ValueError) as e:
+            print("error: %s" % e, file=sys.stderr)
+            status = 1
+
+    if options.processes == 1:
+        renderer = BatchRenderer(registry, options.out_dir, options.format)
+    else:
+        renderer = ParallelRenderer(registry, options.out_dir, options.format,
+                                    processes=options.processes)
+
+    for result in renderer.render(specs):
+        if result.error:
+            print("error: %s: %s" % (_get_spec_name(result.spec),
+                                     result.error), file=sys.stderr)
+            status = 1
+        else:
+            print(result.path)
+
+    if options.memory:
+        print_memory_report(registry.get_memory_usage())
+
+    return status
+
+
+def _match(name, options, desc):
+    """
+    Gets the option matching the given name, ignoring case.
+
+    Args:
+        name (str): Name to match.
+        options (:class:`~covid19plotter.utils.OptionIndex`): Valid options.
+        desc (str): Description of the options (e.g. "state").
+
+    Returns:
+        str
+
+    Raises:
+        ValueError: If no option matches.
+    """
+
+    option = options.get(name)
+
+    if option is None:
+        message = "Unknown %s: %s" % (desc, name)
+        suggestions = options.get_close_matches(name)
+
+        if suggestions:
+            message += " (did you mean: %s?)" % ", ".join(suggestions)
+
+        raise ValueError(message)
+
+    return option
+
+
+def _check_populations(index, locations):
+    """
+    Checks that the populations of the given locations are known, so their
+    values can be plotted per capita.
+
+    Args:
+        index (:class:`~covid19plotter.data.AggregateIndex`): Index of the data
+            to plot.
+        locations (list): :class:`~covid19plotter.data.Location` of each
+            location.
+
+    Raises:
+        ValueError: If the population of any of the locations is not known.
+    """
+
+    for location in locations:
+        if index.get_population(location) is None:
+            name = ", ".join(part for part in reversed(location) if part)
+            raise ValueError("Unknown population: %s" % name)
+
+
+def _get_child_level(location):
+    """
+    Gets the level one below the given location: states of a country, or
+    counties of a state or region. Regions are only ranked when asked for, as
+    most states have none.
+
+    Args:
+        location (:class:`~covid19plotter.data.Location`): Location to get the
+            parts of.
+
+    Returns:
+        str
+    """
+
+    if not location.country:
+        return COUNTRY_LEVEL
+    elif not location.state:
+        return STATE_LEVEL
+    return COUNTY_LEVEL
+
+
+def _format_value(value):
+    """
+    Formats a value of a ranking, rounded to two decimal places unless it is a
+    whole number.
+
+    Args:
+        value (float): Value to format.
+
+    Returns:
+        str
+    """
+
+    if float(value).is_integer():
+        return "%d" % value
+    return "%.2f" % value
+
+
+def _get_spec_name(spec):
+    """
+    Gets a name for the chart of the given spec, to report errors with.
+
+    Args:
+        spec (:class:`~covid19plotter.charts.ChartSpec`): Spec of the chart.
+
+    Returns:
+        str
+    """
+
+    location = ", ".join(part for part in reversed(spec.location) if part)
+
+    return "%s %s" % (Mode.get_name(spec.mode), location or "countries")
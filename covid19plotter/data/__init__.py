@@ -0,0 +1,9 @@
+from covid19plotter.data.cache import FrameCache
+from covid19plotter.data.loader import DataLoader
+from covid19plotter.data.fetch import FetchError
+from covid19plotter.data.fetch import Fetcher
+from covid19plotter.data.registry import DatasetRegistry
+from covid19plotter.data.incremental import apply_update
+from covid19plotter.data.aggregates import AggregateIndex
+from covid19plotter.data.aggregates import Location
+from covid19plotter.data.matrix import SeriesMatrix
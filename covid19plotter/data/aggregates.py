@@ -0,0 +1,627 @@
+"""
+Aggregate Index
+===============
+
+Rolled-up time series for every location in a time series file: each country,
+province/state, region (see :mod:`~covid19plotter.regions`) and county. The
+index is built once when a file is loaded, with a vectorized group sum over its
+:class:`~covid19plotter.data.matrix.SeriesMatrix`, so getting the series for any
+location is a dictionary lookup rather than a filter and sum over the rows of
+the file.
+
+Regions are given as :class:`~covid19plotter.data.regions.RegionDefinitions`
+(or a dict in the layout of :mod:`~covid19plotter.regions`), which are compiled
+into a map from the FIPS code of each county to its region, so the regions of
+all rows are found at once. Overlapping regions are summed in separate group
+sums, one per layer of the map.
+
+The population of every location is rolled up the same way from the
+population of each row of the file (see :mod:`~covid19plotter.data.population`),
+so the series per 100,000 people of every location are a single divide.
+
+Rolling statistics (see :mod:`~covid19plotter.data.stats`) are computed over
+the same rolled-up series, for every location at once, the first time they are
+needed. The starting days of the totals and of the daily changes of every
+location are computed up front, as every plot needs one of them.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.compact import downcast
+from covid19plotter.data.compact import get_memory_usage
+from covid19plotter.data.population import get_row_populations
+from covid19plotter.data.regions import NO_REGION
+from covid19plotter.data.regions import RegionDefinitions
+from covid19plotter.data.sources import COUNTRY
+from covid19plotter.data.sources import COUNTY
+from covid19plotter.data.sources import DATE_FORMAT
+from covid19plotter.data.sources import STATE
+from covid19plotter.data.sources import US_COUNTRY
+from covid19plotter.data.sources import US_STATE
+from covid19plotter.data.stats import RollingStats
+from covid19plotter.data.stats import per_capita
+from covid19plotter.profiling import timed
+from covid19plotter.regions import REGIONS
+from covid19plotter.utils import OptionIndex
+
+REGION = "Region"
+
+# Levels of the hierarchy
+COUNTRY_LEVEL = "country"
+STATE_LEVEL = "state"
+REGION_LEVEL = "region"
+COUNTY_LEVEL = "county"
+LEVELS = [COUNTRY_LEVEL, STATE_LEVEL, REGION_LEVEL, COUNTY_LEVEL]
+
+Location = namedtuple("Location", ["country", "state", "region", "county"])
+Location.__new__.__defaults__ = (None, None, None)
+Location.__doc__ = """
+Location in the hierarchy of a time series file. Fields that do not apply are
+None, e.g. ``Location("US", "Michigan")`` for the whole state of Michigan, or
+``Location("US", "Michigan", county="Wayne")`` for a single county.
+"""
+
+
+class AggregateIndex:
+    """
+    AggregateIndex class. See module documentation for more information.
+
+    Attributes:
+        labels (:class:`~pd.Index`): Date of each value of the series, as it
+            is written in the file (e.g. "3/21/20").
+        dates (:class:`~pd.DatetimeIndex`): Parsed date of each value of the
+            series.
+        stats (:class:`~covid19plotter.data.stats.RollingStats`): Rolling
+            statistics of every location.
+        populations (:class:`~np.ndarray`): Population of every location, in
+            the same order as ``_values`` (NaN where unknown), or None if the
+            populations are not known.
+        _per_capita_stats (:class:`~covid19plotter.data.stats.RollingStats`):
+            Rolling statistics of every location per 100,000 people, computed
+            the first time they are needed.
+        _values (:class:`~np.ndarray`): Series of every location, one per row.
+        _rows (dict): Row in ``_values`` of each
+            :class:`~covid19plotter.data.aggregates.Location`.
+        _counts (dict): Number of rows of the file that were summed for each
+            :class:`~covid19plotter.data.aggregates.Location`.
+        _children (dict): Names of the locations one level below each
+            :class:`~covid19plotter.data.aggregates.Location`, keyed by the
+            parent location (None for countries) and the level (e.g.
+            ``STATE_LEVEL``).
+        _region_counties (dict): Counties of each region, keyed by
+            (state, region).
+        _option_indexes (dict): :class:`~covid19plotter.utils.OptionIndex` of
+            the names of locations, built the first time they are needed,
+            keyed by the level and the parent location.
+        _level_locations (dict): Locations at each level, in the order of
+            their rows, listed the first time they are needed, keyed by the
+            level and the parent location.
+    """
+
+    @timed("aggregate")
+    def __init__(self, matrix, regions=REGIONS, populations=None):
+        self.labels = matrix.labels
+        self.dates = matrix.dates
+        self._per_capita_stats = None
+        self._level_locations = {}
+        self._rows = {}
+        self._counts = {}
+        self._children = {}
+        self._region_counties = {}
+        self._option_indexes = {}
+
+        if not isinstance(regions, RegionDefinitions):
+            regions = RegionDefinitions.from_dict(regions)
+
+        country = US_COUNTRY if matrix.is_us else COUNTRY
+        state = US_STATE if matrix.is_us else STATE
+
+        levels = [([country], COUNTRY_LEVEL, Location),
+                  ([country, state], STATE_LEVEL, Location)]
+
+        if matrix.is_us:
+            for row_regions in self._get_row_regions(matrix, regions):
+                levels.append(([country, state, row_regions], REGION_LEVEL,
+                               Location))
+
+            levels.append(([country, state, COUNTY], COUNTY_LEVEL,
+                           lambda c, s, county: Location(c, s, county=county)))
+
+        if populations is None:
+            populations = get_row_populations(matrix)
+
+        if populations is not None:
+            # Rows without a population (e.g. "Unassigned") count as nobody
+            populations = np.nan_to_num(np.asarray(populations,
+                                                   dtype=np.float64))
+
+        blocks = []
+        population_blocks = []
+
+        for columns, level, make_location in levels:
+            keys, sums, counts = matrix.group_sum(columns)
+
+            if populations is not None:
+                population_blocks.append(
+                    matrix.group_sum(columns, populations)[1])
+
+            for key, count in zip(keys, counts.tolist()):
+                location = make_location(*key)
+
+                self._rows[location] = len(self._rows)
+                self._counts[location] = count
+
+                parent = Location(*key[:-1]) if len(key) > 1 else None
+                self._children.setdefault((parent, level), []) \
+                    .append(key[-1])
+
+            blocks.append(sums)
+
+        self._values = np.ascontiguousarray(downcast(np.concatenate(blocks)))
+        self.stats = RollingStats(self._values)
+        self.populations = None
+
+        if populations is not None:
+            self.populations = np.concatenate(population_blocks)
+            self.populations[self.populations <= 0] = np.nan
+
+        for daily in [False, True]:
+            self.stats.get_starting_days(daily)
+
+    @classmethod
+    def from_parts(cls, values, parts, stats=None):
+        """
+        Creates an :class:`AggregateIndex` from the parts returned by
+        :meth:`to_parts`, without summing anything again.
+
+        Args:
+            values (:class:`~np.ndarray`): Series of every location, one per
+                row. This can be a read-only memory-mapped array.
+            parts (dict): Everything else the index is made of.
+            stats (:class:`~covid19plotter.data.stats.RollingStats`): Rolling
+                statistics of ``values``, if already computed.
+
+        Returns:
+            :class:`AggregateIndex`
+        """
+
+        index = cls.__new__(cls)
+
+        index.labels = pd.Index(parts["labels"])
+        index.dates = pd.to_datetime(index.labels, format=DATE_FORMAT)
+        index._values = values
+        index._per_capita_stats = None
+        index._level_locations = {}
+        index._rows = {}
+        index._counts = {}
+        index._children = {}
+        index._region_counties = {}
+        index._option_indexes = {}
+
+        for row, (location, count) in enumerate(zip(parts["locations"],
+                                                    parts["counts"])):
+            location = Location(*location)
+            index._rows[location] = row
+            index._counts[location] = count
+
+        for parent, level, names in parts["children"]:
+            parent = Location(*parent) if parent else None
+            index._children[(parent, level)] = names
+
+        for state_name, region, counties in parts["region_counties"]:
+            index._region_counties[(state_name, region)] = set(counties)
+
+        index.stats = stats or RollingStats(values)
+        index.populations = None
+
+        if parts.get("populations") is not None:
+            index.populations = np.array(parts["populations"],
+                                         dtype=np.float64)
+
+        return index
+
+    def to_parts(self):
+        """
+        Gets the parts the index is made of, e.g. to store it.
+
+        Returns:
+            tuple: The series of every location, one per row, and a dict of
+            everything else, which can be serialized to JSON.
+        """
+
+        locations = sorted(self._rows, key=self._rows.get)
+        populations = None
+
+        if self.populations is not None:
+            # Unknown populations are null rather than NaN, to be valid JSON
+            populations = [None if p != p else p
+                           for p in self.populations.tolist()]
+
+        return self._values, {
+            "labels": self.labels.tolist(),
+            "locations": [list(location) for location in locations],
+            "counts": [self._counts[location] for location in locations],
+            "children": [[list(parent) if parent else None, level, names]
+                         for (parent, level), names in self._children.items()],
+            "region_counties": [[state_name, region, sorted(counties)]
+                                for (state_name, region), counties
+                                in self._region_counties.items()],
+            "populations": populations,
+        }
+
+    @timed("filter")
+    def get_values(self, location, per_capita=False):
+        """
+        Gets the values for the given location, one for each date in
+        ``labels``.
+
+        Args:
+            location (:class:`~covid19plotter.data.aggregates.Location`):
+                Location to get the values for.
+            per_capita (bool): Whether to get the values per 100,000 people.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        if per_capita:
+            return self.get_per_capita_stats().totals[self._rows[location]]
+
+        return self._values[self._rows[location]]
+
+    def get_rows(self, locations):
+        """
+        Gets the rows of the given locations, e.g. to take the series or
+        statistics of all of them from the matrices of every location at once.
+
+        Args:
+            locations (list): :class:`~covid19plotter.data.aggregates.Location`
+                of each location.
+
+        Returns:
+            :class:`~np.ndarray`
+
+        Raises:
+            KeyError: If any of the locations is not in the index.
+        """
+
+        return np.array([self._rows[location] for location in locations],
+                        dtype=np.intp)
+
+    def get_locations(self, level, parent=None):
+        """
+        Gets every location at the given level (e.g. every county), or only
+        those that are part of the given location.
+
+        Args:
+            level (str): Level of the locations (e.g. ``COUNTY_LEVEL``).
+            parent (:class:`~covid19plotter.data.aggregates.Location`):
+                Location the locations have to be part of.
+
+        Returns:
+            list: :class:`~covid19plotter.data.aggregates.Location` of each
+            location, in the order of their rows.
+        """
+
+        key = (level, parent)
+        locations = self._level_locations.get(key)
+
+        if locations is None:
+            locations = self._find_locations(level, parent)
+            self._level_locations[key] = locations
+
+        return list(locations)
+
+    def get_series(self, location):
+        """
+        Gets the series of values for the given location.
+
+        Args:
+            location (:class:`~covid19plotter.data.aggregates.Location`):
+                Location to get the series for.
+
+        Returns:
+            :class:`~pd.Series`
+        """
+
+        return pd.Series(self.get_values(location), index=self.labels)
+
+    def get_stats(self, location, per_capita=False):
+        """
+        Gets the rolling statistics of the given location.
+
+        Args:
+            location (:class:`~covid19plotter.data.aggregates.Location`):
+                Location to get the statistics for.
+            per_capita (bool): Whether to get the statistics of the values per
+                100,000 people.
+
+        Returns:
+            :class:`~covid19plotter.data.stats.LocationStats`
+        """
+
+        stats = self.get_per_capita_stats() if per_capita else self.stats
+        return stats.get_location_stats(self._rows[location])
+
+    def get_population(self, location):
+        """
+        Gets the population of the given location.
+
+        Args:
+            location (:class:`~covid19plotter.data.aggregates.Location`):
+                Location to get the population of.
+
+        Returns:
+            float: The population, or None if it is not known.
+        """
+
+        if self.populations is None:
+            return None
+
+        population = self.populations[self._rows[location]]
+
+        return None if np.isnan(population) else float(population)
+
+    def get_per_capita_stats(self):
+        """
+        Gets the rolling statistics of every location per 100,000 people. The
+        values of every location are divided by their populations at once, the
+        first time they are needed.
+
+        Returns:
+            :class:`~covid19plotter.data.stats.RollingStats`
+
+        Raises:
+            ValueError: If the populations are not known.
+        """
+
+        if self.populations is None:
+            raise ValueError("The populations of the locations are not known")
+
+        stats = self._per_capita_stats
+
+        if stats is None:
+            # The starting days are relative to the maximum of each series,
+            # so dividing by the population does not change them
+            starting_days = {daily: self.stats.get_starting_days(daily)
+                             for daily in [False, True]}
+
+            # Two threads may both compute them, but either result is the same
+            stats = RollingStats(per_capita(self._values, self.populations),
+                                 starting_days=starting_days)
+            self._per_capita_stats = stats
+
+        return stats
+
+    def get_count(self, location):
+        """
+        Gets the number of rows of the file that make up the given location
+        (e.g. the number of counties in a state).
+
+        Args:
+            location (:class:`~covid19plotter.data.aggregates.Location`):
+                Location to get the count for.
+
+        Returns:
+            int
+        """
+
+        return self._counts.get(location, 0)
+
+    def get_countries(self):
+        """
+        Gets the names of all countries.
+
+        Returns:
+            list
+        """
+
+        return list(self._children.get((None, COUNTRY_LEVEL), []))
+
+    def get_states(self, country):
+        """
+        Gets the names of the provinces/states of the given country.
+
+        Args:
+            country (str): Name of the country.
+
+        Returns:
+            list
+        """
+
+        return list(self._children.get((Location(country), STATE_LEVEL), []))
+
+    def get_regions(self, country, state):
+        """
+        Gets the names of the regions of the given state.
+
+        Args:
+            country (str): Name of the country.
+            state (str): Name of the state.
+
+        Returns:
+            list
+        """
+
+        return list(self._children.get((Location(country, state),
+                                        REGION_LEVEL), []))
+
+    def get_counties(self, country, state, region=None):
+        """
+        Gets the names of the counties of the given state, or of the given
+        region of that state.
+
+        Args:
+            country (str): Name of the country.
+            state (str): Name of the state.
+            region (str): Name of the region.
+
+        Returns:
+            list
+        """
+
+        counties = self._children.get((Location(country, state),
+                                       COUNTY_LEVEL), [])
+
+        if region:
+            region_counties = self._region_counties.get((state, region), [])
+            return [c for c in counties if c in region_counties]
+
+        return list(counties)
+
+    def get_memory_usage(self):
+        """
+        Gets the number of bytes taken by the series of every location and
+        their rolling statistics computed so far.
+
+        Returns:
+            int
+        """
+
+        nbytes = get_memory_usage(self._values) + self.stats.get_memory_usage()
+
+        if self.populations is not None:
+            nbytes += get_memory_usage(self.populations)
+
+        if self._per_capita_stats is not None:
+            nbytes += get_memory_usage(self._per_capita_stats.totals) + \
+                self._per_capita_stats.get_memory_usage()
+
+        return nbytes
+
+    def get_option_index(self, level, country=None, state=None, region=None):
+        """
+        Gets an :class:`~covid19plotter.utils.OptionIndex` of the names of the
+        locations at the given level, e.g. the counties of a state, to validate
+        and complete them. It is only built once for each list of names.
+
+        Args:
+            level (str): Level of the locations (e.g. ``COUNTY_LEVEL``).
+            country (str): Name of the country, for all levels but countries.
+            state (str): Name of the state, for regions and counties.
+            region (str): Name of the region, for only the counties in it.
+
+        Returns:
+            :class:`~covid19plotter.utils.OptionIndex`
+        """
+
+        key = (level, Location(country, state, region))
+        option_index = self._option_indexes.get(key)
+
+        if option_index is None:
+            if level == COUNTRY_LEVEL:
+                names = self.get_countries()
+            elif level == STATE_LEVEL:
+                names = self.get_states(country)
+            elif level == REGION_LEVEL:
+                names = self.get_regions(country, state)
+            else:
+                names = self.get_counties(country, state, region)
+
+            option_index = OptionIndex(names)
+            self._option_indexes[key] = option_index
+
+        return option_index
+
+    def _find_locations(self, level, parent=None):
+        """
+        Lists the locations at the given level that are part of the given
+        location. See :meth:`get_locations`.
+
+        Args:
+            level (str): Level of the locations (e.g. ``COUNTY_LEVEL``).
+            parent (:class:`~covid19plotter.data.aggregates.Location`):
+                Location the locations have to be part of.
+
+        Returns:
+            list
+        """
+
+        if parent is None:
+            return [location for location in self._rows
+                    if _get_level(location) == level]
+
+        if parent.county:
+            return []
+
+        # Counties are not listed under their regions, so they are matched by
+        # name instead
+        region_counties = None
+
+        if parent.region and level == COUNTY_LEVEL:
+            region_counties = set(self.get_counties(
+                parent.country, parent.state, parent.region))
+            parent = parent._replace(region=None)
+
+        return [location for location in self.get_locations(level)
+                if all(part is None or part == location_part
+                       for part, location_part in zip(parent, location))
+                and (region_counties is None or
+                     location.county in region_counties)]
+
+    def _get_row_regions(self, matrix, regions):
+        """
+        Gets the region of each row of a US file, and the counties of each
+        region.
+
+        Args:
+            matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Matrix
+                of the file.
+            regions (:class:`~covid19plotter.data.regions.RegionDefinitions`):
+                Regions of the states.
+
+        Returns:
+            list: :class:`~pd.Series` of the name of the region of each row
+            (or None if the county of the row is not part of any region), for
+            each layer of overlapping regions.
+        """
+
+        region_map = regions.compile(matrix)
+
+        states = matrix.meta[US_STATE].astype(object).to_numpy()
+        counties = matrix.meta[COUNTY].astype(object).to_numpy()
+
+        # The last name is that of NO_REGION
+        region_states = np.array([state for state, _ in region_map.regions] +
+                                 [None], dtype=object)
+        region_names = np.array([name for _, name in region_map.regions] +
+                                [None], dtype=object)
+
+        layers = []
+
+        for ids in region_map.get_row_regions(matrix):
+            # Counties given by FIPS code may be in another state
+            ids[region_states[ids] != states] = NO_REGION
+
+            for row in np.flatnonzero(ids != NO_REGION).tolist():
+                key = (region_states[ids[row]], region_names[ids[row]])
+                self._region_counties.setdefault(key, set()) \
+                    .add(counties[row])
+
+            layers.append(pd.Series(region_names[ids], name=REGION))
+
+        return layers
+
+
+def _get_level(location):
+    """
+    Gets the level of the given location in the hierarchy.
+
+    Args:
+        location (:class:`~covid19plotter.data.aggregates.Location`):
+            Location to get the level of.
+
+    Returns:
+        str
+    """
+
+    if location.county:
+        return COUNTY_LEVEL
+    elif location.region:
+        return REGION_LEVEL
+    elif location.state:
+        return STATE_LEVEL
+    return COUNTRY_LEVEL
@@ -0,0 +1,578 @@
+"""
+Snapshot Archive
+================
+
+Archive of past versions ("vintages") of the time series files, so charts can
+be rendered as of an earlier pull after the data has been revised upstream.
+
+Each snapshot of a file is stored as a delta against the previous snapshot of
+the same file: the values of the new date columns, plus only the cells of the
+existing columns that changed. Rows are matched by their location keys, and the
+metadata is only stored again when it changed. Storage therefore grows with the
+size of the changes rather than with the number of snapshots times the size of
+the whole matrix. A full snapshot is stored every ``KEYFRAME_INTERVAL``
+snapshots (or whenever the dates do not simply extend the previous ones), so
+reconstructing any vintage applies a bounded number of deltas.
+
+Each file has a directory in the archive, with one compressed ``.npz`` file per
+snapshot and a JSON index listing the snapshots in order.
+"""
+
+import json
+import os
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from covid19plotter.data.aggregates import AggregateIndex
+from covid19plotter.data.compact import downcast
+from covid19plotter.data.matrix import KEY_COLUMNS
+from covid19plotter.data.matrix import SeriesMatrix
+from covid19plotter.data.population import has_populations
+from covid19plotter.data.regions import get_default_regions
+from covid19plotter.data.sources import DATASETS
+
+ARCHIVE_VERSION = 1
+INDEX_FILE = "index.json"
+
+VINTAGE_FORMAT = "%Y-%m-%d"
+
+# Number of snapshots between full snapshots
+KEYFRAME_INTERVAL = 30
+
+INFO = "info"
+VALUES = "values"
+LABELS = "labels"
+NEW_VALUES = "new_values"
+NEW_LABELS = "new_labels"
+CHANGED_ROWS = "changed_rows"
+CHANGED_COLUMNS = "changed_columns"
+CHANGED_VALUES = "changed_values"
+ROW_MAP = "row_map"
+META = "meta_%d"
+META_NA = "meta_%d_na"
+
+
+class SnapshotArchive:
+    """
+    SnapshotArchive class. See module documentation for more information.
+
+    Attributes:
+        directory (str): Directory of the archive.
+        _last (dict): Last reconstructed (vintage, matrix) of each file, keyed
+            by (kind, region), to apply further deltas to.
+        _lock (:class:`~threading.Lock`): Lock for ``_last``.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def get_vintages(self, key):
+        """
+        Gets the vintages of the snapshots of the given file, oldest first.
+
+        Args:
+            key (tuple): (kind, region) of the file.
+
+        Returns:
+            list
+        """
+
+        return [entry["vintage"] for entry in self._load_index(key)]
+
+    def add(self, key, matrix, vintage=None):
+        """
+        Adds a snapshot of the given file to the archive. Adding a snapshot
+        with the same vintage as the latest one replaces it.
+
+        Args:
+            key (tuple): (kind, region) of the file.
+            matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Data of
+                the file.
+            vintage (str): Date of the snapshot (e.g. "2020-03-21"). Defaults
+                to today.
+
+        Raises:
+            ValueError: If there is already a newer snapshot.
+        """
+
+        vintage = vintage or date.today().strftime(VINTAGE_FORMAT)
+        entries = self._load_index(key)
+
+        if entries and vintage < entries[-1]["vintage"]:
+            raise ValueError("There is already a newer snapshot than %s" %
+                             vintage)
+
+        if entries and vintage == entries[-1]["vintage"]:
+            entries = entries[:-1]
+
+        previous = self.load(key, entries[-1]["vintage"]) if entries else None
+        since_keyframe = 0
+
+        for entry in reversed(entries):
+            if entry["full"]:
+                break
+
+            since_keyframe += 1
+
+        arrays = None
+
+        if previous is not None and since_keyframe + 1 < KEYFRAME_INTERVAL:
+            arrays = self._encode_delta(previous, matrix)
+
+        # Also when the dates did not simply extend the previous ones
+        full = arrays is None
+
+        if full:
+            arrays = self._encode_full(matrix)
+
+        directory = self._get_dir(key)
+        os.makedirs(directory, exist_ok=True)
+
+        file_name = "%s.npz" % vintage
+        path = os.path.join(directory, file_name)
+
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+        os.replace(path + ".tmp", path)
+
+        entries.append({"vintage": vintage, "file": file_name, "full": full})
+        self._save_index(key, entries)
+
+        with self._lock:
+            self._last[key] = (vintage, matrix)
+
+    def load(self, key, vintage=None):
+        """
+        Reconstructs the given file as it was in the latest snapshot up to the
+        given vintage.
+
+        Args:
+            key (tuple): (kind, region) of the file.
+            vintage (str): Date to get the file as of (e.g. "2020-03-21").
+                Defaults to the latest snapshot.
+
+        Returns:
+            :class:`~covid19plotter.data.matrix.SeriesMatrix`: The file, or
+            None if there is no snapshot up to that vintage.
+        """
+
+        entries = self._load_index(key)
+
+        if vintage is not None:
+            entries = [e for e in entries if e["vintage"] <= vintage]
+
+        if not entries:
+            return None
+
+        target = len(entries) - 1
+        start = target
+
+        while not entries[start]["full"]:
+            start -= 1
+
+        with self._lock:
+            last = self._last.get(key)
+
+        matrix = None
+        vintages = [entry["vintage"] for entry in entries]
+
+        # Continue from the last reconstructed snapshot, if it is on the way
+        if last is not None and last[0] in vintages[start:target + 1]:
+            start = vintages.index(last[0]) + 1
+            matrix = last[1]
+
+        directory = self._get_dir(key)
+
+        for entry in entries[start:target + 1]:
+            path = os.path.join(directory, entry["file"])
+
+            with np.load(path, allow_pickle=False) as archive:
+                if entry["full"]:
+                    matrix = self._decode_full(archive)
+                else:
+                    matrix = self._decode_delta(matrix, archive)
+
+        with self._lock:
+            self._last[key] = (vintages[target], matrix)
+
+        return matrix
+
+    def load_all(self, vintage=None, keys=None, regions=None,
+                 populations=None):
+        """
+        Reconstructs the indexes of every file as of the given vintage, e.g.
+        to create a :class:`~covid19plotter.data.DatasetRegistry` with them.
+
+        Args:
+            vintage (str): Date to get the files as of. Defaults to the latest
+                snapshots.
+            keys (list): (kind, region) of each file. Defaults to all files.
+            regions (:class:`~covid19plotter.data.regions.RegionDefinitions`):
+                Regions of the US states. Defaults to the default regions.
+            populations (PopulationTable): Table of the population of every
+                location (see :mod:`~covid19plotter.data.population`), to look
+                up those of the rows of files without a population column,
+                the same as the registry does when it loads them. Without it,
+                only files with a population column have populations.
+
+        Returns:
+            dict: Indexes keyed by (kind, region). Files without a snapshot up
+            to that vintage are left out.
+        """
+
+        if regions is None:
+            regions = get_default_regions()
+
+        indexes = {}
+
+        for key in keys or DATASETS:
+            matrix = self.load(key, vintage)
+
+            if matrix is None:
+                continue
+
+            row_populations = None
+
+            if populations is not None and not has_populations(matrix):
+                row_populations = populations.get_row_populations(matrix)
+
+            indexes[key] = AggregateIndex(matrix, regions, row_populations)
+
+        return indexes
+
+    def _encode_full(self, matrix):
+        """
+        Encodes a full snapshot.
+
+        Args:
+            matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Data of
+                the file.
+
+        Returns:
+            dict: Arrays to store.
+        """
+
+        meta_columns, arrays = self._encode_meta(matrix.meta)
+        info = {"version": ARCHIVE_VERSION, "meta_columns": meta_columns}
+
+        arrays.update({
+            INFO: np.array(json.dumps(info)),
+            VALUES: matrix.values,
+            LABELS: np.array(matrix.labels.tolist(), dtype=str),
+        })
+
+        return arrays
+
+    def _encode_delta(self, previous, matrix):
+        """
+        Encodes a snapshot as a delta against the previous one.
+
+        Args:
+            previous (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Data
+                of the previous snapshot.
+            matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Data of
+                the file.
+
+        Returns:
+            dict: Arrays to store, or None if the snapshot cannot be stored as
+            a delta.
+        """
+
+        old_labels = previous.labels.tolist()
+        labels = matrix.labels.tolist()
+        num_old = len(old_labels)
+
+        if labels[:num_old] != old_labels:
+            return None
+
+        old_keys = _get_row_keys(previous.meta)
+        keys = _get_row_keys(matrix.meta)
+
+        old_meta = self._encode_meta(previous.meta)
+        meta = self._encode_meta(matrix.meta)
+
+        info = {"version": ARCHIVE_VERSION}
+        arrays = {}
+
+        if keys == old_keys and _meta_equal(meta, old_meta):
+            row_map = np.arange(len(keys))
+        else:
+            positions = {k: i for i, k in enumerate(old_keys)}
+            row_map = np.array([positions.get(k, -1) for k in keys],
+                               dtype=np.int64)
+
+            info["meta_columns"] = meta[0]
+            arrays[ROW_MAP] = row_map
+            arrays.update(meta[1])
+
+        aligned = _align_rows(previous.values, row_map, num_old)
+        changed_rows, changed_columns = np.nonzero(
+            matrix.values[:, :num_old] != aligned)
+
+        arrays.update({
+            INFO: np.array(json.dumps(info)),
+            NEW_LABELS: np.array(labels[num_old:], dtype=str),
+            NEW_VALUES: matrix.values[:, num_old:],
+            CHANGED_ROWS: changed_rows.astype(np.int32),
+            CHANGED_COLUMNS: changed_columns.astype(np.int32),
+            CHANGED_VALUES: matrix.values[changed_rows, changed_columns],
+        })
+
+        return arrays
+
+    def _encode_meta(self, meta):
+        """
+        Encodes the metadata of a snapshot. Strings are stored as plain
+        (non-object) arrays, with a mask of missing values.
+
+        Args:
+            meta (:class:`~pd.DataFrame`): Metadata of each row.
+
+        Returns:
+            tuple: The names of the columns, and a dict of the arrays to store.
+        """
+
+        arrays = {}
+
+        for i, column in enumerate(meta.columns):
+            values = meta[column]
+
+            if is_numeric_dtype(values.dtype):
+                arrays[META % i] = values.to_numpy()
+            else:
+                na = values.isna().to_numpy()
+                arrays[META % i] = np.array(
+                    ["" if m else str(v) for v, m in zip(values, na)],
+                    dtype=str)
+                arrays[META_NA % i] = na
+
+        return list(meta.columns), arrays
+
+    def _decode_full(self, archive):
+        """
+        Decodes a full snapshot.
+
+        Args:
+            archive (:class:`~np.lib.npyio.NpzFile`): Stored arrays.
+
+        Returns:
+            :class:`~covid19plotter.data.matrix.SeriesMatrix`
+        """
+
+        return SeriesMatrix(archive[VALUES], archive[LABELS].tolist(),
+                            self._decode_meta(archive))
+
+    def _decode_delta(self, previous, archive):
+        """
+        Applies a delta to the previous snapshot.
+
+        Args:
+            previous (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Data
+                of the previous snapshot.
+            archive (:class:`~np.lib.npyio.NpzFile`): Stored arrays.
+
+        Returns:
+            :class:`~covid19plotter.data.matrix.SeriesMatrix`
+        """
+
+        num_old = len(previous.labels)
+        new_values = archive[NEW_VALUES]
+        changed_values = archive[CHANGED_VALUES]
+
+        if ROW_MAP in archive.files:
+            row_map = archive[ROW_MAP]
+            meta = self._decode_meta(archive)
+        else:
+            row_map = np.arange(len(previous.values))
+            meta = previous.meta
+
+        dtype = np.result_type(previous.values, new_values, changed_values)
+
+        values = np.empty((len(row_map), num_old + new_values.shape[1]), dtype)
+        values[:, :num_old] = _align_rows(previous.values, row_map, num_old)
+        values[:, num_old:] = new_values
+        values[archive[CHANGED_ROWS], archive[CHANGED_COLUMNS]] = \
+            changed_values
+
+        labels = previous.labels.tolist() + archive[NEW_LABELS].tolist()
+
+        return SeriesMatrix(downcast(values), labels, meta)
+
+    def _decode_meta(self, archive):
+        """
+        Decodes the metadata of a snapshot.
+
+        Args:
+            archive (:class:`~np.lib.npyio.NpzFile`): Stored arrays.
+
+        Returns:
+            :class:`~pd.DataFrame`
+        """
+
+        info = json.loads(str(archive[INFO]))
+        meta = pd.DataFrame()
+
+        for i, column in enumerate(info["meta_columns"]):
+            values = archive[META % i]
+
+            if META_NA % i in archive.files:
+                values = values.astype(object)
+                values[archive[META_NA % i]] = np.nan
+
+            meta[column] = values
+
+            if column in KEY_COLUMNS:
+                meta[column] = meta[column].astype("category")
+
+        return meta
+
+    def _load_index(self, key):
+        """
+        Loads the list of snapshots of the given file.
+
+        Args:
+            key (tuple): (kind, region) of the file.
+
+        Returns:
+            list: Entry of each snapshot, oldest first.
+        """
+
+        path = os.path.join(self._get_dir(key), INDEX_FILE)
+
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            return []
+
+        if index.get("version") != ARCHIVE_VERSION:
+            return []
+
+        return index["snapshots"]
+
+    def _save_index(self, key, entries):
+        """
+        Saves the list of snapshots of the given file.
+
+        Args:
+            key (tuple): (kind, region) of the file.
+            entries (list): Entry of each snapshot, oldest first.
+        """
+
+        path = os.path.join(self._get_dir(key), INDEX_FILE)
+
+        with open(path + ".tmp", "w") as f:
+            json.dump({"version": ARCHIVE_VERSION, "snapshots": entries}, f)
+
+        os.replace(path + ".tmp", path)
+
+    def _get_dir(self, key):
+        """
+        Gets the directory of the snapshots of the given file.
+
+        Args:
+            key (tuple): (kind, region) of the file.
+
+        Returns:
+            str
+        """
+
+        return os.path.join(self.directory, "%s_%s" % key)
+
+
+def _get_row_keys(meta):
+    """
+    Gets a key identifying each row of a file by its location. Rows with the
+    same location are told apart by their order.
+
+    Args:
+        meta (:class:`~pd.DataFrame`): Metadata of each row.
+
+    Returns:
+        list: Key of each row.
+    """
+
+    columns = [column for column in KEY_COLUMNS if column in meta.columns]
+    keys = []
+    seen = {}
+
+    for row in zip(*[meta[column].astype(object).tolist()
+                     for column in columns]):
+        row = tuple(None if v != v else v for v in row)
+        seen[row] = seen.get(row, -1) + 1
+        keys.append(row + (seen[row],))
+
+    return keys
+
+
+def _meta_equal(meta, other_meta):
+    """
+    Returns whether the given encoded metadata are the same.
+
+    Args:
+        meta (tuple): Metadata encoded by
+            :meth:`SnapshotArchive._encode_meta`.
+        other_meta (tuple): Other encoded metadata.
+
+    Returns:
+        bool
+    """
+
+    if meta[0] != other_meta[0] or meta[1].keys() != other_meta[1].keys():
+        return False
+
+    return all(_array_equal(meta[1][name], other_meta[1][name])
+               for name in meta[1])
+
+
+def _array_equal(values, other_values):
+    """
+    Returns whether the given arrays are the same, counting missing values
+    (e.g. the FIPS code of unassigned rows) as equal to each other.
+
+    Args:
+        values (:class:`~np.ndarray`): Array to compare.
+        other_values (:class:`~np.ndarray`): Other array.
+
+    Returns:
+        bool
+    """
+
+    if values.shape != other_values.shape:
+        return False
+
+    equal = values == other_values
+
+    if values.dtype.kind == "f" and other_values.dtype.kind == "f":
+        equal |= np.isnan(values) & np.isnan(other_values)
+
+    return bool(np.all(equal))
+
+
+def _align_rows(values, row_map, num_columns):
+    """
+    Gets the rows of a previous snapshot in the order of the rows of a new one.
+    New rows are all zeros.
+
+    Args:
+        values (:class:`~np.ndarray`): Values of the previous snapshot.
+        row_map (:class:`~np.ndarray`): Row of the previous snapshot for each
+            row of the new one, or -1 for new rows.
+        num_columns (int): Number of columns of the previous snapshot.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    aligned = np.zeros((len(row_map), num_columns), values.dtype)
+    has_row = row_map >= 0
+    aligned[has_row] = values[row_map[has_row]]
+
+    return aligned
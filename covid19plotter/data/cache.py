@@ -0,0 +1,341 @@
+"""
+Frame Cache
+===========
+
+On-disk cache for parsed time series files. Each :class:`~pd.DataFrame` is
+stored as an uncompressed NumPy ``.npz`` archive, with the date columns packed
+into a single typed matrix, so it can be reloaded without parsing any CSV text.
+Entries are keyed by the source URL and carry the freshness metadata (ETag and
+Last-Modified) that was returned alongside the file.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from covid19plotter.profiling import timed
+
+CACHE_DIR_ENV = "COVID19PLOTTER_CACHE"
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "covid19plotter")
+
+CACHE_VERSION = 1
+CACHE_EXTENSION = ".npz"
+
+INFO = "info"
+COLUMNS = "columns"
+VALUES = "values"
+LINE_HASHES = "line_hashes"
+META = "meta_%d"
+META_NA = "meta_%d_na"
+
+
+def get_cache_dir():
+    """
+    Gets the directory used for cached files, which can be overridden with the
+    ``COVID19PLOTTER_CACHE`` environment variable.
+
+    Returns:
+        str
+    """
+
+    return os.path.expanduser(os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR))
+
+
+def split_columns(columns):
+    """
+    Splits the columns of a time series file into the leading metadata columns
+    and the trailing date columns.
+
+    Args:
+        columns (list): All columns of the file.
+
+    Returns:
+        tuple
+    """
+
+    columns = list(columns)
+    first_date = len(columns)
+
+    # Date columns are always at the end of the file and always contain a "/",
+    # unlike any of the metadata columns
+    while first_date > 0 and "/" in columns[first_date - 1]:
+        first_date -= 1
+
+    return columns[:first_date], columns[first_date:]
+
+
+class FrameCache:
+    """
+    FrameCache class. See module documentation for more information.
+
+    Attributes:
+        _directory (str): Directory the cached files are stored in.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory or get_cache_dir()
+
+    @timed("cache_load")
+    def load(self, url):
+        """
+        Loads the cached :class:`~pd.DataFrame` for the given URL.
+
+        Args:
+            url (str): URL the data frame was loaded from.
+
+        Returns:
+            tuple: The :class:`~pd.DataFrame` and its freshness metadata, or
+            ``(None, None)`` if nothing usable is cached.
+        """
+
+        path = self._get_path(url)
+
+        if not os.path.exists(path):
+            return None, None
+
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                info = json.loads(str(archive[INFO]))
+
+                if info.get("version") != CACHE_VERSION or \
+                        info.get("url") != url:
+                    return None, None
+
+                df = self._unpack(archive, info)
+        except (OSError, ValueError, KeyError):
+            # A partially written or outdated file is treated as a cache miss
+            return None, None
+
+        return df, info["meta"]
+
+    @timed("cache_load")
+    def load_arrays(self, url, meta_columns=None):
+        """
+        Loads the cached file for the given URL split into its metadata and
+        date values, without building the wide :class:`~pd.DataFrame`.
+
+        Args:
+            url (str): URL the file was loaded from.
+            meta_columns (list): Metadata columns to load, where present.
+                Defaults to all of them.
+
+        Returns:
+            tuple: The :class:`~pd.DataFrame` of metadata, the date columns,
+            the (rows x dates) matrix of values and the freshness metadata, or
+            ``(None, None, None, None)`` if nothing usable is cached.
+        """
+
+        path = self._get_path(url)
+
+        if not os.path.exists(path):
+            return None, None, None, None
+
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                info = json.loads(str(archive[INFO]))
+
+                if info.get("version") != CACHE_VERSION or \
+                        info.get("url") != url:
+                    return None, None, None, None
+
+                meta_df = self._unpack_meta(archive, info, meta_columns)
+                date_columns = archive[COLUMNS].tolist()
+                values = archive[VALUES]
+        except (OSError, ValueError, KeyError):
+            return None, None, None, None
+
+        return meta_df, date_columns, values, info["meta"]
+
+    def load_columns(self, url):
+        """
+        Loads only the column names of the cached :class:`~pd.DataFrame` for
+        the given URL, without reading any of its data.
+
+        Args:
+            url (str): URL the data frame was loaded from.
+
+        Returns:
+            list: The column names, or None if nothing usable is cached.
+        """
+
+        path = self._get_path(url)
+
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                info = json.loads(str(archive[INFO]))
+
+                if info.get("version") != CACHE_VERSION:
+                    return None
+
+                return info["meta_columns"] + archive[COLUMNS].tolist()
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def load_line_hashes(self, url):
+        """
+        Loads only the line hashes stored with the cached
+        :class:`~pd.DataFrame` for the given URL.
+
+        Args:
+            url (str): URL the data frame was loaded from.
+
+        Returns:
+            :class:`~np.ndarray`: The hashes, or None if there are none.
+        """
+
+        path = self._get_path(url)
+
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                if LINE_HASHES not in archive.files:
+                    return None
+
+                return archive[LINE_HASHES]
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url, df, meta=None, line_hashes=None):
+        """
+        Saves the given :class:`~pd.DataFrame` to the cache.
+
+        Args:
+            url (str): URL the data frame was loaded from.
+            df (:class:`~pd.DataFrame`): Parsed data frame.
+            meta (dict): Freshness metadata for the file (e.g. "etag",
+                "last_modified").
+            line_hashes (:class:`~np.ndarray`): Hashes of each data line of
+                the file, used to update it incrementally.
+        """
+
+        meta_columns, date_columns = split_columns(df.columns)
+        self.save_arrays(url, df[meta_columns], date_columns,
+                         df[date_columns].to_numpy(), meta, line_hashes)
+
+    @timed("cache_save")
+    def save_arrays(self, url, meta_df, date_columns, values, meta=None,
+                    line_hashes=None):
+        """
+        Saves a parsed file that was already split into its metadata and date
+        values (see :func:`~covid19plotter.data.stream.read_arrays`) to the
+        cache.
+
+        Args:
+            url (str): URL the file was loaded from.
+            meta_df (:class:`~pd.DataFrame`): Metadata columns of the file.
+            date_columns (list): Date columns of the file.
+            values (:class:`~np.ndarray`): (rows x dates) matrix of values.
+            meta (dict): Freshness metadata for the file (e.g. "etag",
+                "last_modified").
+            line_hashes (:class:`~np.ndarray`): Hashes of each data line of
+                the file, used to update it incrementally.
+        """
+
+        os.makedirs(self._directory, exist_ok=True)
+
+        meta_columns = list(meta_df.columns)
+        info = {"version": CACHE_VERSION, "url": url, "meta": meta or {},
+                "meta_columns": meta_columns}
+
+        arrays = {
+            INFO: np.array(json.dumps(info)),
+            COLUMNS: np.array(date_columns, dtype=str),
+            VALUES: values
+        }
+
+        if line_hashes is not None:
+            arrays[LINE_HASHES] = line_hashes
+
+        for i, column in enumerate(meta_columns):
+            column_values = meta_df[column]
+
+            if is_numeric_dtype(column_values.dtype):
+                arrays[META % i] = column_values.to_numpy()
+            else:
+                na = column_values.isna().to_numpy()
+                arrays[META % i] = \
+                    column_values.fillna("").to_numpy().astype(str)
+                arrays[META_NA % i] = na
+
+        path = self._get_path(url)
+        tmp_path = path + ".tmp"
+
+        # Write to a temporary file first so readers never see a partial file
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+
+        os.replace(tmp_path, path)
+
+    def _get_path(self, url):
+        """
+        Gets the path of the cached file for the given URL.
+
+        Args:
+            url (str): URL the data frame was loaded from.
+
+        Returns:
+            str
+        """
+
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self._directory, key + CACHE_EXTENSION)
+
+    def _unpack(self, archive, info):
+        """
+        Rebuilds a :class:`~pd.DataFrame` from a cached archive.
+
+        Args:
+            archive (:class:`~np.lib.npyio.NpzFile`): Opened archive.
+            info (dict): Information stored alongside the archive.
+
+        Returns:
+            :class:`~pd.DataFrame`
+        """
+
+        meta_df = self._unpack_meta(archive, info)
+        dates_df = pd.DataFrame(archive[VALUES],
+                                columns=archive[COLUMNS].tolist())
+
+        return pd.concat([meta_df, dates_df], axis=1)
+
+    def _unpack_meta(self, archive, info, meta_columns=None):
+        """
+        Rebuilds the metadata columns of a cached archive.
+
+        Args:
+            archive (:class:`~np.lib.npyio.NpzFile`): Opened archive.
+            info (dict): Information stored alongside the archive.
+            meta_columns (list): Metadata columns to rebuild, where present.
+                Defaults to all of them.
+
+        Returns:
+            :class:`~pd.DataFrame`
+        """
+
+        columns = {}
+
+        for i, column in enumerate(info["meta_columns"]):
+            if meta_columns is not None and column not in meta_columns:
+                continue
+
+            values = archive[META % i]
+
+            if META_NA % i in archive.files:
+                values = values.astype(object)
+
+                # Use np.nan itself, as that is what pd.read_csv produces for
+                # missing strings
+                values[archive[META_NA % i]] = np.nan
+
+            columns[column] = values
+
+        return pd.DataFrame(columns, columns=list(columns))
@@ -0,0 +1,181 @@
+"""
+Compact Storage
+===============
+
+Helpers for keeping the loaded data small: integer matrices are stored in the
+smallest integer dtype that holds all of their values, repeated strings become
+categoricals, and metadata columns nothing reads (e.g. ``UID``, ``iso2``,
+``iso3``, ``code3``, ``Combined_Key``) are dropped once the file is parsed.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+# Bytes taken by each value of a column parsed as numbers, or by the pointer to
+# each value of a column of strings
+VALUE_SIZE = 8
+
+# Signed, so that daily changes (which can be negative when counts are revised
+# downwards) never wrap around
+INT_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+UNITS = ["B", "KB", "MB", "GB"]
+
+
+def get_int_dtype(values):
+    """
+    Gets the smallest integer dtype that can hold all of the given values.
+
+    Args:
+        values (:class:`~np.ndarray`): Integer values.
+
+    Returns:
+        :class:`~np.dtype`
+    """
+
+    if values.size == 0:
+        return np.dtype(INT_DTYPES[0])
+
+    low, high = values.min(), values.max()
+
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+
+    return values.dtype
+
+
+def downcast(values):
+    """
+    Converts an integer matrix to the smallest integer dtype that can hold all
+    of its values. Other matrices are returned unchanged.
+
+    Args:
+        values (:class:`~np.ndarray`): Matrix to convert.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    if values.dtype.kind not in "iu":
+        return values
+
+    return values.astype(get_int_dtype(values), copy=False)
+
+
+def compact_meta(meta, columns):
+    """
+    Keeps only the given metadata columns, with repeated strings stored as
+    categoricals.
+
+    Args:
+        meta (:class:`~pd.DataFrame`): Metadata of each row of a file.
+        columns (list): Columns to keep, where present.
+
+    Returns:
+        :class:`~pd.DataFrame`
+    """
+
+    meta = meta[[column for column in meta.columns if column in columns]]
+    meta = meta.copy()
+
+    for column in meta.columns:
+        values = meta[column]
+
+        if is_numeric_dtype(values.dtype) or \
+                isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+
+        if values.nunique() < len(values) / 2:
+            meta[column] = values.astype("category")
+
+    return meta
+
+
+def get_memory_usage(obj):
+    """
+    Gets the number of bytes taken by the given data frame or array, including
+    the strings it refers to.
+
+    Args:
+        obj (object): :class:`~pd.DataFrame` or :class:`~np.ndarray`.
+
+    Returns:
+        int
+    """
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+
+    return int(obj.nbytes)
+
+
+def estimate_frame_memory_usage(shape, meta=None):
+    """
+    Estimates the number of bytes a time series file would take as parsed into
+    a data frame (e.g. by :func:`pandas.read_csv`), with a 64-bit column for
+    each date and the strings of the metadata columns as Python objects. Only
+    the given metadata columns are counted, so files whose unused columns were
+    dropped when compacting take at least this much.
+
+    Args:
+        shape (tuple): (locations, days) shape of the matrix of the file.
+        meta (:class:`~pd.DataFrame`): Metadata of each row of the file.
+
+    Returns:
+        int
+    """
+
+    rows, days = shape
+    nbytes = rows * days * VALUE_SIZE
+
+    if meta is None:
+        return nbytes
+
+    for column in meta.columns:
+        values = meta[column]
+        nbytes += rows * VALUE_SIZE
+
+        if is_numeric_dtype(values.dtype):
+            continue
+
+        # Each row refers to its own string object once parsed
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories
+            codes = values.cat.codes.to_numpy()
+            counts = np.bincount(codes[codes >= 0],
+                                 minlength=len(categories))
+            sizes = [sys.getsizeof(category) for category in categories]
+            nbytes += int(np.dot(counts, sizes))
+        else:
+            nbytes += sum(sys.getsizeof(value) for value in values
+                          if isinstance(value, str))
+
+    return nbytes
+
+
+def format_bytes(nbytes):
+    """
+    Formats a number of bytes for display (e.g. "1.5 MB").
+
+    Args:
+        nbytes (int): Number of bytes.
+
+    Returns:
+        str
+    """
+
+    size = float(nbytes)
+
+    for unit in UNITS[:-1]:
+        if size < 1024:
+            return "%.1f %s" % (size, unit)
+
+        size /= 1024
+
+    return "%.1f %s" % (size, UNITS[-1])
@@ -0,0 +1,396 @@
+"""
+Fetcher
+=======
+
+Downloads the time series files in parallel over a pool of keep-alive HTTP
+connections. Requests are conditional (ETag / If-Modified-Since), so a file
+that has not changed since it was last downloaded costs a single round trip
+and no body.
+
+Files can also be streamed to a file object in chunks with
+:meth:`Fetcher.fetch_to` (decompressing them as they arrive), so a large file
+never has to be held in memory as a whole.
+"""
+
+import csv
+import gzip
+import http.client
+import threading
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from covid19plotter.profiling import timed
+
+ETAG = "etag"
+LAST_MODIFIED = "last_modified"
+
+TIMEOUT = 30
+MAX_WORKERS = 5
+
+# Number of bytes requested at a time when only reading the header line
+HEADER_CHUNK = 32 * 1024
+
+# Number of bytes read at a time when streaming a file
+DOWNLOAD_CHUNK = 256 * 1024
+
+# Window bits making zlib decode a gzip stream
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+HTTP_OK = 200
+HTTP_PARTIAL_CONTENT = 206
+HTTP_NOT_MODIFIED = 304
+
+FetchResult = namedtuple("FetchResult", ["url", "text", "meta"])
+FetchResult.__doc__ = """
+Result of fetching a file. ``text`` is None if the file has not been modified
+since the version described by the metadata sent with the request.
+"""
+
+
+class FetchError(IOError):
+    """
+    Raised when a file could not be downloaded.
+    """
+
+
+class Fetcher:
+    """
+    Fetcher class. See module documentation for more information.
+
+    Attributes:
+        _max_workers (int): Maximum number of files to download at once.
+        _idle (dict): Idle connections, keyed by (scheme, host, port).
+        _lock (:class:`~threading.Lock`): Lock guarding ``_idle``.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, timeout=TIMEOUT):
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, url, meta=None):
+        """
+        Fetches the file at the given URL.
+
+        Args:
+            url (str): URL of the file.
+            meta (dict): Freshness metadata of the copy already held, if any.
+
+        Returns:
+            :class:`FetchResult`
+
+        Raises:
+            FetchError: If the file could not be downloaded or decoded.
+        """
+
+        response, body = self._request(url, _get_headers(meta))
+
+        if response.status == HTTP_NOT_MODIFIED:
+            return FetchResult(url, None, meta)
+
+        _check_status(url, response)
+
+        try:
+            if response.getheader("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+
+            text = body.decode("utf-8")
+        except (OSError, EOFError, zlib.error, UnicodeDecodeError) as e:
+            # e.g. a truncated or corrupt gzip body
+            raise FetchError("Could not decode %s: %s" % (url, e))
+
+        return FetchResult(url, text, _get_meta(response))
+
+    def fetch_to(self, url, f, meta=None):
+        """
+        Fetches the file at the given URL, writing its (decompressed) bytes to
+        the given file object in chunks as they arrive, rather than holding the
+        whole file in memory.
+
+        Args:
+            url (str): URL of the file.
+            f (object): Binary file object (or any object with a ``write``
+                method) to write the file to.
+            meta (dict): Freshness metadata of the copy already held, if any.
+
+        Returns:
+            dict: Freshness metadata of the file written, or None if it has not
+            been modified since the version described by ``meta``, in which
+            case nothing is written.
+
+        Raises:
+            FetchError: If the file could not be downloaded or decompressed.
+        """
+
+        response, _ = self._request(url, _get_headers(meta), f)
+
+        if response.status == HTTP_NOT_MODIFIED:
+            return None
+
+        _check_status(url, response)
+
+        return _get_meta(response)
+
+    def fetch_header(self, url):
+        """
+        Fetches only the header line of the CSV file at the given URL, using
+        range requests so the rest of the file is never downloaded.
+
+        Args:
+            url (str): URL of the file.
+
+        Returns:
+            list: Column names of the file.
+        """
+
+        data = b""
+
+        while b"\n" not in data:
+            start = len(data)
+            headers = {"Range": "bytes=%d-%d" %
+                                (start, start + HEADER_CHUNK - 1)}
+
+            response, body = self._request(url, headers)
+
+            if response.status == HTTP_OK:
+                # The server ignored the range, so the whole file was sent
+                data = body
+                break
+            if response.status != HTTP_PARTIAL_CONTENT:
+                raise FetchError("Could not fetch %s: HTTP %d" %
+                                 (url, response.status))
+
+            data += body
+
+            if len(body) < HEADER_CHUNK:
+                break
+
+        line = data.split(b"\n", 1)[0].decode("utf-8").rstrip("\r")
+        return next(csv.reader([line]))
+
+    def map(self, function, items):
+        """
+        Calls the given function on each of the given items in parallel, using
+        at most as many threads as files that are downloaded at once.
+
+        Args:
+            function (callable): Function to call.
+            items (list): Items to call the function with.
+
+        Returns:
+            list: The results, in the same order as the items.
+        """
+
+        items = list(items)
+
+        if len(items) <= 1:
+            return [function(item) for item in items]
+
+        workers = min(self._max_workers, len(items))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, items))
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+
+        with self._lock:
+            connections = [c for cs in self._idle.values() for c in cs]
+            self._idle = {}
+
+        for connection in connections:
+            connection.close()
+
+    @timed("download")
+    def _request(self, url, headers, f=None):
+        """
+        Sends a GET request over a pooled connection and reads the response.
+
+        Args:
+            url (str): URL of the file.
+            headers (dict): Request headers.
+            f (object): File object to stream the body of a successful
+                response to, decompressed, instead of returning it.
+
+        Returns:
+            tuple: The :class:`~http.client.HTTPResponse` and its body, or
+            None if it was written to ``f``.
+        """
+
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+
+        connection = self._acquire(key)
+
+        try:
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                # The server may have closed an idle keep-alive connection, so
+                # retry once on a fresh one
+                connection.close()
+                connection = self._connect(key)
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+
+            if f is not None and response.status == HTTP_OK:
+                body = None
+                _copy_body(response, f)
+            else:
+                body = response.read()
+        except (http.client.HTTPException, OSError, zlib.error) as e:
+            connection.close()
+            raise FetchError("Could not fetch %s: %s" % (url, e))
+
+        self._release(key, connection, response)
+
+        return response, body
+
+    def _acquire(self, key):
+        """
+        Takes an idle connection from the pool, or opens a new one.
+
+        Args:
+            key (tuple): (scheme, host, port) of the server.
+
+        Returns:
+            :class:`~http.client.HTTPConnection`
+        """
+
+        with self._lock:
+            idle = self._idle.get(key)
+
+            if idle:
+                return idle.pop()
+
+        return self._connect(key)
+
+    def _release(self, key, connection, response):
+        """
+        Returns a connection to the pool, unless the server asked for it to be
+        closed.
+
+        Args:
+            key (tuple): (scheme, host, port) of the server.
+            connection (:class:`~http.client.HTTPConnection`): Connection to
+                return.
+            response (:class:`~http.client.HTTPResponse`): Last response read
+                from the connection.
+        """
+
+        if response.will_close:
+            connection.close()
+            return
+
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+    def _connect(self, key):
+        """
+        Opens a new connection.
+
+        Args:
+            key (tuple): (scheme, host, port) of the server.
+
+        Returns:
+            :class:`~http.client.HTTPConnection`
+        """
+
+        scheme, host, port = key
+
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port,
+                                               timeout=self._timeout)
+        return http.client.HTTPConnection(host, port, timeout=self._timeout)
+
+
+def _get_headers(meta):
+    """
+    Gets the headers of a request for a file, made conditional on the given
+    freshness metadata.
+
+    Args:
+        meta (dict): Freshness metadata of the copy already held, if any.
+
+    Returns:
+        dict
+    """
+
+    headers = {"Accept-Encoding": "gzip"}
+
+    if meta:
+        if meta.get(ETAG):
+            headers["If-None-Match"] = meta[ETAG]
+        if meta.get(LAST_MODIFIED):
+            headers["If-Modified-Since"] = meta[LAST_MODIFIED]
+
+    return headers
+
+
+def _get_meta(response):
+    """
+    Gets the freshness metadata of a response.
+
+    Args:
+        response (:class:`~http.client.HTTPResponse`): Response for a file.
+
+    Returns:
+        dict
+    """
+
+    return {ETAG: response.getheader("ETag"),
+            LAST_MODIFIED: response.getheader("Last-Modified")}
+
+
+def _check_status(url, response):
+    """
+    Checks that a response holds the requested file.
+
+    Args:
+        url (str): URL of the file.
+        response (:class:`~http.client.HTTPResponse`): Response for the file.
+
+    Raises:
+        FetchError: If the response is an error.
+    """
+
+    if response.status != HTTP_OK:
+        raise FetchError("Could not fetch %s: HTTP %d" %
+                         (url, response.status))
+
+
+def _copy_body(response, f):
+    """
+    Writes the body of a response to a file object in chunks, decompressing
+    it as it is read if it is gzipped.
+
+    Args:
+        response (:class:`~http.client.HTTPResponse`): Response to read.
+        f (object): File object to write to.
+    """
+
+    decompressor = None
+
+    if response.getheader("Content-Encoding") == "gzip":
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+
+    while True:
+        chunk = response.read(DOWNLOAD_CHUNK)
+
+        if not chunk:
+            break
+
+        f.write(decompressor.decompress(chunk) if decompressor else chunk)
+
+    if decompressor:
+        f.write(decompressor.flush())
+
+        if not decompressor.eof:
+            raise zlib.error("Truncated gzip stream")
@@ -0,0 +1,300 @@
+"""
+Incremental Updates
+===================
+
+Applies a newly downloaded version of a time series file to the previously
+parsed :class:`~pd.DataFrame`, parsing only what changed.
+
+The files only ever grow by new date columns on the right, and every date
+value is a plain number, so stripping the new trailing fields from a line
+gives back exactly the text of that line in the previous version (unless that
+row was revised upstream). A hash of every line is kept alongside the parsed
+data frame, so unchanged rows are recognised without parsing them, and only
+the new date values of those rows, plus any new or revised rows, are parsed.
+
+The new version can be given as its text, or as a text file object it is read
+from line by line (e.g. a file it was streamed to, see
+:meth:`~covid19plotter.data.fetch.Fetcher.fetch_to`), in which case the lines
+are hashed by a :class:`LineHasher` as the file is written.
+"""
+
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from covid19plotter.data.cache import split_columns
+from covid19plotter.profiling import timed
+
+HASH_SIZE = 8
+
+
+def hash_lines(lines):
+    """
+    Hashes each of the given lines.
+
+    Args:
+        lines (list): Lines of text, without line endings.
+
+    Returns:
+        :class:`~np.ndarray`: Fixed-size byte strings, one per line.
+    """
+
+    hashes = [hashlib.blake2b(line.encode("utf-8"),
+                              digest_size=HASH_SIZE).digest()
+              for line in lines]
+
+    return np.array(hashes, dtype="S%d" % HASH_SIZE)
+
+
+class LineHasher:
+    """
+    Hashes each data line of a file as its bytes are written through it to
+    another file object, giving the same hashes as :func:`hash_lines` of the
+    data lines from :func:`get_data_lines`, without ever holding the whole
+    file.
+
+    Attributes:
+        _f (object): Binary file object the bytes are written to.
+        _partial (bytes): Bytes of the line being written, up to the last
+            chunk.
+        _header (bool): Whether the header line has been written already.
+        _hashes (list): Hash of each data line written so far.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._partial = b""
+        self._header = False
+        self._hashes = []
+
+    def write(self, data):
+        """
+        Writes the given bytes to the file, hashing every line they complete.
+
+        Args:
+            data (bytes): Bytes to write.
+        """
+
+        self._f.write(data)
+
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+
+        for line in lines:
+            self._add_line(line)
+
+    def get_hashes(self):
+        """
+        Gets the hashes of the data lines, once the whole file was written.
+
+        Returns:
+            :class:`~np.ndarray`: Fixed-size byte strings, one per line.
+        """
+
+        if self._partial:
+            self._add_line(self._partial)
+            self._partial = b""
+
+        return np.array(self._hashes, dtype="S%d" % HASH_SIZE)
+
+    def _add_line(self, line):
+        """
+        Hashes a complete line, unless it is the header or empty.
+
+        Args:
+            line (bytes): Line, without its ``\\n`` ending.
+        """
+
+        line = line.rstrip(b"\r")
+
+        if not self._header:
+            self._header = True
+        elif line:
+            self._hashes.append(hashlib.blake2b(
+                line, digest_size=HASH_SIZE).digest())
+
+
+def get_data_lines(text):
+    """
+    Splits the text of a CSV file into its header line and data lines.
+
+    Args:
+        text (str): Text of the file.
+
+    Returns:
+        tuple: The header line, and a list of the data lines.
+    """
+
+    lines = text.splitlines()
+    return lines[0], [line for line in lines[1:] if line]
+
+
+def read_data_lines(f):
+    """
+    Reads the header line of a CSV file, and its data lines one at a time.
+
+    Args:
+        f (object): Text file object of the file.
+
+    Returns:
+        tuple: The header line, and an iterator over the data lines.
+    """
+
+    header = f.readline().rstrip("\r\n")
+    lines = (line.rstrip("\r\n") for line in f)
+
+    return header, (line for line in lines if line)
+
+
+@timed("incremental")
+def apply_update(df, line_hashes, text):
+    """
+    Applies the new version of a file to the data frame parsed from the
+    previous version.
+
+    Args:
+        df (:class:`~pd.DataFrame`): Data frame parsed from the previous
+            version.
+        line_hashes (:class:`~np.ndarray`): Hashes of the data lines of the
+            previous version, as returned by :func:`hash_lines`.
+        text (object): Text of the new version, or a text file object to read
+            it from.
+
+    Returns:
+        :class:`~pd.DataFrame`: The updated data frame, or None if the files
+        are too different to be updated incrementally (e.g. the metadata
+        columns changed), in which case the new version has to be parsed in
+        full.
+    """
+
+    if isinstance(text, str):
+        header, lines = get_data_lines(text)
+    else:
+        header, lines = read_data_lines(text)
+
+    columns = pd.read_csv(io.StringIO(header)).columns.tolist()
+
+    meta_columns, date_columns = split_columns(columns)
+    old_meta_columns, old_date_columns = split_columns(df.columns)
+
+    if meta_columns != old_meta_columns or \
+            date_columns[:len(old_date_columns)] != old_date_columns:
+        return None
+
+    if len(line_hashes) != len(df):
+        return None
+
+    new_columns = date_columns[len(old_date_columns):]
+    num_new = len(new_columns)
+
+    positions = {h: i for i, h in enumerate(line_hashes.tolist())}
+
+    unchanged_lines = []
+    unchanged_positions = []
+    new_values = []
+    changed_lines = []
+
+    for line_num, line in enumerate(lines):
+        if num_new:
+            parts = line.rsplit(",", num_new)
+            prefix, values = parts[0], parts[1:]
+        else:
+            prefix, values = line, []
+
+        h = hash_lines([prefix])[0]
+        position = positions.pop(h, None)
+
+        if position is None:
+            # New row, or a row where earlier values were revised upstream
+            changed_lines.append((line_num, line))
+        else:
+            unchanged_lines.append(line_num)
+            unchanged_positions.append(position)
+            new_values.append(values)
+
+    frames = []
+
+    if unchanged_lines:
+        unchanged_df = df.iloc[unchanged_positions].reset_index(drop=True)
+
+        if num_new:
+            # Parse the new values the same way as the rest of the file
+            values_text = "\n".join(",".join(v) for v in new_values)
+            values_df = pd.read_csv(io.StringIO(values_text), header=None,
+                                    names=new_columns,
+                                    skip_blank_lines=False)
+            unchanged_df = pd.concat([unchanged_df, values_df], axis=1)
+
+        unchanged_df.index = unchanged_lines
+        frames.append(unchanged_df)
+
+    if changed_lines:
+        changed_text = "\n".join([header] + [l for _, l in changed_lines])
+        changed_df = pd.read_csv(io.StringIO(changed_text))
+        changed_df.index = [line_num for line_num, _ in changed_lines]
+        frames.append(changed_df)
+
+    updated_df = pd.concat(frames, sort=False).sort_index()
+    updated_df = updated_df.reset_index(drop=True)
+
+    return _restore_dtypes(updated_df, df)
+
+
+def _restore_dtypes(df, old_df):
+    """
+    Makes the dtypes of an updated data frame match those that parsing the
+    whole file would have produced, where concatenating the unchanged and
+    changed rows promoted them (e.g. integers to floats), or the cached rows
+    were stored in a smaller dtype.
+
+    Args:
+        df (:class:`~pd.DataFrame`): Updated data frame.
+        old_df (:class:`~pd.DataFrame`): Data frame parsed from the previous
+            version.
+
+    Returns:
+        :class:`~pd.DataFrame`
+    """
+
+    for column in df.columns:
+        values = df[column]
+
+        if column not in old_df:
+            # A new date column has no dtype to restore, but its values are
+            # plain numbers, so whole numbers parse as integers
+            if values.dtype.kind == "f" and _is_integral(values):
+                df[column] = values.astype(np.int64)
+            continue
+
+        old_dtype = old_df[column].dtype
+
+        if not is_numeric_dtype(old_dtype):
+            # Missing strings in the changed rows alone parse as floats
+            if values.dtype != old_dtype:
+                df[column] = values.astype(old_dtype)
+        elif values.dtype.kind in "iu":
+            if values.dtype != np.int64:
+                df[column] = values.astype(np.int64)
+        elif values.dtype.kind == "f" and old_dtype.kind in "iu" and \
+                _is_integral(values):
+            df[column] = values.astype(np.int64)
+
+    return df
+
+
+def _is_integral(values):
+    """
+    Checks whether the given float column holds only whole numbers, and so
+    would have been parsed as integers.
+
+    Args:
+        values (:class:`~pd.Series`): Column to check.
+
+    Returns:
+        bool
+    """
+
+    return not values.isna().any() and bool(np.all(np.mod(values, 1) == 0))
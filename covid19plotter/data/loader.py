@@ -0,0 +1,248 @@
+"""
+Data Loader
+===========
+
+Loads the time series files, going through the on-disk
+:class:`~covid19plotter.data.cache.FrameCache` so that a file is only
+downloaded and parsed again when it has changed upstream. When it has changed,
+only the new and revised parts are parsed (see
+:mod:`~covid19plotter.data.incremental`).
+
+:meth:`DataLoader.load_matrix` goes straight to the compact
+:class:`~covid19plotter.data.matrix.SeriesMatrix` instead, without ever
+building the wide :class:`~pd.DataFrame`: cached files are read back as their
+matrix of values, and files that have to be parsed in full are read in chunks
+of rows (see :mod:`~covid19plotter.data.stream`). The file is never held in
+memory as a whole either: it is streamed to a temporary file as it is
+downloaded, its lines are hashed as they are written, and it is then parsed
+from there.
+"""
+
+import io
+import tempfile
+
+import pandas as pd
+
+from covid19plotter.data.cache import FrameCache
+from covid19plotter.data.cache import split_columns
+from covid19plotter.data.fetch import FetchError
+from covid19plotter.data.fetch import Fetcher
+from covid19plotter.data.incremental import LineHasher
+from covid19plotter.data.incremental import apply_update
+from covid19plotter.data.incremental import get_data_lines
+from covid19plotter.data.incremental import hash_lines
+from covid19plotter.data.matrix import SeriesMatrix
+from covid19plotter.data.matrix import USED_COLUMNS
+from covid19plotter.data.stream import get_values
+from covid19plotter.data.stream import read_arrays
+from covid19plotter.profiling import span
+
+
+class DataLoader:
+    """
+    DataLoader class. See module documentation for more information.
+
+    Attributes:
+        _cache (:class:`~covid19plotter.data.cache.FrameCache`): Cache for
+            parsed files.
+        _fetcher (:class:`~covid19plotter.data.fetch.Fetcher`): Fetcher used
+            to download files.
+        _incremental (bool): Whether changed files are applied to the cached
+            data frame rather than parsed in full.
+    """
+
+    def __init__(self, cache=None, fetcher=None, incremental=True):
+        self._cache = cache or FrameCache()
+        self._fetcher = fetcher or Fetcher()
+        self._incremental = incremental
+
+    def load(self, url):
+        """
+        Loads the :class:`~pd.DataFrame` at the given URL, using the cached copy
+        if the file has not changed since it was cached.
+
+        Args:
+            url (str): URL of the CSV file.
+
+        Returns:
+            :class:`~pd.DataFrame`
+        """
+
+        df, meta = self._cache.load(url)
+
+        try:
+            result = self._fetcher.fetch(url, meta if df is not None else None)
+        except FetchError:
+            if df is not None:
+                # Offline, so the cached copy is the best there is
+                return df
+            raise
+
+        if result.text is None:
+            return df
+
+        updated_df = None
+
+        if df is not None and self._incremental:
+            line_hashes = self._cache.load_line_hashes(url)
+
+            if line_hashes is not None:
+                updated_df = apply_update(df, line_hashes, result.text)
+
+        if updated_df is None:
+            with span("parse"):
+                updated_df = pd.read_csv(io.StringIO(result.text))
+
+        with span("hash"):
+            line_hashes = hash_lines(get_data_lines(result.text)[1])
+
+        self._cache.save(url, updated_df, result.meta, line_hashes)
+
+        return updated_df
+
+    def load_matrix(self, url):
+        """
+        Loads the compact :class:`~covid19plotter.data.matrix.SeriesMatrix` of
+        the file at the given URL, using the cached copy if the file has not
+        changed since it was cached.
+
+        Args:
+            url (str): URL of the CSV file.
+
+        Returns:
+            :class:`~covid19plotter.data.matrix.SeriesMatrix`
+        """
+
+        meta_df, date_columns, values, meta = self._cache.load_arrays(
+            url, USED_COLUMNS)
+
+        with tempfile.TemporaryFile() as f:
+            hasher = LineHasher(f)
+
+            try:
+                new_meta = self._fetcher.fetch_to(
+                    url, hasher, meta if values is not None else None)
+            except FetchError:
+                if values is None:
+                    raise
+
+                new_meta = None
+
+            if new_meta is None:
+                return SeriesMatrix.from_arrays(values, date_columns, meta_df)
+
+            del meta_df, values
+            line_hashes = hasher.get_hashes()
+
+            if date_columns is not None and self._incremental:
+                matrix = self._update_matrix(url, f, new_meta, line_hashes)
+
+                if matrix is not None:
+                    return matrix
+
+            # Keep every metadata column in the cache, for incremental updates
+            f.seek(0)
+            meta_df, date_columns, values = read_arrays(f)
+
+        self._cache.save_arrays(url, meta_df, date_columns, values, new_meta,
+                                line_hashes)
+
+        return SeriesMatrix.from_arrays(values, date_columns, meta_df)
+
+    def _update_matrix(self, url, f, meta, line_hashes):
+        """
+        Applies the new version of a file, streamed to the given file object,
+        to the cached data frame of the previous version, and caches the
+        result.
+
+        Args:
+            url (str): URL of the file.
+            f (object): Binary file object holding the new version.
+            meta (dict): Freshness metadata of the new version.
+            line_hashes (:class:`~np.ndarray`): Hashes of the data lines of
+                the new version.
+
+        Returns:
+            :class:`~covid19plotter.data.matrix.SeriesMatrix`: The matrix of
+            the new version, or None if it has to be parsed in full.
+        """
+
+        # Updates are applied to the full data frame, so it is only built for
+        # as long as it takes to parse the changes
+        df, _ = self._cache.load(url)
+        old_line_hashes = self._cache.load_line_hashes(url)
+
+        if df is None or old_line_hashes is None:
+            return None
+
+        f.seek(0)
+        text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+
+        try:
+            updated_df = apply_update(df, old_line_hashes, text)
+        finally:
+            # Leave the file open for parsing in full
+            text.detach()
+
+        if updated_df is None:
+            return None
+
+        # Cache the values the same way as a file parsed in full, rather than
+        # a mix of the cached (compacted) rows and the newly parsed ones
+        meta_columns, date_columns = split_columns(updated_df.columns)
+        meta_df = updated_df[meta_columns]
+        values = get_values(updated_df, date_columns)
+
+        self._cache.save_arrays(url, meta_df, date_columns, values, meta,
+                                line_hashes)
+
+        return SeriesMatrix.from_arrays(values, date_columns, meta_df)
+
+    def load_header(self, url):
+        """
+        Loads only the column names of the CSV file at the given URL, falling
+        back to the cached copy if the file cannot be reached.
+
+        Args:
+            url (str): URL of the CSV file.
+
+        Returns:
+            list
+        """
+
+        try:
+            return self._fetcher.fetch_header(url)
+        except FetchError:
+            columns = self._cache.load_columns(url)
+
+            if columns is None:
+                raise
+
+            return columns
+
+    def load_all(self, urls):
+        """
+        Loads the :class:`~pd.DataFrame` at each of the given URLs in parallel.
+
+        Args:
+            urls (list): URLs of the CSV files.
+
+        Returns:
+            list: The data frames, in the same order as the URLs.
+        """
+
+        return self._fetcher.map(self.load, urls)
+
+    def load_headers(self, urls):
+        """
+        Loads only the column names of each of the given CSV files in
+        parallel.
+
+        Args:
+            urls (list): URLs of the CSV files.
+
+        Returns:
+            list: The column names of each file, in the same order as the URLs.
+        """
+
+        return self._fetcher.map(self.load_header, urls)
@@ -0,0 +1,328 @@
+"""
+Series Matrix
+=============
+
+Normalized form of a time series file. The wide file mixes metadata columns
+(UID, FIPS, Lat, Long_, Combined_Key, ...) with one column per date; here the
+date columns become a single contiguous (locations x days) integer matrix, with
+the dates parsed into a :class:`~pd.DatetimeIndex`, and the metadata columns
+are kept in a separate table with categorical location keys.
+
+Each location key column also gets a key -> row positions index the first time
+rows are selected by it, so selecting rows by country, state or county is a
+dictionary lookup and a ``take`` rather than a scan comparing every string in
+the column. Matrices that are only aggregated (see
+:mod:`~covid19plotter.data.aggregates`) never build it.
+
+By default, the matrix is stored in the smallest integer dtype that holds its
+values, and only the metadata columns that are used are kept (see
+:mod:`~covid19plotter.data.compact`).
+"""
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.cache import split_columns
+from covid19plotter.data.compact import compact_meta
+from covid19plotter.data.compact import downcast
+from covid19plotter.data.compact import estimate_frame_memory_usage
+from covid19plotter.data.compact import get_memory_usage
+from covid19plotter.data.sources import COUNTRY
+from covid19plotter.data.sources import COUNTY
+from covid19plotter.data.sources import DATE_FORMAT
+from covid19plotter.data.sources import FIPS
+from covid19plotter.data.sources import POPULATION
+from covid19plotter.data.sources import STATE
+from covid19plotter.data.sources import US_COUNTRY
+from covid19plotter.data.sources import US_STATE
+from covid19plotter.profiling import timed
+
+# Metadata columns identifying the location of a row
+KEY_COLUMNS = [COUNTRY, STATE, US_COUNTRY, US_STATE, COUNTY]
+
+# Metadata columns kept when compacting
+USED_COLUMNS = KEY_COLUMNS + [FIPS, POPULATION]
+
+
+class SeriesMatrix:
+    """
+    SeriesMatrix class. See module documentation for more information.
+
+    Attributes:
+        values (:class:`~np.ndarray`): (locations x days) matrix of values.
+        labels (:class:`~pd.Index`): Date of each column of ``values``, as it
+            is written in the file (e.g. "3/21/20").
+        dates (:class:`~pd.DatetimeIndex`): Parsed date of each column of
+            ``values``.
+        meta (:class:`~pd.DataFrame`): Metadata of each row of ``values``.
+        _key_index (dict): Positions of the rows with each key, keyed by the
+            key column and then the key. The index of a column is built the
+            first time rows are selected by it.
+    """
+
+    def __init__(self, values, labels, meta=None):
+        self.values = np.ascontiguousarray(values)
+        self.labels = pd.Index(labels)
+        self.dates = pd.to_datetime(self.labels, format=DATE_FORMAT)
+        self.meta = meta
+        self._key_index = {}
+
+    @classmethod
+    def from_frame(cls, df, compact=True):
+        """
+        Creates a :class:`SeriesMatrix` from a data frame parsed from a time
+        series file.
+
+        Args:
+            df (:class:`~pd.DataFrame`): Parsed time series file.
+            compact (bool): Whether to downcast the matrix and drop unused
+                metadata columns.
+
+        Returns:
+            :class:`SeriesMatrix`
+        """
+
+        meta_columns, date_columns = split_columns(df.columns)
+
+        # Missing values would be skipped when summing anyway
+        values = df[date_columns].fillna(0).to_numpy()
+        meta = df[meta_columns].reset_index(drop=True)
+
+        return cls.from_arrays(values, date_columns, meta, compact)
+
+    @classmethod
+    @timed("matrix")
+    def from_arrays(cls, values, labels, meta, compact=True):
+        """
+        Creates a :class:`SeriesMatrix` from the parts of a time series file
+        that were already split apart (e.g. while reading it in chunks, see
+        :mod:`~covid19plotter.data.stream`).
+
+        Args:
+            values (:class:`~np.ndarray`): (locations x days) matrix of values,
+                without any missing values.
+            labels (list): Date of each column of ``values``.
+            meta (:class:`~pd.DataFrame`): Metadata of each row of ``values``.
+            compact (bool): Whether to downcast the matrix and drop unused
+                metadata columns.
+
+        Returns:
+            :class:`SeriesMatrix`
+        """
+
+        if values.dtype.kind == "f" and np.all(np.mod(values, 1) == 0):
+            values = values.astype(np.int64)
+
+        meta = meta.copy()
+
+        for column in meta.columns:
+            if column in KEY_COLUMNS:
+                meta[column] = meta[column].astype("category")
+
+        if compact:
+            values = downcast(values)
+            meta = compact_meta(meta, USED_COLUMNS)
+
+        return cls(values, labels, meta)
+
+    @property
+    def is_us(self):
+        """
+        Whether the matrix was loaded from one of the US files, which have a
+        row per county rather than per province/state.
+
+        Returns:
+            bool
+        """
+
+        return self.meta is not None and COUNTY in self.meta.columns
+
+    def get_rows(self, column, value):
+        """
+        Gets the positions of the rows with the given key.
+
+        Args:
+            column (str): Key column (e.g. ``COUNTY``).
+            value (str or list): Key, or list of keys, to look up.
+
+        Returns:
+            :class:`~np.ndarray`: Positions of the matching rows, in order.
+        """
+
+        index = self._key_index.get(column)
+
+        if index is None:
+            index = self._index_column(self.meta[column])
+            self._key_index[column] = index
+
+        if type(value) != list:
+            return index.get(value, np.empty(0, dtype=np.intp))
+
+        rows = [index[v] for v in value if v in index]
+
+        if not rows:
+            return np.empty(0, dtype=np.intp)
+
+        return np.sort(np.concatenate(rows))
+
+    def select(self, filters):
+        """
+        Gets the positions of the rows matching all of the given filters.
+
+        Args:
+            filters (dict): Key, or list of keys, keyed by key column.
+
+        Returns:
+            :class:`~np.ndarray`: Positions of the matching rows, in order.
+        """
+
+        rows = None
+
+        for column, value in filters.items():
+            column_rows = self.get_rows(column, value)
+
+            if rows is None:
+                rows = column_rows
+            else:
+                rows = np.intersect1d(rows, column_rows, assume_unique=True)
+
+        if rows is None:
+            return np.arange(len(self.values))
+
+        return rows
+
+    def take(self, rows):
+        """
+        Creates a :class:`SeriesMatrix` with only the given rows.
+
+        Args:
+            rows (list): Positions of the rows to keep.
+
+        Returns:
+            :class:`SeriesMatrix`
+        """
+
+        meta = None
+
+        if self.meta is not None:
+            meta = self.meta.take(rows).reset_index(drop=True)
+
+        return SeriesMatrix(self.values.take(rows, axis=0), self.labels, meta)
+
+    def sum_rows(self, rows):
+        """
+        Sums the given rows of the matrix.
+
+        Args:
+            rows (list): Positions of the rows to sum.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        dtype = np.int64 if self.values.dtype.kind in "iu" else None
+        return self.values[rows].sum(axis=0, dtype=dtype)
+
+    def group_sum(self, columns, values=None):
+        """
+        Sums the rows of the matrix grouped by the given metadata columns. Rows
+        with a missing value in any of the columns are left out.
+
+        Args:
+            columns (list): Metadata columns to group by. Besides column names,
+                these can also be :class:`~pd.Series` holding a key for each
+                row.
+            values (:class:`~np.ndarray`): Values to sum instead of the matrix,
+                one (or one row) for each row of the matrix, e.g. the
+                population of each row.
+
+        Returns:
+            tuple: The key of each group (a tuple of the column values), the
+            (groups x days) matrix of sums, and the number of rows in each
+            group.
+        """
+
+        grouped = self.meta.groupby(columns, sort=False, observed=True)
+
+        codes = grouped.ngroup().to_numpy()
+        counts = grouped.size()
+        keys = [k if type(k) == tuple else (k,) for k in counts.index.tolist()]
+
+        valid = np.flatnonzero(codes >= 0)
+        order = valid[np.argsort(codes[valid], kind="stable")]
+        sorted_codes = codes[order]
+
+        if values is None:
+            values = self.values
+
+        # Sum in a wide dtype, as the sums may not fit in that of the matrix
+        dtype = np.int64 if values.dtype.kind in "iu" else values.dtype
+
+        if len(order) == 0:
+            sums = np.zeros((0,) + values.shape[1:], dtype)
+            return keys, sums, counts.to_numpy()
+
+        starts = np.flatnonzero(np.r_[True,
+                                      sorted_codes[1:] != sorted_codes[:-1]])
+        sums = np.add.reduceat(values[order], starts, axis=0, dtype=dtype)
+
+        return keys, sums, counts.to_numpy()
+
+    def get_memory_usage(self):
+        """
+        Gets the number of bytes taken by the matrix and its metadata.
+
+        Returns:
+            int
+        """
+
+        nbytes = get_memory_usage(self.values)
+
+        if self.meta is not None:
+            nbytes += get_memory_usage(self.meta)
+
+        return nbytes
+
+    def get_frame_memory_usage(self):
+        """
+        Estimates the number of bytes the file of the matrix would take as a
+        parsed data frame, before compacting, to compare with
+        :meth:`get_memory_usage`. See
+        :func:`~covid19plotter.data.compact.estimate_frame_memory_usage`.
+
+        Returns:
+            int
+        """
+
+        return estimate_frame_memory_usage(self.values.shape, self.meta)
+
+    def _index_column(self, column):
+        """
+        Builds the key -> row positions index for the given categorical column.
+
+        Args:
+            column (:class:`~pd.Series`): Categorical key column.
+
+        Returns:
+            dict
+        """
+
+        codes = column.cat.codes.to_numpy()
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+
+        # Split the sorted row positions wherever the code changes
+        bounds = np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1
+        groups = np.split(order, bounds)
+        categories = column.cat.categories
+
+        index = {}
+
+        for group in groups:
+            code = codes[group[0]] if len(group) else -1
+
+            # Rows with a missing key have the code -1
+            if code >= 0:
+                index[categories[code]] = group
+
+        return index
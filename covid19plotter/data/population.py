@@ -0,0 +1,154 @@
+"""
+Population
+==========
+
+Population of every location, for series per 100,000 people.
+
+The US deaths file has the population of each of its rows (counties) in its
+``Population`` column. The rows of the other files get theirs from the JHU
+lookup table, which is loaded and indexed by (country, state, county) once,
+so each file is joined to it with a single reindex. Either way, every row of a
+file has a population when it is loaded, and the populations are then summed
+with the same group sums as the series (see
+:mod:`~covid19plotter.data.aggregates`), giving the population of every
+country, state, region and county.
+"""
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.fetch import FetchError
+from covid19plotter.data.sources import COUNTRY
+from covid19plotter.data.sources import COUNTY
+from covid19plotter.data.sources import POPULATION
+from covid19plotter.data.sources import STATE
+from covid19plotter.data.sources import US_COUNTRY
+from covid19plotter.data.sources import US_STATE
+from covid19plotter.data.sources import get_lookup_url
+
+# Key of parts of a location that do not apply (e.g. the county of a country)
+NO_KEY = ""
+
+
+class PopulationTable:
+    """
+    PopulationTable class. See module documentation for more information.
+
+    Attributes:
+        _populations (:class:`~pd.Series`): Population of every location in
+            the lookup table, indexed by (country, state, county).
+    """
+
+    def __init__(self, df):
+        keys = [df[column] for column in [US_COUNTRY, US_STATE, COUNTY]]
+        populations = pd.Series(
+            pd.to_numeric(df[POPULATION], errors="coerce").to_numpy(),
+            index=pd.MultiIndex.from_arrays(_get_keys(keys)))
+
+        self._populations = populations[~populations.index.duplicated()]
+
+    def get_row_populations(self, matrix):
+        """
+        Gets the population of each row of the given matrix. Rows that are not
+        in the table are NaN.
+
+        Args:
+            matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Matrix
+                of a time series file.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        meta = matrix.meta
+
+        if matrix.is_us:
+            keys = [meta[column] for column in [US_COUNTRY, US_STATE, COUNTY]]
+        else:
+            keys = [meta[COUNTRY], meta[STATE],
+                    pd.Series(NO_KEY, index=meta.index)]
+
+        index = pd.MultiIndex.from_arrays(_get_keys(keys))
+
+        return self._populations.reindex(index).to_numpy(dtype=np.float64)
+
+
+def load_population_table(loader):
+    """
+    Loads the lookup table of every location into a :class:`PopulationTable`.
+
+    Args:
+        loader (:class:`~covid19plotter.data.loader.DataLoader`): Loader to
+            load the table with.
+
+    Returns:
+        :class:`PopulationTable`: The table, or None if it could not be
+        loaded.
+    """
+
+    try:
+        return PopulationTable(loader.load(get_lookup_url()))
+    except (FetchError, KeyError):
+        # Only the series per 100,000 people need the populations
+        return None
+
+
+def get_row_populations(matrix, table=None):
+    """
+    Gets the population of each row of the given matrix, from its own
+    ``Population`` column if it has one, or else from the given table.
+
+    Args:
+        matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Matrix of
+            a time series file.
+        table (:class:`PopulationTable`): Table to look the populations up in.
+
+    Returns:
+        :class:`~np.ndarray`: Population of each row (NaN where unknown), or
+        None if there is no population for any row.
+    """
+
+    if matrix.meta is None:
+        return None
+
+    if POPULATION in matrix.meta.columns:
+        return pd.to_numeric(matrix.meta[POPULATION], errors="coerce") \
+            .to_numpy(dtype=np.float64)
+
+    if table is not None:
+        return table.get_row_populations(matrix)
+
+    return None
+
+
+def has_populations(matrix):
+    """
+    Checks whether the given matrix has the population of each of its rows,
+    so that it does not need to be looked up.
+
+    Args:
+        matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Matrix of
+            a time series file.
+
+    Returns:
+        bool
+    """
+
+    return matrix.meta is not None and POPULATION in matrix.meta.columns
+
+
+def _get_keys(columns):
+    """
+    Converts the given key columns to plain strings, with missing keys as
+    ``NO_KEY``, so that keys of the lookup table and of time series files
+    compare equal.
+
+    Args:
+        columns (list): :class:`~pd.Series` of each part of the keys.
+
+    Returns:
+        list: :class:`~np.ndarray` of each part of the keys.
+    """
+
+    return [column.astype(object).where(column.notna(), NO_KEY).astype(str)
+            .to_numpy() for column in columns]
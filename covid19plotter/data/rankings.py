@@ -0,0 +1,211 @@
+"""
+Rankings
+========
+
+Ranks every location at one level of the hierarchy (e.g. every county of a
+state, or of the whole US) by a metric of its latest data:
+
+* ``total``: the latest running total.
+* ``daily``: the latest daily change.
+* ``average``: the average daily change over the last week.
+* ``growth``: the change in the weekly average from the week before, in
+  percent.
+
+Any of them can also be ranked per 100,000 people, except the growth, which
+does not depend on the population.
+
+Every metric only needs the last few days of the running totals, so it is
+computed for all of the locations at once from a slice of a few columns of
+the (locations x days) matrix, without computing the rolling statistics of the
+whole series. The top locations are then picked with a partial sort
+(:func:`numpy.argpartition`), and only those are sorted.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from covid19plotter.data.aggregates import LEVELS
+from covid19plotter.data.aggregates import Location
+from covid19plotter.data.stats import ONE_WEEK
+from covid19plotter.data.stats import per_capita
+
+TOTAL = "total"
+DAILY = "daily"
+AVERAGE = "average"
+GROWTH = "growth"
+METRICS = [TOTAL, DAILY, AVERAGE, GROWTH]
+
+METRIC_DESCS = {
+    TOTAL: "Total",
+    DAILY: "Daily Change",
+    AVERAGE: "7-Day Average",
+    GROWTH: "Week-over-Week Growth (%)",
+}
+
+DEFAULT_TOP = 20
+
+RankEntry = namedtuple("RankEntry", ["rank", "location", "value"])
+RankEntry.__doc__ = """
+Single entry of a ranking: its rank (from 1), its
+:class:`~covid19plotter.data.aggregates.Location` and the value of the metric.
+"""
+
+
+def get_metric(totals, metric, window=ONE_WEEK):
+    """
+    Gets the given metric of each of the given series of running totals on
+    their last day. Only the last ``2 * window + 1`` days are used.
+
+    Args:
+        totals (:class:`~np.ndarray`): Matrix with one series of running
+            totals per row.
+        metric (str): Metric to get (e.g. ``AVERAGE``).
+        window (int): Number of days in a week, for the average and growth.
+
+    Returns:
+        :class:`~np.ndarray`: Value of the metric for each row, NaN where the
+        series is too short or the metric is undefined.
+
+    Raises:
+        ValueError: If the metric is not valid.
+    """
+
+    if metric not in METRICS:
+        raise ValueError("Unknown metric: %s" % metric)
+
+    num_days = totals.shape[1]
+    last = totals[:, -min(2 * window + 1, num_days):].astype(np.float64)
+
+    def before(days):
+        # Total the given number of days before the last day
+        if days >= last.shape[1]:
+            return np.full(len(last), np.nan)
+        return last[:, -1 - days]
+
+    if metric == TOTAL:
+        return last[:, -1]
+    elif metric == DAILY:
+        return last[:, -1] - before(1)
+    elif metric == AVERAGE:
+        return (last[:, -1] - before(window)) / window
+
+    this_week = last[:, -1] - before(window)
+    last_week = before(window) - before(2 * window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (this_week / last_week - 1) * 100
+
+    growth[~(last_week > 0)] = np.nan
+
+    return growth
+
+
+def get_top(values, top):
+    """
+    Gets the positions of the largest of the given values, largest first. NaN
+    values are left out, and equal values are in the order of their
+    positions.
+
+    Args:
+        values (:class:`~np.ndarray`): Values to rank.
+        top (int): Number of positions to get.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    candidates = np.flatnonzero(~np.isnan(values))
+    top = min(top, len(candidates))
+
+    if top <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    # Partially sort so only the top values are sorted fully. Every value
+    # equal to the last of them is kept, so ties are broken by position
+    if top < len(candidates):
+        last = -np.partition(-values[candidates], top - 1)[top - 1]
+        candidates = candidates[values[candidates] >= last]
+
+    order = np.argsort(-values[candidates], kind="stable")
+
+    return candidates[order[:top]]
+
+
+def rank(index, level, metric=TOTAL, top=DEFAULT_TOP, parent=None,
+         per_capita_values=False):
+    """
+    Ranks the locations at the given level of the given index by the given
+    metric.
+
+    Args:
+        index (:class:`~covid19plotter.data.aggregates.AggregateIndex`): Index
+            of the data to rank.
+        level (str): Level of the locations to rank (e.g. ``COUNTY_LEVEL``).
+        metric (str): Metric to rank them by (e.g. ``AVERAGE``).
+        top (int): Number of locations to get.
+        parent (:class:`~covid19plotter.data.aggregates.Location`): Location
+            the ranked locations have to be part of. Defaults to all of them.
+        per_capita_values (bool): Whether to rank by the metric per 100,000
+            people.
+
+    Returns:
+        list: :class:`RankEntry` of the top locations, from the first. Those
+        without a value (e.g. without a population) are left out.
+
+    Raises:
+        ValueError: If the level is not below that of the parent location, or
+            the populations are needed and not known.
+    """
+
+    parent = parent or Location(None)
+    parent_depth = max([i + 1 for i, part in enumerate(parent) if part],
+                       default=0)
+
+    if LEVELS.index(level) < parent_depth:
+        raise ValueError("The %s level is not below %s" %
+                         (level, ", ".join(p for p in reversed(parent) if p)))
+
+    if per_capita_values and index.populations is None:
+        raise ValueError("The populations of the locations are not known")
+
+    locations = index.get_locations(level, parent)
+    rows = index.get_rows(locations)
+
+    # Only the last days are taken from the rows, not their whole series
+    values = get_metric(index.stats.totals[:, -(2 * ONE_WEEK + 1):][rows],
+                        metric)
+
+    if per_capita_values and metric != GROWTH:
+        values = per_capita(values[:, np.newaxis],
+                            index.populations[rows])[:, 0]
+
+    return [RankEntry(i + 1, locations[position], float(values[position]))
+            for i, position in enumerate(get_top(values, top).tolist())]
+
+
+def get_name(location, parent=None):
+    """
+    Gets the name of the given ranked location, made of the parts of it that
+    are not part of the given parent location (e.g. "Wayne, Michigan" for a
+    county ranked among every county of the US).
+
+    Args:
+        location (:class:`~covid19plotter.data.aggregates.Location`): Ranked
+            location.
+        parent (:class:`~covid19plotter.data.aggregates.Location`): Location
+            the ranked locations are part of.
+
+    Returns:
+        str
+    """
+
+    parent = parent or Location(None)
+    parts = [part for part, parent_part in zip(location, parent)
+             if part and part != parent_part]
+
+    # A county already names where it is without its region
+    if location.county and len(parts) > 1:
+        parts = [part for part in parts if part != location.region]
+
+    return ", ".join(reversed(parts))
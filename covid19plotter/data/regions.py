@@ -0,0 +1,353 @@
+"""
+Region Definitions
+==================
+
+Regions of US states (e.g. health districts or metro areas), each made of a
+list of counties. Besides the built-in regions (see
+:mod:`covid19plotter.regions`), regions can be loaded from a JSON file in the
+same layout::
+
+    {"Ohio": {"Columbus Metro": ["Franklin", "Delaware", 39089]}}
+
+or from a CSV file with one row per county of a region, and the columns
+``state``, ``region`` and ``county`` and/or ``fips``::
+
+    state,region,county,fips
+    Ohio,Columbus Metro,Franklin,39049
+
+Counties are given by name or by FIPS code. The file named by the
+``COVID19PLOTTER_REGIONS`` environment variable is loaded by default, on top of
+the built-in regions.
+
+When a file is loaded, the definitions are compiled against it into a map
+from the FIPS code of each county to the integer id of its region, so the
+region of every row is a single sorted lookup and each region's series is a
+group sum over the county rows. Regions may overlap (e.g. health districts and
+metro areas covering the same counties): the map then has several layers, each
+of which holds every county at most once.
+"""
+
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.sources import COUNTY
+from covid19plotter.data.sources import FIPS
+from covid19plotter.data.sources import US_STATE
+from covid19plotter.regions import REGIONS
+
+REGIONS_ENV = "COVID19PLOTTER_REGIONS"
+
+JSON_EXTENSION = ".json"
+CSV_EXTENSION = ".csv"
+
+# Columns of CSV region files
+STATE_COLUMN = "state"
+REGION_COLUMN = "region"
+COUNTY_COLUMN = "county"
+FIPS_COLUMN = "fips"
+
+# Region id of counties that are not part of any region
+NO_REGION = -1
+
+Region = namedtuple("Region", ["state", "name", "counties"])
+Region.__doc__ = """
+Definition of a single region: the name of its state, its name, and the name
+or FIPS code (an int) of each of its counties.
+"""
+
+
+class RegionDefinitions:
+    """
+    RegionDefinitions class. See module documentation for more information.
+
+    Attributes:
+        regions (list): :class:`Region` of each region, in order. A region
+            with the same state and name as an earlier one replaces it.
+    """
+
+    def __init__(self, regions=None):
+        by_key = {}
+
+        for region in regions or []:
+            by_key[(region.state, region.name)] = region
+
+        self.regions = list(by_key.values())
+
+    def __add__(self, other):
+        return RegionDefinitions(self.regions + other.regions)
+
+    def __len__(self):
+        return len(self.regions)
+
+    @classmethod
+    def from_dict(cls, regions):
+        """
+        Creates :class:`RegionDefinitions` from the counties of each region,
+        keyed by the state and then the name of the region.
+
+        Args:
+            regions (dict): Regions of each state.
+
+        Returns:
+            :class:`RegionDefinitions`
+        """
+
+        return cls([Region(state, name, [_parse_county(c) for c in counties])
+                    for state, state_regions in regions.items()
+                    for name, counties in state_regions.items()])
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads region definitions from a JSON or CSV file.
+
+        Args:
+            path (str): Path of the file.
+
+        Returns:
+            :class:`RegionDefinitions`
+
+        Raises:
+            ValueError: If the file is not a valid region file.
+        """
+
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension == JSON_EXTENSION:
+            with open(path) as f:
+                return cls.from_dict(json.load(f))
+        elif extension == CSV_EXTENSION:
+            return cls._load_csv(path)
+
+        raise ValueError("Unknown region file format: %s" % path)
+
+    def compile(self, matrix):
+        """
+        Compiles the definitions against the rows of a US file, into a map
+        from the FIPS code of each county to the id of its region.
+
+        Args:
+            matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Matrix
+                of a US file.
+
+        Returns:
+            :class:`RegionMap`
+        """
+
+        codes = get_county_codes(matrix)
+        states = matrix.meta[US_STATE].astype(object).to_numpy()
+        counties = matrix.meta[COUNTY].astype(object).to_numpy()
+
+        # Counties named in the definitions are looked up in the file once
+        named_codes = {(state, county): code for state, county, code
+                       in zip(states, counties, codes.tolist())}
+
+        layers = []
+
+        for region_id, region in enumerate(self.regions):
+            region_codes = set()
+
+            for county in region.counties:
+                if type(county) == int:
+                    region_codes.add(county)
+                elif (region.state, county) in named_codes:
+                    region_codes.add(named_codes[(region.state, county)])
+
+            # Put the region in the first layer none of its counties are in
+            for layer in layers:
+                if not region_codes & layer.keys():
+                    break
+            else:
+                layer = {}
+                layers.append(layer)
+
+            for code in region_codes:
+                layer[code] = region_id
+
+        return RegionMap([(region.state, region.name)
+                          for region in self.regions],
+                         [_to_arrays(layer) for layer in layers if layer])
+
+    @classmethod
+    def _load_csv(cls, path):
+        """
+        Loads region definitions from a CSV file.
+
+        Args:
+            path (str): Path of the file.
+
+        Returns:
+            :class:`RegionDefinitions`
+
+        Raises:
+            ValueError: If the file is not a valid region file.
+        """
+
+        df = pd.read_csv(path, dtype=str)
+        df.columns = [column.strip().lower() for column in df.columns]
+
+        if STATE_COLUMN not in df.columns or REGION_COLUMN not in df.columns \
+                or (COUNTY_COLUMN not in df.columns and
+                    FIPS_COLUMN not in df.columns):
+            raise ValueError("A region file needs the columns %s, %s and %s "
+                             "or %s" % (STATE_COLUMN, REGION_COLUMN,
+                                        COUNTY_COLUMN, FIPS_COLUMN))
+
+        regions = {}
+
+        for row in df.to_dict("records"):
+            state, region = row[STATE_COLUMN], row[REGION_COLUMN]
+
+            # FIPS codes identify counties even if their names differ
+            county = row.get(FIPS_COLUMN)
+
+            if not _is_set(county):
+                county = row.get(COUNTY_COLUMN)
+
+            if not (_is_set(state) and _is_set(region) and _is_set(county)):
+                continue
+
+            regions.setdefault(state.strip(), {}) \
+                .setdefault(region.strip(), []).append(county.strip())
+
+        return cls.from_dict(regions)
+
+
+class RegionMap:
+    """
+    RegionMap class. See module documentation for more information.
+
+    Attributes:
+        regions (list): (state, name) of each region, by id.
+        layers (list): (codes, ids) of each layer of the map: the sorted FIPS
+            codes of the counties in the layer, and the id of the region of
+            each of them.
+    """
+
+    def __init__(self, regions, layers):
+        self.regions = regions
+        self.layers = layers
+
+    def get_row_regions(self, matrix):
+        """
+        Gets the id of the region of each row of the given matrix, in each
+        layer of the map.
+
+        Args:
+            matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Matrix
+                the map was compiled against.
+
+        Returns:
+            list: :class:`~np.ndarray` of the region id of each row (or
+            ``NO_REGION``) for each layer.
+        """
+
+        codes = get_county_codes(matrix)
+        row_regions = []
+
+        for layer_codes, layer_ids in self.layers:
+            positions = np.searchsorted(layer_codes, codes)
+            positions = np.minimum(positions, len(layer_codes) - 1)
+
+            found = layer_codes[positions] == codes
+            row_regions.append(np.where(found, layer_ids[positions],
+                                        NO_REGION))
+
+        return row_regions
+
+
+def get_county_codes(matrix):
+    """
+    Gets the FIPS code of each row of a US file. Rows without a FIPS code (or
+    all rows, if the file has no FIPS column) get a unique negative code, so
+    they can still be part of a region by name.
+
+    Args:
+        matrix (:class:`~covid19plotter.data.matrix.SeriesMatrix`): Matrix of
+            a US file.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    codes = -np.arange(2, len(matrix.values) + 2, dtype=np.int64)
+
+    if FIPS in matrix.meta.columns:
+        fips = pd.to_numeric(matrix.meta[FIPS], errors="coerce").to_numpy()
+        known = ~np.isnan(fips)
+        codes[known] = fips[known].astype(np.int64)
+
+    return codes
+
+
+def get_default_regions():
+    """
+    Gets the built-in regions, along with those in the file named by the
+    ``COVID19PLOTTER_REGIONS`` environment variable, if set.
+
+    Returns:
+        :class:`RegionDefinitions`
+    """
+
+    regions = RegionDefinitions.from_dict(REGIONS)
+    path = os.environ.get(REGIONS_ENV)
+
+    if path:
+        regions += RegionDefinitions.load(path)
+
+    return regions
+
+
+def _is_set(value):
+    """
+    Checks whether a cell of a CSV region file holds a value.
+
+    Args:
+        value (object): Value of the cell, NaN if it is empty.
+
+    Returns:
+        bool
+    """
+
+    return isinstance(value, str) and bool(value.strip())
+
+
+def _parse_county(county):
+    """
+    Parses a county of a region definition, which is either a name or a FIPS
+    code.
+
+    Args:
+        county (object): Name or FIPS code (as an int or a string of digits).
+
+    Returns:
+        object: The name, or the FIPS code as an int.
+    """
+
+    if isinstance(county, (int, np.integer)):
+        return int(county)
+
+    county = str(county).strip()
+
+    return int(county) if county.isdigit() else county
+
+
+def _to_arrays(layer):
+    """
+    Converts a layer of a :class:`RegionMap` to sorted arrays.
+
+    Args:
+        layer (dict): Region id keyed by FIPS code.
+
+    Returns:
+        tuple: The sorted FIPS codes, and the region id of each of them.
+    """
+
+    codes = np.array(sorted(layer), dtype=np.int64)
+    ids = np.array([layer[code] for code in codes.tolist()], dtype=np.int32)
+
+    return codes, ids
@@ -0,0 +1,262 @@
+"""
+Dataset Registry
+================
+
+Lazily loads the time series files. A file is only loaded (and its
+:class:`~covid19plotter.data.aggregates.AggregateIndex` built) the first time
+it is needed, while files that are likely to be needed next can be prefetched
+in the background.
+
+Files without the population of each of their rows get them from the lookup
+table of every location (see :mod:`~covid19plotter.data.population`), which is
+loaded the first time it is needed and shared by all of them.
+"""
+
+import threading
+from collections import namedtuple
+from concurrent.futures import CancelledError
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from covid19plotter.data.aggregates import AggregateIndex
+from covid19plotter.data.cache import split_columns
+from covid19plotter.data.loader import DataLoader
+from covid19plotter.data.population import has_populations
+from covid19plotter.data.population import load_population_table
+from covid19plotter.data.regions import get_default_regions
+from covid19plotter.data.sources import DATASETS
+from covid19plotter.data.sources import DATE_FORMAT
+from covid19plotter.data.sources import get_url
+
+PREFETCH_WORKERS = 2
+
+MemoryUsage = namedtuple("MemoryUsage", ["frame", "matrix", "index"])
+MemoryUsage.__doc__ = """
+Number of bytes taken by a loaded file: as it would be parsed into a data frame
+before compacting (estimated from the shape and metadata of the matrix), as the
+compacted :class:`~covid19plotter.data.matrix.SeriesMatrix` it is read into,
+and as the :class:`~covid19plotter.data.aggregates.AggregateIndex` that is
+kept. Indexes given to the registry already loaded (e.g. from a store) only
+have the size of the index; the others are None.
+"""
+
+
+class DatasetRegistry:
+    """
+    DatasetRegistry class. See module documentation for more information.
+
+    Attributes:
+        _loader (:class:`~covid19plotter.data.loader.DataLoader`): Loader used
+            to load the files.
+        _futures (dict): Loaded or loading indexes, keyed by (kind, region).
+        _executor (:class:`~concurrent.futures.ThreadPoolExecutor`): Executor
+            used for prefetching.
+        _memory (dict): :class:`MemoryUsage` of each file loaded by the
+            registry, keyed by (kind, region).
+        _population_table (:class:`~concurrent.futures.Future`): Loaded or
+            loading :class:`~covid19plotter.data.population.PopulationTable`,
+            or None if it is not needed yet.
+        _regions (:class:`~covid19plotter.data.regions.RegionDefinitions`):
+            Regions of the US states, or None to load the default regions the
+            first time a file is loaded.
+    """
+
+    def __init__(self, loader=None, prefetch_workers=PREFETCH_WORKERS,
+                 indexes=None, regions=None):
+        self._loader = loader or DataLoader()
+        self._regions = regions
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers)
+        self._memory = {}
+        self._population_table = None
+
+        for key, index in (indexes or {}).items():
+            future = Future()
+            future.set_result(index)
+            self._futures[key] = future
+            self._memory[key] = MemoryUsage(None, None,
+                                            index.get_memory_usage())
+
+    def get(self, kind, region):
+        """
+        Gets the :class:`~covid19plotter.data.aggregates.AggregateIndex` for
+        the given kind and region, loading it if it has not been loaded yet.
+
+        A file that is queued for prefetching but has not started loading is
+        taken off the queue and loaded in the calling thread, rather than
+        waiting behind the prefetches queued before it. Only a file that is
+        already loading is waited for.
+
+        Args:
+            kind (str): Kind of data (e.g. "confirmed", "deaths").
+            region (str): Region of the data ("global" or "US").
+
+        Returns:
+            :class:`~covid19plotter.data.aggregates.AggregateIndex`
+        """
+
+        key = (kind, region)
+
+        while True:
+            with self._lock:
+                future = self._futures.get(key)
+
+                # Cancelling only succeeds if the prefetch has not started
+                owner = future is None or future.cancel() or \
+                    (future.done() and future.exception() is not None)
+
+                if owner:
+                    future = Future()
+                    self._futures[key] = future
+
+            if owner:
+                # Load in the calling thread rather than queueing up behind any
+                # prefetches
+                self._load(key, future)
+
+            try:
+                return future.result()
+            except CancelledError:
+                # Another thread took over the queued prefetch this thread was
+                # waiting for, so wait for that thread instead
+                continue
+
+    def prefetch(self, *keys):
+        """
+        Starts loading the given files in the background, in order.
+
+        Args:
+            *keys (tuple): (kind, region) of each file to load.
+        """
+
+        for key in keys:
+            with self._lock:
+                if key in self._futures:
+                    continue
+
+                future = Future()
+                self._futures[key] = future
+
+            self._executor.submit(self._load, key, future)
+
+    def get_loaded(self):
+        """
+        Gets the indexes that have finished loading, e.g. to create a registry
+        with the same data in another process.
+
+        Returns:
+            dict: Indexes keyed by (kind, region).
+        """
+
+        with self._lock:
+            futures = list(self._futures.items())
+
+        return {key: future.result() for key, future in futures
+                if future.done() and not future.cancelled() and
+                future.exception() is None}
+
+    def get_memory_usage(self):
+        """
+        Gets how much memory each file loaded by the registry takes.
+
+        Returns:
+            dict: :class:`MemoryUsage` keyed by (kind, region).
+        """
+
+        with self._lock:
+            return dict(self._memory)
+
+    def get_last_updated(self, keys=None):
+        """
+        Gets the date of the most recent data in any of the files. Only the
+        header lines are read, so this is cheap even if nothing is loaded yet.
+
+        Args:
+            keys (list): (kind, region) of each file to check. Defaults to all
+                files.
+
+        Returns:
+            :class:`~datetime.datetime`
+        """
+
+        urls = [get_url(*key) for key in keys or DATASETS]
+        headers = self._loader.load_headers(urls)
+
+        dates = []
+
+        for columns in headers:
+            _, date_columns = split_columns(columns)
+            dates.append(datetime.strptime(date_columns[-1], DATE_FORMAT))
+
+        return max(dates)
+
+    def close(self):
+        """
+        Stops prefetching. Indexes that have already been loaded can still be
+        used.
+        """
+
+        self._executor.shutdown(wait=False)
+
+    def _load(self, key, future):
+        """
+        Loads the file for the given key, and stores its index in the given
+        future.
+
+        Args:
+            key (tuple): (kind, region) of the file.
+            future (:class:`~concurrent.futures.Future`): Future to store the
+                index (or error) in.
+        """
+
+        if not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            matrix = self._loader.load_matrix(get_url(*key))
+            populations = None
+
+            if not has_populations(matrix):
+                table = self._get_population_table()
+
+                if table is not None:
+                    populations = table.get_row_populations(matrix)
+
+            if self._regions is None:
+                self._regions = get_default_regions()
+
+            index = AggregateIndex(matrix, self._regions, populations)
+
+            with self._lock:
+                self._memory[key] = MemoryUsage(
+                    matrix.get_frame_memory_usage(),
+                    matrix.get_memory_usage(), index.get_memory_usage())
+
+            future.set_result(index)
+        except Exception as e:
+            future.set_exception(e)
+
+    def _get_population_table(self):
+        """
+        Gets the table of the population of every location, loading it if it
+        has not been loaded yet.
+
+        Returns:
+            :class:`~covid19plotter.data.population.PopulationTable`: The
+            table, or None if it could not be loaded.
+        """
+
+        with self._lock:
+            future = self._population_table
+            owner = future is None
+
+            if owner:
+                future = Future()
+                self._population_table = future
+
+        if owner:
+            future.set_result(load_population_table(self._loader))
+
+        return future.result()
@@ -0,0 +1,73 @@
+"""
+Sources
+=======
+
+Locations and layout of the John Hopkins University time series files. The
+base URL can be pointed somewhere else (e.g. a local server hosting fixture
+files) with the ``COVID19PLOTTER_BASE_URL`` environment variable, and the URL
+of the lookup table holding the population of every location with the
+``COVID19PLOTTER_LOOKUP_URL`` environment variable.
+"""
+
+import os
+
+BASE_URL = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data" \
+           "/csse_covid_19_time_series/time_series_covid19_%s_%s.csv"
+BASE_URL_ENV = "COVID19PLOTTER_BASE_URL"
+
+LOOKUP_URL = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data" \
+             "/UID_ISO_FIPS_LookUp_Table.csv"
+LOOKUP_URL_ENV = "COVID19PLOTTER_LOOKUP_URL"
+
+DATE_FORMAT = "%m/%d/%y"
+
+GLOBAL = "global"
+US = "US"
+
+CONFIRMED = "confirmed"
+DEATHS = "deaths"
+RECOVERED = "recovered"
+
+# Columns of the global files
+COUNTRY = "Country/Region"
+STATE = "Province/State"
+
+# Columns of the US files
+US_COUNTRY = "Country_Region"
+US_STATE = "Province_State"
+COUNTY = "Admin2"
+FIPS = "FIPS"
+
+# Column of the US deaths file and of the lookup table
+POPULATION = "Population"
+
+# All (kind, region) combinations published by JHU
+DATASETS = [(CONFIRMED, GLOBAL), (DEATHS, GLOBAL), (RECOVERED, GLOBAL),
+            (CONFIRMED, US), (DEATHS, US)]
+
+
+def get_url(kind, region):
+    """
+    Gets the URL of the time series file for the given kind and region.
+
+    Args:
+        kind (str): Kind of data (e.g. "confirmed", "deaths").
+        region (str): Region of the data ("global" or "US").
+
+    Returns:
+        str
+    """
+
+    return os.environ.get(BASE_URL_ENV, BASE_URL) % (kind, region)
+
+
+def get_lookup_url():
+    """
+    Gets the URL of the lookup table of every location, which holds their
+    populations.
+
+    Returns:
+        str
+    """
+
+    return os.environ.get(LOOKUP_URL_ENV, LOOKUP_URL)
@@ -0,0 +1,455 @@
+"""
+Rolling Statistics
+==================
+
+Statistics over the time series of every location at once: daily changes,
+rolling sums and means over any window (trailing or centered), growth rates
+and doubling times. Everything is computed over a whole (locations x days)
+matrix with cumulative sums, so each statistic is a few vectorized passes no
+matter the window, and is then cached, so the statistics for a single chart are
+a slice of a row.
+
+Missing values (e.g. the daily change on the first day) make any window they
+fall into missing, the same as ``pd.Series.rolling`` does.
+
+The starting day of each location, from which it is plotted, is the first day
+its value reaches 1% of its maximum value. The starting days of the daily
+changes are computed from a temporary matrix of integer differences, so
+building an index does not leave a (locations x days) float matrix of daily
+changes cached; that is only kept once something asks for the daily changes.
+
+Series per 100,000 people are a single divide of the whole matrix by the
+population of every location (see :mod:`~covid19plotter.data.population`).
+"""
+
+import threading
+
+import numpy as np
+
+from covid19plotter.profiling import span
+
+ONE_WEEK = 7
+
+# Fraction of the maximum value a series has to reach on its starting day
+STARTING_THRESHOLD = 0.01
+
+# Number of people per-capita values are given for
+PER_CAPITA = 100000
+
+
+def get_daily_values(values):
+    """
+    Gets the increase in value on each day of the given series. There is no
+    increase for the first day, so it is NaN.
+
+    Args:
+        values (:class:`~np.ndarray`): Series of values, or a matrix with one
+            series per row.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+
+    daily_values = np.empty_like(values)
+    daily_values[..., 0] = np.nan
+    daily_values[..., 1:] = np.diff(values, axis=-1)
+
+    return daily_values
+
+
+def rolling_sum(values, window):
+    """
+    Gets the sum of each window of the given series, on the last day of the
+    window. The first ``window - 1`` days are NaN.
+
+    Args:
+        values (:class:`~np.ndarray`): Series of values, or a matrix with one
+            series per row.
+        window (int): Number of days in each window.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+
+    # Prefix sums with a leading zero, so each window is a difference of two
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    sums = np.pad(np.cumsum(np.where(missing, 0, values), axis=-1), pad,
+                  mode="constant")
+    num_missing = np.pad(np.cumsum(missing, axis=-1), pad, mode="constant")
+
+    window_sums = sums[..., window:] - sums[..., :-window]
+    window_sums[num_missing[..., window:] > num_missing[..., :-window]] = \
+        np.nan
+
+    result = np.full(values.shape, np.nan)
+    result[..., window - 1:] = window_sums
+
+    return result
+
+
+def rolling_mean(values, window, center=False):
+    """
+    Gets the mean of each window of the given series, on the last day of the
+    window, or on its middle day if centered.
+
+    Args:
+        values (:class:`~np.ndarray`): Series of values, or a matrix with one
+            series per row.
+        window (int): Number of days in each window.
+        center (bool): Whether to put each mean on the middle day of its window
+            rather than the last.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    means = rolling_sum(values, window) / window
+
+    if center:
+        shift = (window - 1) // 2
+
+        if shift:
+            means[..., :-shift] = means[..., shift:]
+            means[..., -shift:] = np.nan
+
+    return means
+
+
+def growth_rate(totals, window=ONE_WEEK):
+    """
+    Gets the average daily growth rate of the given running totals over each
+    window (e.g. 0.1 for 10% growth a day). Days where the total at the start
+    of the window is not positive are NaN.
+
+    Args:
+        totals (:class:`~np.ndarray`): Series of running totals, or a matrix
+            with one series per row.
+        window (int): Number of days in each window.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    ratios = _get_growth_ratios(totals, window)
+
+    with np.errstate(invalid="ignore"):
+        return np.power(ratios, 1.0 / window) - 1
+
+
+def doubling_time(totals, window=ONE_WEEK):
+    """
+    Gets the number of days the given running totals take to double, at the
+    rate they grew over each window. Days without any growth are NaN.
+
+    Args:
+        totals (:class:`~np.ndarray`): Series of running totals, or a matrix
+            with one series per row.
+        window (int): Number of days in each window.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    ratios = _get_growth_ratios(totals, window)
+    ratios[~(ratios > 1)] = np.nan
+
+    return window * np.log(2) / np.log(ratios)
+
+
+def get_starting_days(values, threshold=STARTING_THRESHOLD):
+    """
+    Gets the position of the first day the given series reaches the given
+    fraction of its maximum value. Missing values are skipped.
+
+    Args:
+        values (:class:`~np.ndarray`): Series of values, or a matrix with one
+            series per row.
+        threshold (float): Fraction of the maximum value.
+
+    Returns:
+        :class:`~np.ndarray`: Position of the starting day of each series (or
+        a single position for a single series).
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    values = np.where(np.isnan(values), -np.inf, values)
+
+    maximums = values.max(axis=-1, keepdims=True)
+
+    return np.argmax(values > maximums * threshold, axis=-1)
+
+
+def get_daily_starting_days(totals, threshold=STARTING_THRESHOLD):
+    """
+    Gets the starting days of the daily changes of the given running totals,
+    the same as :func:`get_starting_days` of :func:`get_daily_values` would,
+    without keeping the daily changes. Integer totals are differenced as
+    integers.
+
+    Args:
+        totals (:class:`~np.ndarray`): Series of running totals, or a matrix
+            with one series per row.
+        threshold (float): Fraction of the maximum value.
+
+    Returns:
+        :class:`~np.ndarray`: Position of the starting day of each series (or
+        a single position for a single series).
+    """
+
+    totals = np.asarray(totals)
+
+    if totals.shape[-1] < 2:
+        return np.zeros(totals.shape[:-1], dtype=np.intp)
+
+    # Differences of integers are exact in int64, whatever the dtype of the
+    # totals
+    dtype = np.int64 if totals.dtype.kind in "iub" else np.float64
+    daily = np.subtract(totals[..., 1:], totals[..., :-1], dtype=dtype)
+
+    if dtype == np.float64:
+        daily[np.isnan(daily)] = -np.inf
+
+    reached = daily > daily.max(axis=-1, keepdims=True) * threshold
+
+    # There is no daily change on the first day, so positions are shifted by
+    # one, and series that never reach the threshold start on the first day
+    return np.where(reached.any(axis=-1), np.argmax(reached, axis=-1) + 1, 0)
+
+
+def per_capita(values, populations):
+    """
+    Divides the given series by the given populations, giving the values per
+    ``PER_CAPITA`` people. Series without a (positive) population are NaN.
+
+    Args:
+        values (:class:`~np.ndarray`): Matrix with one series per row.
+        populations (:class:`~np.ndarray`): Population of each row.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    populations = np.asarray(populations, dtype=np.float64)
+    populations = np.where(populations > 0, populations, np.nan)
+
+    return np.asarray(values, dtype=np.float64) * \
+        (PER_CAPITA / populations)[:, np.newaxis]
+
+
+def _get_growth_ratios(totals, window):
+    """
+    Gets the ratio of each running total to the total ``window`` days before.
+
+    Args:
+        totals (:class:`~np.ndarray`): Series of running totals, or a matrix
+            with one series per row.
+        window (int): Number of days in each window.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    totals = np.asarray(totals, dtype=np.float64)
+    ratios = np.full(totals.shape, np.nan)
+
+    before = totals[..., :-window]
+    after = totals[..., window:]
+    valid = before > 0
+
+    ratios[..., window:][valid] = after[valid] / before[valid]
+
+    return ratios
+
+
+class RollingStats:
+    """
+    RollingStats class. See module documentation for more information.
+
+    Attributes:
+        totals (:class:`~np.ndarray`): (locations x days) matrix of running
+            totals.
+        _cache (dict): Statistics computed so far, keyed by their name and
+            parameters.
+        _lock (:class:`~threading.Lock`): Lock for ``_cache``.
+    """
+
+    def __init__(self, totals, daily=None, starting_days=None):
+        self.totals = np.atleast_2d(totals)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        # Statistics that were already computed elsewhere (e.g. stored)
+        if daily is not None:
+            self._cache["daily"] = daily
+
+        for is_daily, days in (starting_days or {}).items():
+            self._cache[("starting_days", is_daily)] = days
+
+    def get_daily(self):
+        """
+        Gets the daily changes of every location.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        return self._get("daily", lambda: get_daily_values(self.totals))
+
+    def get_mean(self, window=ONE_WEEK, center=False, daily=True):
+        """
+        Gets the rolling means of every location.
+
+        Args:
+            window (int): Number of days in each window.
+            center (bool): Whether to put each mean on the middle day of its
+                window rather than the last.
+            daily (bool): Whether to average the daily changes rather than the
+                running totals.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        return self._get(("mean", window, center, daily), lambda: rolling_mean(
+            self.get_daily() if daily else self.totals, window, center))
+
+    def get_growth_rate(self, window=ONE_WEEK):
+        """
+        Gets the daily growth rates of every location over each window.
+
+        Args:
+            window (int): Number of days in each window.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        return self._get(("growth_rate", window),
+                         lambda: growth_rate(self.totals, window))
+
+    def get_doubling_time(self, window=ONE_WEEK):
+        """
+        Gets the doubling times of every location over each window.
+
+        Args:
+            window (int): Number of days in each window.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        return self._get(("doubling_time", window),
+                         lambda: doubling_time(self.totals, window))
+
+    def get_starting_days(self, daily=False):
+        """
+        Gets the starting day of every location. The daily changes are only
+        cached if they were already computed.
+
+        Args:
+            daily (bool): Whether to get the starting day of the daily changes
+                rather than the running totals.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        if not daily:
+            return self._get(("starting_days", daily),
+                             lambda: get_starting_days(self.totals))
+
+        with self._lock:
+            daily_values = self._cache.get("daily")
+
+        if daily_values is not None:
+            return self._get(("starting_days", daily),
+                             lambda: get_starting_days(daily_values))
+
+        return self._get(("starting_days", daily),
+                         lambda: get_daily_starting_days(self.totals))
+
+    def get_memory_usage(self):
+        """
+        Gets the number of bytes taken by the statistics computed so far.
+
+        Returns:
+            int
+        """
+
+        with self._lock:
+            return sum(int(result.nbytes) for result in self._cache.values())
+
+    def get_location_stats(self, row):
+        """
+        Gets the statistics of a single location.
+
+        Args:
+            row (int): Row of the location in ``totals``.
+
+        Returns:
+            :class:`LocationStats`
+        """
+
+        return LocationStats(self, row)
+
+    def _get(self, key, compute):
+        """
+        Gets a statistic from the cache, computing it if it is not there yet.
+
+        Args:
+            key (object): Name and parameters of the statistic.
+            compute (function): Function computing the statistic.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        with self._lock:
+            result = self._cache.get(key)
+
+        if result is None:
+            with span("stats"):
+                result = compute()
+
+            # Statistics are only ever read, so they can be shared
+            result.flags.writeable = False
+
+            with self._lock:
+                result = self._cache.setdefault(key, result)
+
+        return result
+
+
+class LocationStats:
+    """
+    Statistics of a single location of a :class:`RollingStats`. Each getter
+    returns a row of the statistic computed for every location.
+
+    Attributes:
+        _stats (:class:`RollingStats`): Statistics of every location.
+        _row (int): Row of the location.
+    """
+
+    def __init__(self, stats, row):
+        self._stats = stats
+        self._row = row
+
+    def get_daily(self):
+        return self._stats.get_daily()[self._row]
+
+    def get_mean(self, window=ONE_WEEK, center=False, daily=True):
+        return self._stats.get_mean(window, center, daily)[self._row]
+
+    def get_growth_rate(self, window=ONE_WEEK):
+        return self._stats.get_growth_rate(window)[self._row]
+
+    def get_doubling_time(self, window=ONE_WEEK):
+        return self._stats.get_doubling_time(window)[self._row]
+
+    def get_starting_day(self, daily=False):
+        return int(self._stats.get_starting_days(daily)[self._row])
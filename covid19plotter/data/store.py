@@ -0,0 +1,200 @@
+"""
+Series Store
+============
+
+Shared on-disk store of loaded datasets, for hosts running several processes
+(renderers, the server, notebooks) that would otherwise each load and hold
+their own copy of every file.
+
+Each :class:`~covid19plotter.data.aggregates.AggregateIndex` is written as
+plain ``.npy`` files holding its (locations x days) matrices, next to a small
+JSON file with everything else (dates, locations, hierarchy). Opening the store
+memory-maps the matrices read-only with :func:`numpy.load`, so nothing is
+copied: every process reading the same store shares the same pages of the OS
+page cache, and memory is paid once per host.
+
+Every save writes the matrices to new files, named after a random generation
+id that is recorded in the JSON file, and then atomically replaces the JSON
+file. A store can therefore be updated while other processes have it open:
+readers always see the matrices of a single save, and the ones that have the
+old files mapped keep reading them until they open the store again.
+
+Usage::
+
+    python -m covid19plotter.data.store [directory]
+"""
+
+import glob
+import json
+import os
+import sys
+import uuid
+
+import numpy as np
+
+from covid19plotter.data.aggregates import AggregateIndex
+from covid19plotter.data.cache import get_cache_dir
+from covid19plotter.data.registry import DatasetRegistry
+from covid19plotter.data.sources import DATASETS
+from covid19plotter.data.stats import RollingStats
+
+STORE_VERSION = 1
+STORE_DIR = "store"
+
+VALUES = "values"
+DAILY = "daily"
+STARTING_DAYS = "starting_days"
+DAILY_STARTING_DAYS = "daily_starting_days"
+
+ARRAYS = [VALUES, DAILY, STARTING_DAYS, DAILY_STARTING_DAYS]
+
+GENERATION = "generation"
+
+
+class SeriesStore:
+    """
+    SeriesStore class. See module documentation for more information.
+
+    Attributes:
+        directory (str): Directory of the store.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(get_cache_dir(), STORE_DIR)
+
+    def save(self, key, index):
+        """
+        Writes the given index to the store.
+
+        Args:
+            key (tuple): (kind, region) of the file the index was built from.
+            index (:class:`~covid19plotter.data.aggregates.AggregateIndex`):
+                Index to write.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        values, parts = index.to_parts()
+        arrays = {
+            VALUES: values,
+            DAILY: index.stats.get_daily(),
+            STARTING_DAYS: index.stats.get_starting_days(),
+            DAILY_STARTING_DAYS: index.stats.get_starting_days(daily=True),
+        }
+
+        generation = uuid.uuid4().hex
+
+        # Nothing refers to the new files until the JSON file is replaced
+        for name, array in arrays.items():
+            np.save(self._get_path(key, generation, name),
+                    np.ascontiguousarray(array))
+
+        parts["version"] = STORE_VERSION
+        parts[GENERATION] = generation
+        path = self._get_path(key)
+
+        with open(path + ".tmp", "w") as f:
+            json.dump(parts, f)
+
+        os.replace(path + ".tmp", path)
+
+        # Processes that have the old files open keep them until they close
+        for old_path in glob.glob(self._get_path(key, "*", "*")):
+            if not old_path.startswith(self._get_path(key, generation, "")):
+                os.remove(old_path)
+
+    def load(self, key):
+        """
+        Opens the index stored for the given key, with its matrices
+        memory-mapped read-only.
+
+        Args:
+            key (tuple): (kind, region) of the file the index was built from.
+
+        Returns:
+            :class:`~covid19plotter.data.aggregates.AggregateIndex`: The
+            index, or None if it is not in the store.
+        """
+
+        # The store can be saved again between reading the JSON file and
+        # opening the matrices it refers to, so try again once if they are gone
+        for _ in range(2):
+            try:
+                with open(self._get_path(key)) as f:
+                    parts = json.load(f)
+            except (IOError, ValueError):
+                return None
+
+            if parts.get("version") != STORE_VERSION:
+                return None
+
+            try:
+                arrays = {name: np.load(self._get_path(key, parts[GENERATION],
+                                                       name), mmap_mode="r")
+                          for name in ARRAYS}
+            except IOError:
+                continue
+
+            starting_days = {False: arrays[STARTING_DAYS],
+                             True: arrays[DAILY_STARTING_DAYS]}
+            stats = RollingStats(arrays[VALUES], arrays[DAILY], starting_days)
+
+            return AggregateIndex.from_parts(arrays[VALUES], parts, stats)
+
+        return None
+
+    def load_all(self, keys=None):
+        """
+        Opens every index in the store, e.g. to create a
+        :class:`~covid19plotter.data.DatasetRegistry` with them.
+
+        Args:
+            keys (list): (kind, region) of each index to open. Defaults to all
+                files.
+
+        Returns:
+            dict: Indexes keyed by (kind, region). Keys that are not in the
+            store are left out.
+        """
+
+        indexes = {}
+
+        for key in keys or DATASETS:
+            index = self.load(key)
+
+            if index is not None:
+                indexes[key] = index
+
+        return indexes
+
+    def _get_path(self, key, generation=None, name=None):
+        """
+        Gets the path of a file of the given index.
+
+        Args:
+            key (tuple): (kind, region) of the index.
+            generation (str): Generation of the matrix, or None for the JSON
+                file.
+            name (str): Name of the matrix.
+
+        Returns:
+            str
+        """
+
+        base = os.path.join(self.directory, "%s_%s" % key)
+
+        if generation is None:
+            return base + ".json"
+
+        return "%s.%s.%s" % (base, generation, name + ".npy" if name else "")
+
+
+if __name__ == "__main__":
+    store = SeriesStore(sys.argv[1] if len(sys.argv) > 1 else None)
+    registry = DatasetRegistry()
+    registry.prefetch(*DATASETS)
+
+    for key in DATASETS:
+        store.save(key, registry.get(*key))
+
+    print("Wrote %d datasets to %s" % (len(DATASETS), store.directory))
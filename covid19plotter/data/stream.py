@@ -0,0 +1,162 @@
+"""
+Streaming Ingestion
+===================
+
+Reads a time series file in chunks of rows rather than parsing the whole wide
+table at once. Each chunk is split into its metadata and its date values as
+soon as it is parsed, the values are stored in the smallest integer dtype that
+holds them (see :mod:`~covid19plotter.data.compact`), and the parsed text is
+dropped before the next chunk is read. Metadata columns that are not kept are
+never parsed at all.
+
+Only one chunk is ever held as a :class:`~pd.DataFrame`, so the memory needed
+to read a file stays close to the size of the compacted
+:class:`~covid19plotter.data.matrix.SeriesMatrix`, however long the file is.
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.compact import downcast
+from covid19plotter.data.matrix import SeriesMatrix
+from covid19plotter.data.matrix import USED_COLUMNS
+from covid19plotter.data.sources import DATE_FORMAT
+from covid19plotter.profiling import timed
+
+CHUNK_ROWS = 1000
+
+
+@timed("parse")
+def read_arrays(f, chunk_rows=CHUNK_ROWS, meta_columns=None):
+    """
+    Reads a time series file in chunks of rows, splitting it into its metadata
+    and its date values.
+
+    Args:
+        f (object): Path or file object of the CSV file.
+        chunk_rows (int): Number of rows to parse at a time.
+        meta_columns (list): Metadata columns to keep, where present. Defaults
+            to all of them.
+
+    Returns:
+        tuple: The :class:`~pd.DataFrame` of metadata, the date columns, and
+        the (locations x days) matrix of values.
+    """
+
+    def use_column(column):
+        return meta_columns is None or column in meta_columns or \
+            _is_date(column)
+
+    # Some of the metadata columns that are kept (e.g. "Country/Region")
+    # contain a "/" too, so the columns are split by parsing them. They are
+    # taken from the header, as a file without rows may have no chunks at all
+    columns = _read_columns(f, use_column)
+    date_columns = [c for c in columns if _is_date(c)]
+    chunk_meta_columns = [c for c in columns if not _is_date(c)]
+
+    meta_chunks = []
+    value_chunks = []
+
+    for chunk in pd.read_csv(f, chunksize=chunk_rows, usecols=use_column):
+        if chunk.empty:
+            continue
+
+        value_chunks.append(get_values(chunk, date_columns))
+        meta_chunks.append(chunk[chunk_meta_columns])
+
+    if not value_chunks:
+        meta_chunks.append(pd.DataFrame(columns=chunk_meta_columns))
+        value_chunks.append(np.zeros((0, len(date_columns)), dtype=np.int8))
+
+    meta = pd.concat(meta_chunks, ignore_index=True, sort=False)
+
+    # Chunks can have different dtypes, which are promoted to the widest one
+    values = np.concatenate(value_chunks, axis=0)
+
+    return meta, date_columns, values
+
+
+def get_values(df, date_columns):
+    """
+    Gets the matrix of date values of the given parsed rows of a time series
+    file, with missing values as zeros and stored in the smallest dtype that
+    holds them, as :func:`read_arrays` reads them.
+
+    Args:
+        df (:class:`~pd.DataFrame`): Parsed rows of the file.
+        date_columns (list): Date columns of the file.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    # Missing values would be skipped when summing anyway
+    values = df[date_columns].fillna(0).to_numpy()
+
+    if values.dtype.kind == "f" and np.all(np.mod(values, 1) == 0):
+        values = values.astype(np.int64)
+
+    return downcast(values)
+
+
+def read_matrix(f, chunk_rows=CHUNK_ROWS, compact=True):
+    """
+    Reads a time series file in chunks of rows into a :class:`SeriesMatrix`.
+
+    Args:
+        f (object): Path or file object of the CSV file.
+        chunk_rows (int): Number of rows to parse at a time.
+        compact (bool): Whether to drop unused metadata columns, which are then
+            not parsed at all.
+
+    Returns:
+        :class:`~covid19plotter.data.matrix.SeriesMatrix`
+    """
+
+    meta, date_columns, values = read_arrays(
+        f, chunk_rows, USED_COLUMNS if compact else None)
+
+    return SeriesMatrix.from_arrays(values, date_columns, meta, compact)
+
+
+def _read_columns(f, use_column):
+    """
+    Reads the columns of the header of the given time series file, leaving a
+    file object where it was.
+
+    Args:
+        f (object): Path or file object of the CSV file.
+        use_column (function): Whether to keep each column.
+
+    Returns:
+        list: Names of the columns that are kept.
+    """
+
+    position = f.tell() if hasattr(f, "tell") else None
+    columns = list(pd.read_csv(f, nrows=0, usecols=use_column).columns)
+
+    if position is not None:
+        f.seek(position)
+
+    return columns
+
+
+def _is_date(column):
+    """
+    Checks whether the given column of a time series file is a date column.
+
+    Args:
+        column (str): Name of the column.
+
+    Returns:
+        bool
+    """
+
+    try:
+        datetime.strptime(column, DATE_FORMAT)
+    except ValueError:
+        return False
+
+    return True
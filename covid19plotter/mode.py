@@ -19,6 +19,48 @@ class Mode:
     TOTAL_RECOVERIES = 5
     NEW_RECOVERIES = 6
 
+    NAMES = {
+        TOTAL_CONFIRMED: "total-confirmed",
+        NEW_CONFIRMED: "new-confirmed",
+        TOTAL_DEATHS: "total-deaths",
+        NEW_DEATHS: "new-deaths",
+        TOTAL_RECOVERIES: "total-recoveries",
+        NEW_RECOVERIES: "new-recoveries"
+    }
+
+    @staticmethod
+    def get_name(mode):
+        """
+        Returns the name of the given mode (e.g. "new-deaths"), as used in file
+        names and on the command line.
+
+        Args:
+            mode (int): Mode specified by the user.
+
+        Returns:
+            str
+        """
+
+        return Mode.NAMES[mode]
+
+    @staticmethod
+    def from_name(name):
+        """
+        Returns the mode with the given name, or the given number (e.g. "4").
+
+        Args:
+            name (str): Name or number of the mode.
+
+        Returns:
+            int
+        """
+
+        for mode, mode_name in Mode.NAMES.items():
+            if name == mode_name or name == str(mode):
+                return mode
+
+        raise ValueError("Unknown mode: %s" % name)
+
     @staticmethod
     def is_confirmed_mode(mode):
         """
@@ -1,3 +1,5 @@
 from covid19plotter.plots.base import PlotBase
 from covid19plotter.plots.daily import DailyPlot
 from covid19plotter.plots.total import TotalPlot
+from covid19plotter.plots.comparison import ComparisonPlot
+from covid19plotter.plots.ranking import RankingPlot
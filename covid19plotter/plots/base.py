@@ -3,10 +3,26 @@ Plot Base
 =========
 
 Base functionality common to all plots.
+
+Drawing a plot is split in two: :meth:`PlotBase.setup` builds everything that
+is the same for every chart (axes, tick layout, grid, empty lines), and
+:meth:`PlotBase.update` fills in the lines, titles and limits of one chart. A
+figure that was set up once can therefore be used as a template for any number
+of charts of the same type of plot, each only updating the artists that are
+already there instead of creating them again.
+
+Dates are plotted at their position in the series and labelled by a tick
+formatter, rather than as categorical values, so a template can be updated
+with different dates.
 """
 
 import matplotlib.pyplot as plt
+from matplotlib.ticker import FuncFormatter
 from matplotlib.ticker import MaxNLocator
+import numpy as np
+
+from covid19plotter.data.stats import RollingStats
+from covid19plotter.profiling import timed
 
 DEFAULT_DATA_DESC = "Values"
 
@@ -15,67 +31,156 @@ EARLIEST = "1/22/20"
 
 MAX_XTICKS = 10
 
+# Decimal places shown of values that are not whole numbers (e.g. per capita)
+VALUE_DECIMALS = 2
+
 
 class PlotBase:
     """
     PlotBase class. See module documentation for more information.
 
     Attributes:
-        _df (:class:`~pd.DataFrame`): Entire :class:`~pd.DataFrame` loaded from
-            a third-party source. Not all information in this
-            :class:`~pd.DataFrame` will be plotted.
-        _series (:class:`~pd.Series`): :class:`~pd.Series` encompassing only
-            the information that will be plotted, excluding data before the
+        _last_updated (str): Date of the most recent data in the series loaded
+            from a third-party source.
+        _series (:class:`~np.ndarray`): Values encompassing only the
+            information that will be plotted, excluding data before the
             starting date.
+        _labels (:class:`~pd.Index`): Date of each value in ``_series``.
+        _starting_day (int): Position of the starting date in the values
+            loaded from the third-party source.
+        _earliest (int): Position of the earliest date plotted in the values
+            given to the plot.
+        _stats (:class:`~covid19plotter.data.stats.LocationStats`): Rolling
+            statistics of the values given to the plot.
+        _ax (:class:`~matplotlib.axes.Axes`): Axes being drawn onto.
     """
 
     def __init__(self):
-        self._df = None
+        self._last_updated = None
         self._series = None
-        self._starting_day = EARLIEST
+        self._labels = None
+        self._starting_day = 0
+        self._earliest = 0
+        self._stats = None
+        self._ax = None
+
+    def plot(self, values, labels, data_desc=DEFAULT_DATA_DESC, location=None,
+             stats=None):
+        """
+        Plots the given values in a new window.
+
+        Args:
+            values (:class:`~np.ndarray`): Values to plot, one for each date.
+            labels (:class:`~pd.Index`): Date of each value (e.g. "3/21/20").
+            data_desc (str): Description of the data.
+            location (list): List of locations for the plot, from specific to
+                general (e.g. ["Washtenaw", "MI", "US])
+            stats (:class:`~covid19plotter.data.stats.LocationStats`): Rolling
+                statistics of the values, if already computed.
+        """
+
+        fig = plt.figure(num=self._get_title(data_desc, location))
+        self.draw(fig, values, labels, data_desc, location, stats)
+        plt.show()
 
-    def plot(self, df, data_desc=DEFAULT_DATA_DESC, location=None):
+    def draw(self, fig, values, labels, data_desc=DEFAULT_DATA_DESC,
+             location=None, stats=None):
         """
-        Plots the given :class:`~pd.DataFrame`.
+        Draws the plot of the given values onto the given (empty) figure,
+        without showing it.
 
         Args:
-            df (:class:`~pd.DataFrame`): :class:`~pd.DataFrame` to plot.
+            fig (:class:`~matplotlib.figure.Figure`): Figure to draw onto.
+            values (:class:`~np.ndarray`): Values to plot, one for each date.
+            labels (:class:`~pd.Index`): Date of each value (e.g. "3/21/20").
             data_desc (str): Description of the data.
             location (list): List of locations for the plot, from specific to
                 general (e.g. ["Washtenaw", "MI", "US])
+            stats (:class:`~covid19plotter.data.stats.LocationStats`): Rolling
+                statistics of the values, if already computed.
         """
 
-        series = df.sum()[EARLIEST:]
-        self._starting_day = self._get_starting_day(series)
+        self.setup(fig)
+        self.update(fig, values, labels, data_desc, location, stats)
 
-        self._df = df
-        self._series = self._transform_series(series)
+    @timed("plot_setup")
+    def setup(self, fig):
+        """
+        Builds the parts of the plot that are the same for every chart onto
+        the given (empty) figure, with lines that have no data yet.
 
-        title = self._get_title(data_desc, location)
+        Args:
+            fig (:class:`~matplotlib.figure.Figure`): Figure to set up.
+        """
 
-        plt.figure(num=title)
-        self._plot()
+        self._ax = fig.gca()
+        self._create_lines()
 
-        plt.xticks(rotation=90)
+        self._ax.tick_params(axis="x", labelrotation=90)
 
         # Make tick labels smaller so they can fit
-        plt.tick_params(labelsize=8)
-
-        fig = plt.gcf()
+        self._ax.tick_params(labelsize=8)
 
         # Add margin below the plot so x-axis dates can fit
         fig.subplots_adjust(bottom=0.15)
 
-        ax = fig.gca()
-        ax.xaxis.set_major_locator(MaxNLocator(MAX_XTICKS))
+        self._ax.xaxis.set_major_locator(MaxNLocator(MAX_XTICKS))
 
         # Make sure y-axis only uses integers
-        ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+        self._ax.yaxis.set_major_locator(MaxNLocator(integer=True))
 
-        plt.suptitle(title)
-        plt.title(self._get_subtitle(data_desc), size=8)
-        plt.grid()
-        plt.show()
+        self._ax.grid(True)
+
+    @timed("plot_update")
+    def update(self, fig, values, labels, data_desc=DEFAULT_DATA_DESC,
+               location=None, stats=None):
+        """
+        Updates a figure that was set up by :meth:`setup` of the same type of
+        plot to show the given values. Only the data of the lines, the titles,
+        the date labels and the limits change.
+
+        Args:
+            fig (:class:`~matplotlib.figure.Figure`): Figure to update.
+            values (:class:`~np.ndarray`): Values to plot, one for each date.
+            labels (:class:`~pd.Index`): Date of each value (e.g. "3/21/20").
+            data_desc (str): Description of the data.
+            location (list): List of locations for the plot, from specific to
+                general (e.g. ["Washtenaw", "MI", "US])
+            stats (:class:`~covid19plotter.data.stats.LocationStats`): Rolling
+                statistics of the values, if already computed.
+        """
+
+        self._stats = stats or RollingStats(values).get_location_stats(0)
+
+        earliest = labels.get_loc(EARLIEST) if EARLIEST in labels else 0
+        values = values[earliest:]
+        labels = labels[earliest:]
+
+        self._earliest = earliest
+
+        self._starting_day = self._get_starting_day(values)
+
+        self._last_updated = labels[-1]
+        self._series = self._transform_series(values)
+        self._labels = labels[self._starting_day:]
+
+        self._ax = fig.axes[0]
+        self._plot()
+
+        self._ax.xaxis.set_major_formatter(FuncFormatter(self._format_date))
+        self._ax.relim()
+        self._ax.autoscale_view()
+
+        fig.suptitle(self._get_title(data_desc, location))
+        self._ax.set_title(self._get_subtitle(data_desc), size=8)
+
+    def _create_lines(self):
+        """
+        Internal method responsible for creating the (empty) line(s) of the
+        plot, in the order :meth:`_plot` fills them in.
+        """
+
+        self._ax.plot([], [])
 
     def _plot(self):
         """
@@ -83,35 +188,65 @@ class PlotBase:
         plot.
         """
 
-        plt.plot(self._series)
+        self._ax.lines[0].set_data(self._get_positions(), self._series)
 
-    def _get_starting_day(self, series):
+    def _get_positions(self):
         """
-        Gets the starting day to use for the plot. This is calculated by
-        determining the first day 1% of the total cases today was reported.
+        Gets the x-axis position of each of the plotted dates.
+
+        Returns:
+            :class:`~np.ndarray`
+        """
+
+        return np.arange(len(self._labels))
+
+    def _format_date(self, x, pos=None):
+        """
+        Formats an x-axis tick as the date at that position, the same as a
+        categorical axis would.
 
         Args:
-            series (:class:`~pd.Series`): Series containing all data values.
+            x (float): Position of the tick.
+            pos (int): Index of the tick.
 
         Returns:
             str
         """
 
-        return (series > series.max() * 0.01).idxmax()
+        position = int(round(x))
+
+        if 0 <= position < len(self._labels):
+            return self._labels[position]
+        return ""
+
+    def _get_starting_day(self, values):
+        """
+        Gets the position of the starting day to use for the plot. This is
+        the first day 1% of the total cases today was reported, which is
+        computed for every location when the data is loaded.
+
+        Args:
+            values (:class:`~np.ndarray`): All data values.
+
+        Returns:
+            int
+        """
+
+        return max(self._stats.get_starting_day() - self._earliest, 0)
 
-    def _transform_series(self, series):
+    def _transform_series(self, values):
         """
-        Transforms the given series of values to plot it how we want. The given
-        series contains all data values, even before the starting date.
+        Transforms the given values to plot them how we want. The given values
+        contain all data values, even before the starting date.
 
         Args:
-            series (:class:`~pd.Series`): :class:`~pd.Series` to transform.
+            values (:class:`~np.ndarray`): Values to transform.
 
         Returns:
-            :class:`~pd.Series`
+            :class:`~np.ndarray`
         """
 
-        return series[self._starting_day:]
+        return values[self._starting_day:]
 
     def _get_title(self, data_desc, location):
         """
@@ -141,4 +276,20 @@ class PlotBase:
             str
         """
 
-        return "Last Updated: " + self._df.columns[-1]
+        return "Last Updated: " + self._last_updated
+
+    def _format_value(self, value):
+        """
+        Formats a value of the series for display, without a trailing ".0" for
+        whole numbers and rounded to ``VALUE_DECIMALS`` places otherwise.
+
+        Args:
+            value (float): Value to format.
+
+        Returns:
+            str
+        """
+
+        if value == value and float(value).is_integer():
+            return str(int(value))
+        return str(round(value, VALUE_DECIMALS))
@@ -0,0 +1,198 @@
+"""
+Comparison Plot
+===============
+
+Plot for comparing the series of several locations on one figure. The series
+are given as a single (locations x days) matrix, taken from the index in one
+step, and every transformation (normalizing, aligning on the starting days) is
+done on the whole matrix at once, so drawing 50 locations costs little more
+than drawing one.
+
+Series can be normalized to a percentage of their peak, so locations of very
+different sizes can be compared, and aligned on their starting days, so that
+the x-axis is the number of days since each location's starting day rather
+than the date.
+"""
+
+from matplotlib.ticker import FuncFormatter
+import numpy as np
+
+from covid19plotter.plots.base import DEFAULT_DATA_DESC
+from covid19plotter.plots.base import EARLIEST
+from covid19plotter.plots.base import PlotBase
+from covid19plotter.plots.daily import DAILY
+from covid19plotter.plots.total import TOTAL
+from covid19plotter.profiling import timed
+
+# Ways of normalizing the series
+PEAK = "peak"
+NORMALIZATIONS = [PEAK]
+
+ALIGNED_XLABEL = "Days since starting day"
+
+LEGEND_SIZE = 6
+LEGEND_ROWS = 15
+
+
+class ComparisonPlot(PlotBase):
+    """
+    ComparisonPlot class. See module documentation for more information.
+
+    Attributes:
+        _daily (bool): Whether the series are daily changes rather than
+            running totals.
+        _normalize (str): How to normalize the series (e.g. ``PEAK``), or None.
+        _align (bool): Whether to align the series on their starting days.
+    """
+
+    def __init__(self, daily=False, normalize=None, align=False):
+        super().__init__()
+        self._daily = daily
+        self._normalize = normalize
+        self._align = align
+
+    def draw(self, fig, values, labels, data_desc=DEFAULT_DATA_DESC,
+             location=None, names=None, starting_days=None):
+        """
+        Draws the plot of the given series onto the given (empty) figure,
+        without showing it.
+
+        Args:
+            fig (:class:`~matplotlib.figure.Figure`): Figure to draw onto.
+            values (:class:`~np.ndarray`): (locations x days) matrix of the
+                series to plot.
+            labels (:class:`~pd.Index`): Date of each column of ``values``.
+            data_desc (str): Description of the data.
+            location (list): List of the locations the compared locations are
+                part of, from specific to general (e.g. ["MI", "US"]).
+            names (list): Name of each compared location.
+            starting_days (:class:`~np.ndarray`): Position of the starting day
+                of each series in ``values``.
+        """
+
+        self.setup(fig)
+        self.update(fig, values, labels, data_desc, location, names,
+                    starting_days)
+
+    @timed("plot_update")
+    def update(self, fig, values, labels, data_desc=DEFAULT_DATA_DESC,
+               location=None, names=None, starting_days=None):
+        """
+        Draws the lines of the given series onto a figure set up by
+        :meth:`setup`. See :meth:`draw` for the arguments.
+        """
+
+        earliest = labels.get_loc(EARLIEST) if EARLIEST in labels else 0
+        values = np.asarray(values, dtype=np.float64)[:, earliest:]
+        labels = labels[earliest:]
+
+        if starting_days is None:
+            starting_days = np.zeros(len(values), dtype=np.intp)
+
+        starts = np.maximum(np.asarray(starting_days) - earliest, 0)
+
+        self._last_updated = labels[-1]
+        self._starting_day = int(starts.min()) if len(starts) else 0
+
+        if self._normalize == PEAK:
+            values = _normalize_to_peak(values)
+
+        if self._align:
+            values = _align(values, starts)
+            self._labels = labels[:values.shape[1]]
+        else:
+            values = values[:, self._starting_day:]
+            self._labels = labels[self._starting_day:]
+
+        self._series = values
+        self._ax = fig.axes[0]
+
+        # All of the series are drawn in one call, one line per column
+        lines = self._ax.plot(self._get_positions(), values.T)
+
+        for line, name in zip(lines, names or []):
+            line.set_label(name)
+
+        if names:
+            self._ax.legend(fontsize=LEGEND_SIZE,
+                            ncol=(len(names) - 1) // LEGEND_ROWS + 1)
+
+        if self._align:
+            self._ax.set_xlabel(ALIGNED_XLABEL, size=8)
+        else:
+            self._ax.xaxis.set_major_formatter(
+                FuncFormatter(self._format_date))
+
+        fig.suptitle(self._get_title(data_desc, location))
+        self._ax.set_title(self._get_subtitle(data_desc), size=8)
+
+    def _create_lines(self):
+        # The number of lines depends on the number of locations, so they are
+        # all created when drawing
+        pass
+
+    def _get_title(self, data_desc, location):
+        location_str = ", ".join(location) if location else ""
+        kind = DAILY if self._daily else TOTAL
+
+        if location_str:
+            return "%s %s (%s)" % (kind, data_desc, location_str)
+        return "%s %s" % (kind, data_desc)
+
+    def _get_subtitle(self, data_desc):
+        parts = [super()._get_subtitle(data_desc)]
+
+        if self._normalize == PEAK:
+            parts.append("% of peak")
+        if self._align:
+            parts.append("Aligned on starting day")
+
+        return " | ".join(parts)
+
+
+def _normalize_to_peak(values):
+    """
+    Normalizes each series to a percentage of its maximum value. Series that
+    never go above zero are NaN.
+
+    Args:
+        values (:class:`~np.ndarray`): (locations x days) matrix of series.
+
+    Returns:
+        :class:`~np.ndarray`
+    """
+
+    peaks = np.where(np.isnan(values), -np.inf, values).max(axis=1,
+                                                           initial=-np.inf)
+    peaks = np.where(peaks > 0, peaks, np.nan)[:, np.newaxis]
+
+    return values / peaks * 100
+
+
+def _align(values, starts):
+    """
+    Shifts each series to the left so that it starts on its starting day. The
+    end of each series is padded with NaN.
+
+    Args:
+        values (:class:`~np.ndarray`): (locations x days) matrix of series.
+        starts (:class:`~np.ndarray`): Position of the starting day of each
+            series.
+
+    Returns:
+        :class:`~np.ndarray`: (locations x days since the earliest starting
+        day) matrix.
+    """
+
+    num_days = values.shape[1] - (int(starts.min()) if len(starts) else 0)
+
+    # Position in ``values`` of each day since the starting day of each series
+    positions = starts[:, np.newaxis] + np.arange(num_days)
+    valid = positions < values.shape[1]
+
+    aligned = np.full((len(values), num_days), np.nan)
+    rows = np.broadcast_to(np.arange(len(values))[:, np.newaxis],
+                           positions.shape)
+    aligned[valid] = values[rows[valid], positions[valid]]
+
+    return aligned
@@ -5,15 +5,11 @@ Daily Plot
 Plot for displaying daily increases in values.
 """
 
-import pandas as pd
-import matplotlib.pyplot as plt
-
+from covid19plotter.data.stats import ONE_WEEK
 from covid19plotter.plots import PlotBase
 
 DAILY = "Daily"
 
-ONE_WEEK = 7
-
 MOVING_AVG_COLOR = (0.12, 0.47, 0.71, 0.5)
 MOVING_AVG_STYLE = "--"
 
@@ -23,26 +19,30 @@ class DailyPlot(PlotBase):
     DailyPlot class. See module documentation for more information.
     """
 
+    def _create_lines(self):
+        super()._create_lines()
+
+        self._ax.plot([], [], color=MOVING_AVG_COLOR,
+                      linestyle=MOVING_AVG_STYLE)
+
     def _plot(self):
         super()._plot()
 
-        series = pd.Series(self._series)
-        moving_average = series.rolling(ONE_WEEK).mean().values.tolist()
-
-        # Move moving average line back a few days so it follows the trend of
+        # Center the moving average on each day so it follows the trend of
         # the main line
-        moving_average = moving_average[round((ONE_WEEK-1)/2):]
+        start = self._earliest + self._starting_day
+        moving_average = self._stats.get_mean(ONE_WEEK, center=True)[start:]
 
-        plt.plot(moving_average, color=MOVING_AVG_COLOR,
-                 linestyle=MOVING_AVG_STYLE)
+        self._ax.lines[1].set_data(self._get_positions(), moving_average)
 
-    def _get_starting_day(self, series):
-        daily_values = self._get_daily_values(series)
-        return (daily_values > daily_values.max() * 0.01).idxmax()
+    def _get_starting_day(self, values):
+        start = self._stats.get_starting_day(daily=True)
+        return max(start - self._earliest, 0)
 
-    def _transform_series(self, series):
-        transformed_series = self._get_daily_values(series)
-        return super()._transform_series(transformed_series)
+    def _transform_series(self, values):
+        # The daily values are computed once for every location
+        daily_values = self._stats.get_daily()[self._earliest:]
+        return super()._transform_series(daily_values)
 
     def _get_title(self, data_desc, location):
         location_str = ""
@@ -52,20 +52,5 @@ class DailyPlot(PlotBase):
         return "%s %s (%s)" % (DAILY, data_desc, location_str)
 
     def _get_subtitle(self, data_desc):
-        last_updated = self._df.columns[-1]
-        return data_desc + " on %s: %s" % (last_updated, self._series[-1])
-
-    def _get_daily_values(self, series):
-        """
-        Returns the increase in value at each index in the given
-        :class:`~pd.Series`.
-
-        Args:
-            series (:class:`~pd.Series`): :class:`~pd.Series` to use to
-                calculate the increase in values.
-
-        Returns:
-            :class:`~pd.Series`
-        """
-
-        return series - series.shift(1)
+        last_value = self._format_value(self._series[-1])
+        return data_desc + " on %s: %s" % (self._last_updated, last_value)
@@ -0,0 +1,82 @@
+"""
+Ranking Plot
+============
+
+Bar chart of the top locations of a ranking (see
+:mod:`~covid19plotter.data.rankings`), one horizontal bar per location with
+the first at the top.
+"""
+
+import numpy as np
+
+from covid19plotter.plots.base import DEFAULT_DATA_DESC
+from covid19plotter.plots.base import PlotBase
+from covid19plotter.profiling import timed
+
+BAR_COLOR = (0.12, 0.47, 0.71)
+BAR_LABEL_SIZE = 6
+
+# Margin left of the bars, so the names of the locations can fit
+NAMES_MARGIN = 0.3
+
+
+class RankingPlot(PlotBase):
+    """
+    RankingPlot class. See module documentation for more information.
+
+    Attributes:
+        _metric_desc (str): Description of the metric the locations are ranked
+            by (e.g. "7-Day Average").
+    """
+
+    def __init__(self, metric_desc):
+        super().__init__()
+        self._metric_desc = metric_desc
+
+    @timed("plot_update")
+    def draw(self, fig, values, names, last_updated,
+             data_desc=DEFAULT_DATA_DESC, location=None):
+        """
+        Draws the bars of the given ranking onto the given (empty) figure,
+        without showing it.
+
+        Args:
+            fig (:class:`~matplotlib.figure.Figure`): Figure to draw onto.
+            values (list): Value of each ranked location, from the first.
+            names (list): Name of each ranked location.
+            last_updated (str): Date the locations are ranked on.
+            data_desc (str): Description of the data.
+            location (list): List of the locations the ranked locations are
+                part of, from specific to general (e.g. ["MI", "US"]).
+        """
+
+        self._last_updated = last_updated
+        self._series = np.asarray(values, dtype=np.float64)
+        self._ax = fig.gca()
+
+        positions = np.arange(len(self._series))
+        bars = self._ax.barh(positions, self._series, color=BAR_COLOR)
+
+        self._ax.margins(x=0.1)
+        self._ax.set_yticks(positions)
+        self._ax.set_yticklabels(names)
+        self._ax.invert_yaxis()
+        self._ax.tick_params(labelsize=8)
+        self._ax.grid(True, axis="x")
+        self._ax.set_axisbelow(True)
+
+        for bar, value in zip(bars, self._series):
+            self._ax.text(bar.get_width(), bar.get_y() + bar.get_height() / 2,
+                          " " + self._format_value(value), va="center",
+                          size=BAR_LABEL_SIZE)
+
+        fig.subplots_adjust(left=NAMES_MARGIN)
+        fig.suptitle(self._get_title(data_desc, location))
+        self._ax.set_title(self._get_subtitle(data_desc), size=8)
+
+    def _get_title(self, data_desc, location):
+        location_str = ", ".join(location) if location else ""
+
+        if location_str:
+            return "%s %s (%s)" % (self._metric_desc, data_desc, location_str)
+        return "%s %s" % (self._metric_desc, data_desc)
@@ -23,5 +23,6 @@ class TotalPlot(PlotBase):
         return "%s %s (%s)" % (TOTAL, data_desc, location_str)
 
     def _get_subtitle(self, data_desc):
-        subtitle = "%s: %s" % (data_desc, self._series[-1])
+        last_value = self._format_value(self._series[-1])
+        subtitle = "%s: %s" % (data_desc, last_value)
         return subtitle + " | " + super()._get_subtitle(data_desc)
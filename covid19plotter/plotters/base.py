@@ -1,13 +1,19 @@
+from covid19plotter.data.aggregates import Location
+from covid19plotter.data.aggregates import STATE_LEVEL
+from covid19plotter.data.rankings import METRIC_DESCS
+from covid19plotter.data.rankings import get_name
+from covid19plotter.data.stats import ONE_WEEK
 from covid19plotter.mode import Mode
+from covid19plotter.plots import ComparisonPlot
 from covid19plotter.plots import DailyPlot
+from covid19plotter.plots import RankingPlot
 from covid19plotter.plots import TotalPlot
 from covid19plotter.utils import input_and_validate
 
-STATE = "Province/State"
-
 CONFIRMED_DATA_DESC = "Confirmed Cases"
 DEATHS_DATA_DESC = "Deaths"
 RECOVERIES_DATA_DESC = "Recoveries"
+PER_CAPITA_DATA_DESC = "per 100k"
 
 
 class Plotter:
@@ -15,63 +21,243 @@ class Plotter:
     COVID-19 plotters functionality for all countries.
     """
 
-    def plot(self, df, mode, country):
+    def plot(self, index, mode, country):
         """
-        Plots the given data frame.
+        Plots data from the given index.
 
         Args:
-            df (:class:`~DataFrame`): Data frame to plot.
+            index (:class:`~covid19plotter.data.aggregates.AggregateIndex`):
+                Index of the data to plot.
             mode (int): Plotting mode.
             country (str): Country specified by the user.
         """
 
         state = None
 
-        if len(df) > 1:
-            state = self._prompt_for_state(df)
+        if index.get_count(Location(country)) > 1:
+            state = self._prompt_for_state(
+                index.get_option_index(STATE_LEVEL, country))
 
-        df = self._filter_df(df, STATE, state)
+        location = Location(country, state or None)
+        values = index.get_values(location)
 
         data_desc = self._get_data_desc(mode)
-        location = self._get_location_list(country, state)
+        location_list = self._get_location_list(country, state)
+
+        plot = self.get_plot(mode)
+        plot.plot(values, index.labels, data_desc, location_list,
+                  stats=index.get_stats(location))
+
+    def draw(self, fig, index, mode, location, update=False,
+             per_capita=False):
+        """
+        Draws the plot for the given location onto the given (empty) figure,
+        without prompting the user or showing it.
+
+        Args:
+            fig (:class:`~matplotlib.figure.Figure`): Figure to draw onto.
+            index (:class:`~covid19plotter.data.aggregates.AggregateIndex`):
+                Index of the data to plot.
+            mode (int): Plotting mode.
+            location (:class:`~covid19plotter.data.aggregates.Location`):
+                Location to plot.
+            update (bool): Whether the figure already holds the same type of
+                plot (e.g. a template figure), which is then only updated
+                with the data of this location.
+            per_capita (bool): Whether to plot the values per 100,000 people.
+
+        Raises:
+            ValueError: If plotting per capita and the population of the
+                location is not known.
+        """
+
+        if per_capita:
+            self._check_population(index, location)
+
+        values = index.get_values(location, per_capita)
+        location_list = self._get_location_list(
+            location.country, location.state, region=location.region,
+            county=location.county)
+
+        plot = self.get_plot(mode)
+        draw = plot.update if update else plot.draw
+        draw(fig, values, index.labels,
+             self._get_data_desc(mode, per_capita), location_list,
+             stats=index.get_stats(location, per_capita))
+
+    def compare(self, fig, index, mode, parent, locations, normalize=None,
+                align=False, per_capita=False):
+        """
+        Draws the series of several locations onto the given (empty) figure,
+        without prompting the user or showing it. The series of all of the
+        locations are taken from the index at once.
+
+        Args:
+            fig (:class:`~matplotlib.figure.Figure`): Figure to draw onto.
+            index (:class:`~covid19plotter.data.aggregates.AggregateIndex`):
+                Index of the data to plot.
+            mode (int): Plotting mode.
+            parent (:class:`~covid19plotter.data.aggregates.Location`):
+                Location the compared locations are part of.
+            locations (list): :class:`~covid19plotter.data.aggregates.Location`
+                of each location to compare.
+            normalize (str): How to normalize the series (e.g. "peak"), or
+                None.
+            align (bool): Whether to align the series on their starting days.
+            per_capita (bool): Whether to plot the values per 100,000 people.
+
+        Raises:
+            ValueError: If plotting per capita and the population of any of
+                the locations is not known.
+        """
+
+        if per_capita:
+            for location in locations:
+                self._check_population(index, location)
 
-        plot = TotalPlot() if Mode.is_total_mode(mode) else DailyPlot()
-        plot.plot(df, data_desc, location)
+        stats = index.get_per_capita_stats() if per_capita else index.stats
+        rows = index.get_rows(locations)
+        daily = Mode.is_new_mode(mode)
 
-    def _get_data_desc(self, mode):
+        # Daily changes are too noisy to compare, so their weekly averages are
+        # plotted instead
+        if daily:
+            values = stats.get_mean(ONE_WEEK, center=True)[rows]
+        else:
+            values = stats.totals[rows]
+
+        starting_days = stats.get_starting_days(daily)[rows]
+        names = [self._get_location_name(location) for location in locations]
+
+        location_list = self._get_location_list(
+            parent.country, parent.state, region=parent.region,
+            county=parent.county)
+
+        plot = ComparisonPlot(daily, normalize, align)
+        plot.draw(fig, values, index.labels,
+                  self._get_data_desc(mode, per_capita), location_list, names,
+                  starting_days)
+
+    def rank(self, fig, index, mode, parent, entries, metric,
+             per_capita=False):
+        """
+        Draws the bar chart of the given ranking onto the given (empty)
+        figure, without prompting the user or showing it.
+
+        Args:
+            fig (:class:`~matplotlib.figure.Figure`): Figure to draw onto.
+            index (:class:`~covid19plotter.data.aggregates.AggregateIndex`):
+                Index of the ranked data.
+            mode (int): Plotting mode.
+            parent (:class:`~covid19plotter.data.aggregates.Location`):
+                Location the ranked locations are part of.
+            entries (list): :class:`~covid19plotter.data.rankings.RankEntry` of
+                each ranked location, from the first.
+            metric (str): Metric the locations are ranked by (e.g. "average").
+            per_capita (bool): Whether the values are per 100,000 people.
+        """
+
+        location_list = self._get_location_list(
+            parent.country, parent.state, region=parent.region,
+            county=parent.county)
+
+        plot = RankingPlot(METRIC_DESCS[metric])
+        plot.draw(fig, [entry.value for entry in entries],
+                  [get_name(entry.location, parent) for entry in entries],
+                  index.labels[-1], self._get_data_desc(mode, per_capita),
+                  location_list)
+
+    def get_plot(self, mode):
+        """
+        Gets the plot to use for the given mode.
+
+        Args:
+            mode (int): Plotting mode.
+
+        Returns:
+            :class:`~covid19plotter.plots.PlotBase`
+        """
+
+        return TotalPlot() if Mode.is_total_mode(mode) else DailyPlot()
+
+    def _get_data_desc(self, mode, per_capita=False):
         """
         Gets the description of the data, using the given mode.
 
         Args:
             mode (int): Plotting mode.
+            per_capita (bool): Whether the data is per 100,000 people.
 
         Returns:
             str
         """
 
         if Mode.is_deaths_mode(mode):
-            return DEATHS_DATA_DESC
+            data_desc = DEATHS_DATA_DESC
         elif Mode.is_recoveries_mode(mode):
-            return RECOVERIES_DATA_DESC
-        return CONFIRMED_DATA_DESC
+            data_desc = RECOVERIES_DATA_DESC
+        else:
+            data_desc = CONFIRMED_DATA_DESC
+
+        if per_capita:
+            return "%s %s" % (data_desc, PER_CAPITA_DATA_DESC)
+        return data_desc
+
+    def _check_population(self, index, location):
+        """
+        Checks that the population of the given location is known, so its
+        values can be plotted per capita.
+
+        Args:
+            index (:class:`~covid19plotter.data.aggregates.AggregateIndex`):
+                Index of the data to plot.
+            location (:class:`~covid19plotter.data.aggregates.Location`):
+                Location to check.
+
+        Raises:
+            ValueError: If the population is not known.
+        """
+
+        if index.get_population(location) is None:
+            location_list = self._get_location_list(
+                location.country, location.state, region=location.region,
+                county=location.county)
+
+            raise ValueError("The population of %s is not known" %
+                             ", ".join(location_list))
 
-    def _prompt_for_state(self, country_df):
+    def _get_location_name(self, location):
+        """
+        Gets the name of the given location to show in a legend, which is the
+        most specific part of it.
+
+        Args:
+            location (:class:`~covid19plotter.data.aggregates.Location`):
+                Location to name.
+
+        Returns:
+            str
+        """
+
+        return self._get_location_list(
+            location.country, location.state, region=location.region,
+            county=location.county)[0]
+
+    def _prompt_for_state(self, states):
         """
         Gets the desired state from the user.
 
         Args:
-            country_df (:class:`~pd.DataFrame`): `~pd.DataFrame` for the entire
-                country.
+            states (:class:`~covid19plotter.utils.OptionIndex`): States of
+                the country.
 
         Returns:
             str
         """
 
         prompt = self._get_state_prompt()
-        state_df = country_df[STATE]
 
-        return input_and_validate(prompt=prompt, options=state_df.tolist(),
-                                  ignore=[""])
+        return input_and_validate(prompt=prompt, options=states, ignore=[""])
 
     def _get_state_prompt(self):
         """
@@ -104,33 +290,3 @@ class Plotter:
             location_list.append(country)
 
         return location_list
-
-    def _filter_df(self, df, key, value):
-        """
-        Filters the given :class:`~pd.DataFrame` using the given filter key and
-        values.
-
-        Args:
-            df (:class:`~pd.DataFrame`): :class:`~pd.DataFrame` to filter.
-            key (str): Filter key.
-            values (str or list): Filter values.
-
-        Returns:
-            :class:`~pd.DataFrame`
-        """
-
-        if not value:
-            nan_df = df[key].isna()
-
-            if nan_df.sum() == 1:
-                # If a row exists in the filtered data frame where the value of
-                # the given key is NaN, it is the total row, so use that for
-                # the data
-                df = df[nan_df]
-        else:
-            if type(value) != list:
-                value = [value]
-
-            df = df[df[key].isin(value)]
-
-        return df
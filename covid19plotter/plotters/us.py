@@ -1,26 +1,24 @@
 from covid19plotter.aliases import STATE_ABBREVIATIONS
-from covid19plotter.mode import Mode
-from covid19plotter.plots import DailyPlot
-from covid19plotter.plots import TotalPlot
+from covid19plotter.data.aggregates import COUNTY_LEVEL
+from covid19plotter.data.aggregates import Location
+from covid19plotter.data.aggregates import REGION_LEVEL
+from covid19plotter.data.aggregates import STATE_LEVEL
 from covid19plotter.plotters import Plotter
-from covid19plotter.regions import REGIONS
 from covid19plotter.utils import input_and_validate
 
-STATE = "Province_State"
-COUNTY = "Admin2"
-
 
 class USPlotter(Plotter):
     """
     :class:`~Covid19Plotter` for the US.
     """
 
-    def plot(self, df, mode, country):
+    def plot(self, index, mode, country):
         """
-        Plots the given data frame.
+        Plots data from the given index.
 
         Args:
-            df (:class:`~DataFrame`): Data frame to plot.
+            index (:class:`~covid19plotter.data.aggregates.AggregateIndex`):
+                Index of the data to plot.
             mode (int): Plotting mode.
             country (str): Country specified by the user.
         """
@@ -29,31 +27,37 @@ class USPlotter(Plotter):
 
         # If there is more than one state/province available, prompt the
         # user for the state
-        if len(df) > 1:
-            state = self._prompt_for_state(df)
-
-        df = self._filter_df(df, STATE, state)
+        if index.get_count(Location(country)) > 1:
+            state = self._prompt_for_state(
+                index.get_option_index(STATE_LEVEL, country))
 
-        regions_supported = state in REGIONS
+        location = Location(country, state or None)
+        state_regions = index.get_regions(country, state) if state else []
 
         # Ask for region for US state
-        if len(df) > 1 and regions_supported:
-            state_regions = list(REGIONS[state].keys())
-            region = self._prompt_for_region(state_regions)
+        if index.get_count(location) > 1 and state_regions:
+            region = self._prompt_for_region(
+                index.get_option_index(REGION_LEVEL, country, state))
 
-        # If region is specified, filter data frame by counties for that
-        # region
         if region:
-            df = self._filter_df(df, COUNTY, REGIONS[state][region])
+            location = Location(country, state, region)
+
+        if index.get_count(location) > 1 and state and \
+                (not state_regions or region):
+            counties = index.get_option_index(COUNTY_LEVEL, country, state,
+                                              region)
+            county = self._prompt_for_county(counties)
 
-        if len(df) > 1 and state and (not regions_supported or region):
-            county = self._prompt_for_county(df)
-            df = self._filter_df(df, COUNTY, county)
+            if county:
+                location = Location(country, state, county=county)
 
-        location = self._get_location_list(country, state, region, county)
+        values = index.get_values(location)
+        location_list = self._get_location_list(country, state, region,
+                                                county)
 
-        plot = TotalPlot() if Mode.is_total_mode(mode) else DailyPlot()
-        plot.plot(df, self._get_data_desc(mode), location)
+        plot = self.get_plot(mode)
+        plot.plot(values, index.labels, self._get_data_desc(mode),
+                  location_list, stats=index.get_stats(location))
 
     def _get_location_list(self, country, state=None, region=None, county=None):
         """
@@ -83,23 +87,22 @@ class USPlotter(Plotter):
 
         return location_list
 
-    def _prompt_for_state(self, country_df):
+    def _prompt_for_state(self, states):
         """
         Gets the desired state from the user.
 
         Args:
-            country_df (:class:`~pd.DataFrame`): `~pd.DataFrame` for the entire
-                country.
+            states (:class:`~covid19plotter.utils.OptionIndex`): States of
+                the country.
 
         Returns:
             str
         """
 
         prompt = self._get_state_prompt()
-        state_df = country_df[STATE]
         ignore = list(STATE_ABBREVIATIONS.keys()) + [""]
 
-        state = input_and_validate(prompt=prompt, options=state_df.tolist(),
+        state = input_and_validate(prompt=prompt, options=states,
                                    ignore=ignore)
 
         state_upper = state.upper()
@@ -113,7 +116,8 @@ class USPlotter(Plotter):
         Gets the desired region from the user.
 
         Args:
-            valid_regions (list): List of valid regions.
+            valid_regions (:class:`~covid19plotter.utils.OptionIndex`): Valid
+                regions.
 
         Returns:
             str
@@ -125,13 +129,13 @@ class USPlotter(Plotter):
         return input_and_validate(prompt=prompt, options=valid_regions,
                                         ignore=[""])
 
-    def _prompt_for_county(self, region_df):
+    def _prompt_for_county(self, counties):
         """
         Gets the desired county from the user.
 
         Args:
-            region_df (:class:`~pd.DataFrame`): `~pd.DataFrame` for a single
-                region (or state if region is not applicable).
+            counties (:class:`~covid19plotter.utils.OptionIndex`): Counties of
+                a single region (or state if region is not applicable).
 
         Returns:
             str
@@ -140,5 +144,4 @@ class USPlotter(Plotter):
         prompt = "Which county do you want to view? (Just press ENTER to see " \
                  "all counties, or type OPTIONS to see all available options)"
 
-        return input_and_validate(
-            prompt=prompt, options=region_df[COUNTY].tolist(), ignore=[""])
+        return input_and_validate(prompt=prompt, options=counties, ignore=[""])
@@ -0,0 +1,299 @@
+"""
+Profiling
+=========
+
+Timed spans around each stage of loading and plotting the data: downloading,
+reading the cache, parsing, aggregating, computing rolling statistics, drawing
+and saving charts. Wrapping a stage is a single ``with`` statement::
+
+    with span("parse"):
+        df = pd.read_csv(f)
+
+or, for a whole function, decorating it with ``@timed("parse")``.
+
+Spans are only recorded while a :class:`Profiler` is running. Otherwise,
+:func:`span` returns a shared context manager that does nothing, and functions
+decorated with :func:`timed` are called straight away, so the instrumentation
+costs a function call and a check per stage.
+
+With ``--profile``, the time spent in each stage is printed to stderr when the
+app exits. Given a file name (``--profile FILE``), the spans are also written
+to it as a Chrome trace if it ends in ``.json`` (open it in
+``chrome://tracing`` or Perfetto), or the whole run is profiled with
+:mod:`cProfile` and its stats are written to it (read them with
+:mod:`pstats`). Only the spans of the current process are recorded, and only
+the calling thread is profiled by :mod:`cProfile`.
+"""
+
+import argparse
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+TRACE_EXTENSION = ".json"
+
+# Profiler currently recording spans, if any
+_profiler = None
+
+
+class Profiler:
+    """
+    Profiler class. See module documentation for more information.
+
+    Attributes:
+        spans (list): (name, start, seconds, thread id) of each span recorded,
+            with the start in seconds since the profiler started.
+        _start (float): Time the profiler started, from
+            :func:`time.perf_counter`.
+        _cprofile (:class:`~cProfile.Profile`): Profile of the whole run, or
+            None.
+    """
+
+    def __init__(self, cprofile=False):
+        self.spans = []
+        self._start = None
+        self._cprofile = cProfile.Profile() if cprofile else None
+
+    def start(self):
+        """
+        Starts recording spans, and profiling if enabled.
+        """
+
+        global _profiler
+
+        self._start = time.perf_counter()
+        _profiler = self
+
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stop(self):
+        """
+        Stops recording spans and profiling.
+        """
+
+        global _profiler
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+        if _profiler is self:
+            _profiler = None
+
+    def record(self, name, start, end):
+        """
+        Records a span.
+
+        Args:
+            name (str): Name of the stage.
+            start (float): Time the stage started, from
+                :func:`time.perf_counter`.
+            end (float): Time the stage ended.
+        """
+
+        # Appending to a list is atomic, so spans can end in any thread
+        self.spans.append((name, start - self._start, end - start,
+                           threading.get_ident()))
+
+    def get_breakdown(self):
+        """
+        Gets the number of spans and total time of each stage. The time of a
+        stage includes that of any stages run within it.
+
+        Returns:
+            list: (name, count, seconds) of each stage, slowest first.
+        """
+
+        totals = OrderedDict()
+
+        for name, _, seconds, _ in self.spans:
+            count, total = totals.get(name, (0, 0.0))
+            totals[name] = (count + 1, total + seconds)
+
+        breakdown = [(name, count, total)
+                     for name, (count, total) in totals.items()]
+
+        return sorted(breakdown, key=lambda stage: -stage[2])
+
+    def print_report(self, f=sys.stderr):
+        """
+        Prints the time spent in each stage.
+
+        Args:
+            f (file): File to print to.
+        """
+
+        print("%-16s %6s %10s" % ("stage", "count", "seconds"), file=f)
+
+        for name, count, seconds in self.get_breakdown():
+            print("%-16s %6d %10.4f" % (name, count, seconds), file=f)
+
+    def write_trace(self, path):
+        """
+        Writes the spans as a Chrome trace.
+
+        Args:
+            path (str): Path of the file to write.
+        """
+
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": start * 1e6,
+                   "dur": seconds * 1e6, "pid": pid, "tid": tid}
+                  for name, start, seconds, tid in self.spans]
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events}, f)
+
+    def write_stats(self, path):
+        """
+        Writes the stats of the :mod:`cProfile` profile.
+
+        Args:
+            path (str): Path of the file to write.
+        """
+
+        self._cprofile.dump_stats(path)
+
+
+class _Span:
+    """
+    Context manager timing a single stage.
+
+    Attributes:
+        _profiler (:class:`Profiler`): Profiler to record the span with.
+        _name (str): Name of the stage.
+        _start (float): Time the stage started.
+    """
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.record(self._name, self._start, time.perf_counter())
+        return False
+
+
+class _NullSpan:
+    """
+    Context manager that does nothing, used while not profiling.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """
+    Times a stage, if a :class:`Profiler` is running.
+
+    Args:
+        name (str): Name of the stage (e.g. "parse").
+
+    Returns:
+        object: Context manager around the stage.
+    """
+
+    profiler = _profiler
+
+    if profiler is None:
+        return _NULL_SPAN
+
+    return _Span(profiler, name)
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function as a stage, if a
+    :class:`Profiler` is running.
+
+    Args:
+        name (str): Name of the stage (e.g. "parse").
+
+    Returns:
+        function
+    """
+
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler
+
+            if profiler is None:
+                return function(*args, **kwargs)
+
+            with _Span(profiler, name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def profile(output=None):
+    """
+    Profiles everything run within the context, then prints the time spent
+    in each stage and writes the profile to a file, if given.
+
+    Args:
+        output (bool or str): None or False to not profile at all, True to
+            only print the time spent in each stage, or the path of a file to
+            also write the profile to (a Chrome trace for ``.json`` files,
+            :mod:`cProfile` stats otherwise).
+    """
+
+    if not output:
+        yield
+        return
+
+    path = output if output is not True else None
+    is_trace = path is not None and path.endswith(TRACE_EXTENSION)
+
+    profiler = Profiler(cprofile=path is not None and not is_trace)
+    profiler.start()
+
+    try:
+        yield
+    finally:
+        profiler.stop()
+        profiler.print_report()
+
+        if is_trace:
+            profiler.write_trace(path)
+        elif path is not None:
+            profiler.write_stats(path)
+
+
+def get_parser():
+    """
+    Gets the parser for the ``--profile`` option, to be used as a parent of
+    other parsers.
+
+    Returns:
+        :class:`~argparse.ArgumentParser`
+    """
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", nargs="?", const=True, metavar="FILE",
+                        help="print the time spent in each stage, and write a "
+                             "Chrome trace (.json) or cProfile stats to FILE")
+
+    return parser
@@ -0,0 +1,448 @@
+"""
+Query Server
+============
+
+Long-running server that loads the data once and keeps it in memory, so charts
+and series are served without paying for the downloads and parsing of every
+file on each query. Requests are handled by a pool of worker threads. Each
+connection serves a single request and is then closed, and clients that do not
+send their request in time are dropped, so idle clients cannot hold on to the
+workers.
+
+The data can be refreshed periodically, or on request. A refresh loads the new
+data into a new :class:`~covid19plotter.data.DatasetRegistry` alongside the one
+in use, and only then swaps it in; requests already in progress finish with the
+data they started with. With ``--store``, the data is read from a shared series
+store (see :mod:`~covid19plotter.data.store`), so several servers on a host
+share one copy of it.
+
+Usage::
+
+    python -m covid19plotter.server --port 8080 --workers 4 --refresh 3600
+
+Endpoints:
+
+* ``GET /plot?mode=new-deaths&country=US&state=MI&region=Detroit`` returns the
+  chart as PNG (or SVG, with ``&format=svg``).
+* ``GET /plot?mode=new-deaths&country=US&state=MI&compare=Detroit,Kent``
+  compares several locations on one chart, optionally with
+  ``&normalize=peak`` and ``&align=1``.
+* ``&per_capita=1`` plots (or gets the series of) the values per 100,000
+  people.
+* ``GET /series?mode=total-confirmed&country=Italy`` returns the series of
+  values as JSON, along with its centered 7-day average, growth rate and
+  doubling time. For the "new" modes, the values are the daily changes.
+* ``GET /status`` returns when the data was last updated and refreshed.
+* ``POST /refresh`` refreshes the data.
+
+Locations are resolved the same way as on the command line (see
+:mod:`~covid19plotter.cli`). Invalid queries get a 400 response with a JSON
+error message.
+"""
+
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from covid19plotter.batch import BatchRenderer
+from covid19plotter.batch import FORMATS
+from covid19plotter.batch import PNG
+from covid19plotter.batch import SVG
+from covid19plotter.batch import save_figure
+from covid19plotter.charts import get_index
+from covid19plotter.cli import resolve_query
+from covid19plotter.data import DataLoader
+from covid19plotter.data import DatasetRegistry
+from covid19plotter.data.sources import DATASETS
+from covid19plotter.data.store import SeriesStore
+from covid19plotter.mode import Mode
+from covid19plotter.plots.comparison import NORMALIZATIONS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+
+# Seconds a connection may wait for its request before it is dropped
+REQUEST_TIMEOUT = 5
+
+CONTENT_TYPES = {
+    PNG: "image/png",
+    SVG: "image/svg+xml",
+}
+JSON_CONTENT_TYPE = "application/json"
+
+QUERY_PARAMS = ["mode", "country", "state", "region", "county", "normalize"]
+
+# Separator of the names of the locations to compare
+COMPARE_SEPARATOR = ","
+
+TRUE_VALUES = ["1", "true", "yes"]
+
+
+class QueryServer:
+    """
+    QueryServer class. See module documentation for more information.
+
+    Attributes:
+        _loader (:class:`~covid19plotter.data.DataLoader`): Loader shared by
+            every refresh, so files that have not changed are not downloaded
+            again.
+        _store (:class:`~covid19plotter.data.store.SeriesStore`): Shared
+            series store to read the data from where it is there, or None.
+        _registry (:class:`~covid19plotter.data.DatasetRegistry`): Registry
+            holding the data currently being served.
+        _refreshed (float): Time of the last refresh.
+        _refresh_lock (:class:`~threading.Lock`): Lock so that only one
+            refresh runs at a time.
+        _local (:class:`~threading.local`): Template figures of each worker
+            thread.
+        _http (:class:`_PooledHTTPServer`): Underlying HTTP server.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 workers=DEFAULT_WORKERS, loader=None, store=None):
+        self._loader = loader or DataLoader()
+        self._store = store
+        self._registry = None
+        self._refreshed = None
+        self._refresh_lock = threading.Lock()
+        self._local = threading.local()
+
+        self.refresh()
+
+        self._http = _PooledHTTPServer((host, port), _RequestHandler, workers)
+        self._http.app = self
+
+    @property
+    def address(self):
+        """
+        Address the server is listening on.
+
+        Returns:
+            tuple: (host, port)
+        """
+
+        return self._http.server_address
+
+    def serve_forever(self, refresh_interval=None):
+        """
+        Handles requests until :meth:`shutdown` is called.
+
+        Args:
+            refresh_interval (float): Seconds between refreshes of the data, or
+                None to only refresh on request.
+        """
+
+        stopped = threading.Event()
+
+        if refresh_interval:
+            thread = threading.Thread(target=self._refresh_periodically,
+                                      args=(refresh_interval, stopped),
+                                      daemon=True)
+            thread.start()
+
+        try:
+            self._http.serve_forever()
+        finally:
+            stopped.set()
+
+    def shutdown(self):
+        """
+        Stops the server, waiting for requests in progress to finish.
+        """
+
+        self._http.shutdown()
+        self._http.server_close()
+
+    def refresh(self):
+        """
+        Loads the latest data and swaps it in for the data being served. If
+        loading fails, the old data keeps being served.
+        """
+
+        with self._refresh_lock:
+            indexes = self._store.load_all() if self._store else None
+            registry = DatasetRegistry(loader=self._loader, indexes=indexes)
+
+            try:
+                registry.prefetch(*DATASETS)
+
+                for key in DATASETS:
+                    registry.get(*key)
+            finally:
+                registry.close()
+
+            old_registry = self._registry
+
+            # Requests in progress keep their reference to the old registry
+            self._registry = registry
+            self._refreshed = time.time()
+
+            if old_registry is not None:
+                old_registry.close()
+
+    def get_plot(self, params):
+        """
+        Renders the chart for the given query.
+
+        Args:
+            params (dict): Query parameters.
+
+        Returns:
+            tuple: The image data, and its format.
+        """
+
+        fmt = params.get("format", PNG)
+
+        if fmt not in FORMATS:
+            raise ValueError("Unknown format: %s" % fmt)
+
+        registry = self._registry
+        spec = resolve_query(registry, _get_query(params))
+
+        fig = BatchRenderer(registry).draw_template(self._get_templates(),
+                                                    spec)
+
+        buffer = io.BytesIO()
+        save_figure(fig, buffer, fmt)
+
+        return buffer.getvalue(), fmt
+
+    def get_series(self, params):
+        """
+        Gets the series of values for the given query.
+
+        Args:
+            params (dict): Query parameters.
+
+        Returns:
+            dict
+        """
+
+        registry = self._registry
+        spec = resolve_query(registry, _get_query(params))
+
+        if spec.compare:
+            raise ValueError("Comparisons can only be plotted")
+
+        index = get_index(registry, spec.mode, spec.location.country)
+        stats = index.get_stats(spec.location, spec.per_capita)
+
+        total = Mode.is_total_mode(spec.mode)
+        start = 0 if total else 1
+
+        series = {
+            "values": index.get_values(spec.location, spec.per_capita) if
+            total else stats.get_daily(),
+            "moving_average": stats.get_mean(center=True, daily=not total),
+            "growth_rate": stats.get_growth_rate(),
+            "doubling_time": stats.get_doubling_time(),
+        }
+
+        result = {
+            "mode": Mode.get_name(spec.mode),
+            "location": spec.location._asdict(),
+            "dates": [date.strftime("%Y-%m-%d")
+                      for date in index.dates[start:]],
+        }
+
+        # JSON has no NaN, so missing values are null
+        for name, values in series.items():
+            result[name] = [None if v != v else v
+                            for v in values[start:].tolist()]
+
+        return result
+
+    def get_status(self):
+        """
+        Gets when the data being served was last updated and refreshed.
+
+        Returns:
+            dict
+        """
+
+        registry = self._registry
+        last_updated = max(index.dates[-1]
+                           for index in registry.get_loaded().values())
+
+        return {
+            "last_updated": last_updated.strftime("%Y-%m-%d"),
+            "refreshed": time.strftime("%Y-%m-%dT%H:%M:%S",
+                                       time.localtime(self._refreshed)),
+        }
+
+    def _get_templates(self):
+        """
+        Gets the template figures of the current worker thread, which are
+        reused for every chart it renders.
+
+        Returns:
+            dict: Template figures keyed by the type of plot.
+        """
+
+        templates = getattr(self._local, "templates", None)
+
+        if templates is None:
+            templates = {}
+            self._local.templates = templates
+
+        return templates
+
+    def _refresh_periodically(self, interval, stopped):
+        """
+        Refreshes the data every given number of seconds, until stopped.
+
+        Args:
+            interval (float): Seconds between refreshes.
+            stopped (:class:`~threading.Event`): Event set when the server
+                stops.
+        """
+
+        while not stopped.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print("Refresh failed: %s" % e, file=sys.stderr)
+
+
+class _PooledHTTPServer(HTTPServer):
+    """
+    :class:`~http.server.HTTPServer` handling requests on a fixed pool of
+    worker threads.
+    """
+
+    def __init__(self, address, handler, workers):
+        super().__init__(address, handler)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the requests to a :class:`QueryServer`.
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = REQUEST_TIMEOUT
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        app = self.server.app
+
+        try:
+            if url.path == "/plot":
+                data, fmt = app.get_plot(params)
+                self._send(200, data, CONTENT_TYPES[fmt])
+            elif url.path == "/series":
+                self._send_json(200, app.get_series(params))
+            elif url.path == "/status":
+                self._send_json(200, app.get_status())
+            else:
+                self._send_json(404, {"error": "Not found"})
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def do_POST(self):
+        app = self.server.app
+
+        if urlsplit(self.path).path == "/refresh":
+            try:
+                app.refresh()
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+            else:
+                self._send_json(200, app.get_status())
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj).encode("utf-8"), JSON_CONTENT_TYPE)
+
+    def _send(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+
+        # Keeping the connection alive would keep a worker waiting on it
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _get_query(params):
+    """
+    Gets the query (as parsed by :mod:`~covid19plotter.cli`) from the given
+    query parameters.
+
+    Args:
+        params (dict): Query parameters.
+
+    Returns:
+        :class:`~argparse.Namespace`
+    """
+
+    query = argparse.Namespace(out=None)
+
+    for param in QUERY_PARAMS:
+        setattr(query, param, params.get(param))
+
+    if query.normalize and query.normalize not in NORMALIZATIONS:
+        raise ValueError("Unknown normalization: %s" % query.normalize)
+
+    compare = params.get("compare")
+    query.compare = compare.split(COMPARE_SEPARATOR) if compare else None
+    query.align = params.get("align", "").lower() in TRUE_VALUES
+    query.per_capita = params.get("per_capita", "").lower() in TRUE_VALUES
+
+    return query
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serves COVID-19 charts and series over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="port to listen on")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="number of requests handled at a time")
+    parser.add_argument("--refresh", type=float,
+                        help="seconds between refreshes of the data")
+    parser.add_argument("--store",
+                        help="directory of a shared series store to read the "
+                             "data from")
+    args = parser.parse_args()
+
+    store = SeriesStore(args.store) if args.store else None
+    server = QueryServer(args.host, args.port, args.workers, store=store)
+    print("Serving on http://%s:%d" % server.address)
+
+    try:
+        server.serve_forever(args.refresh)
+    except KeyboardInterrupt:
+        pass
@@ -5,12 +5,25 @@ Utils
 Utilities used throughout the app.
 """
 
-import numpy as np
+import difflib
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import readline
+except ImportError:
+    readline = None
 
 OPTIONS = "options"
 
 DEFAULT_INPUT_ERROR = "Invalid input."
 
+# Sorts after any other character, to find the end of a range of prefixes
+MAX_CHAR = chr(0x10FFFF)
+
+# Number of close matches suggested for invalid input
+NUM_SUGGESTIONS = 3
+
 
 def list_to_lower_case(lst):
     """
@@ -71,13 +84,92 @@ def input_with_prompt(prompt=None):
     return i.strip()
 
 
+class OptionIndex:
+    """
+    Index of the valid options of a prompt. It is built once, so validating the
+    input is a dictionary lookup, and completing or suggesting options does not
+    go through the whole list.
+
+    Attributes:
+        options (list): Sorted unique options.
+        _lookup (dict): Option keyed by its lower-case form.
+        _keys (list): Sorted lower-case options, for prefix searches.
+    """
+
+    def __init__(self, options):
+        # Skip missing values (nans)
+        self.options = sorted(unique(o for o in options if type(o) == str))
+        self._lookup = {}
+
+        for option in self.options:
+            self._lookup.setdefault(option.lower(), option)
+
+        self._keys = sorted(self._lookup)
+
+    def __len__(self):
+        return len(self.options)
+
+    def __iter__(self):
+        return iter(self.options)
+
+    def __contains__(self, value):
+        return self.get(value) is not None
+
+    def get(self, value):
+        """
+        Gets the option matching the given value, ignoring case.
+
+        Args:
+            value (str): Value to match.
+
+        Returns:
+            str: The option, or None if no option matches.
+        """
+
+        return self._lookup.get(value.strip().lower())
+
+    def complete(self, prefix):
+        """
+        Gets the options starting with the given prefix, ignoring case.
+
+        Args:
+            prefix (str): Prefix to complete.
+
+        Returns:
+            list
+        """
+
+        prefix = prefix.lower()
+
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix + MAX_CHAR, start)
+
+        return [self._lookup[key] for key in self._keys[start:end]]
+
+    def get_close_matches(self, value, n=NUM_SUGGESTIONS):
+        """
+        Gets the options closest to the given value, e.g. to suggest them when
+        the value is misspelled.
+
+        Args:
+            value (str): Value to match.
+            n (int): Maximum number of options to return.
+
+        Returns:
+            list
+        """
+
+        keys = difflib.get_close_matches(value.strip().lower(), self._keys, n)
+        return [self._lookup[key] for key in keys]
+
+
 def input_and_validate(prompt=None, options=None, ignore=None):
     """
     Gets input from a user, using a consistent prompt, and validates it.
 
     Args:
         prompt (str): Prompt for the user.
-        options (list): Valid options.
+        options (list or :class:`OptionIndex`): Valid options.
         ignore (list): Valid options that should not appear in the options
             menu.
 
@@ -85,33 +177,73 @@ def input_and_validate(prompt=None, options=None, ignore=None):
         str
     """
 
-    i = input_with_prompt(prompt)
-    i_lower = i.lower()
+    if not isinstance(options, OptionIndex):
+        options = OptionIndex(options)
 
-    # Remove nans, get unique values, and sort them
-    options = sorted(unique(filter(lambda o: o is not np.nan, options)))
+    lower_ignore = set(list_to_lower_case(ignore) or [])
 
-    if i_lower == OPTIONS:
-        for option in options:
-            print(option)
+    with _complete_options(options):
+        i = input_with_prompt(prompt)
 
-    lower_options = list_to_lower_case(options)
-    lower_ignore = list_to_lower_case(ignore) or []
+        while i.lower() not in lower_ignore:
+            option = options.get(i)
 
-    while i_lower not in lower_options and i_lower not in lower_ignore:
-        if i_lower != OPTIONS:
-            print(DEFAULT_INPUT_ERROR)
+            if option is not None:
+                return option
 
-        i = input_with_prompt(prompt)
-        i_lower = i.lower()
+            if i.lower() == OPTIONS:
+                for option in options:
+                    print(option)
+            else:
+                print(DEFAULT_INPUT_ERROR)
+
+                suggestions = options.get_close_matches(i) if i else []
+
+                if suggestions:
+                    print("Did you mean: %s?" % ", ".join(suggestions))
+
+            i = input_with_prompt(prompt)
+
+    return i
+
+
+@contextmanager
+def _complete_options(options):
+    """
+    Completes the given options with the tab key while reading input, where
+    readline is available.
+
+    Args:
+        options (:class:`OptionIndex`): Options to complete.
+    """
+
+    if readline is None:
+        yield
+        return
+
+    matches = {}
+
+    def complete(text, state):
+        if text not in matches:
+            matches.clear()
+            matches[text] = options.complete(text)
+
+        return (matches[text] + [None])[state]
+
+    old_completer = readline.get_completer()
+    old_delims = readline.get_completer_delims()
 
-        if i_lower == OPTIONS:
-            for option in options:
-                print(option)
+    # Options can contain spaces and punctuation, so complete the whole line
+    readline.set_completer(complete)
+    readline.set_completer_delims("")
 
-    if i == "":
-        return ""
-    elif i_lower in lower_ignore:
-        return i
+    if "libedit" in (readline.__doc__ or ""):
+        readline.parse_and_bind("bind ^I rl_complete")
+    else:
+        readline.parse_and_bind("tab: complete")
 
-    return options[lower_options.index(i_lower)]
+    try:
+        yield
+    finally:
+        readline.set_completer(old_completer)
+        readline.set_completer_delims(old_delims)
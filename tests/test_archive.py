@@ -0,0 +1,177 @@
+"""
+Snapshot Archive Tests
+======================
+
+Tests of :mod:`covid19plotter.data.archive`, adding snapshots of small fixture
+CSV files that grow, are revised and have their rows reordered, and checking
+that every vintage is reconstructed exactly from its deltas.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data import archive
+from covid19plotter.data.aggregates import Location
+from covid19plotter.data.archive import ROW_MAP
+from covid19plotter.data.archive import SnapshotArchive
+from covid19plotter.data.matrix import SeriesMatrix
+
+KEY = ("deaths", "US")
+
+HEADER = ("UID,FIPS,Admin2,Province_State,Country_Region,Population,"
+          "1/22/20,1/23/20")
+
+VINTAGE_1 = (HEADER + "\n"
+             "84026125,26125,Oakland,Michigan,US,1257584,0,1\n"
+             "84026163,26163,Wayne,Michigan,US,1749343,1,2\n"
+             "84039049,39049,Franklin,Ohio,US,1316756,0,0\n"
+             "84080026,,Unassigned,Michigan,US,0,0,0\n")
+
+# One more day, and a revised value of an earlier day
+VINTAGE_2 = (HEADER + ",1/24/20\n"
+             "84026125,26125,Oakland,Michigan,US,1257584,0,1,4\n"
+             "84026163,26163,Wayne,Michigan,US,1749343,1,3,7\n"
+             "84039049,39049,Franklin,Ohio,US,1316756,0,0,1\n"
+             "84080026,,Unassigned,Michigan,US,0,0,0,0\n")
+
+# One more day, with the rows reordered, a row removed, a new row, and a
+# changed population
+VINTAGE_3 = (HEADER + ",1/24/20,1/25/20\n"
+             "84039049,39049,Franklin,Ohio,US,1316757,0,0,1,5\n"
+             "84026163,26163,Wayne,Michigan,US,1749343,1,3,7,9\n"
+             "84026081,26081,Kent,Michigan,US,656955,0,0,0,40000\n"
+             "84026125,26125,Oakland,Michigan,US,1257584,0,1,4,4\n")
+
+# Dates that do not extend those of the previous vintage
+RESTARTED = (HEADER.replace("1/22/20,1/23/20", "3/1/20") + "\n"
+             "84026125,26125,Oakland,Michigan,US,1257584,10\n")
+
+VINTAGES = [("2020-01-23", VINTAGE_1), ("2020-01-24", VINTAGE_2),
+            ("2020-01-25", VINTAGE_3)]
+
+
+class SnapshotArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive = SnapshotArchive(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_same_matrix(self, matrix, text):
+        expected = _read_matrix(text)
+
+        self.assertEqual(matrix.labels.tolist(), expected.labels.tolist())
+        self.assertEqual(matrix.values.tolist(), expected.values.tolist())
+        pd.testing.assert_frame_equal(
+            matrix.meta.astype(object), expected.meta.astype(object))
+
+    def add_vintages(self):
+        for vintage, text in VINTAGES:
+            self.archive.add(KEY, _read_matrix(text), vintage)
+
+    def test_deltas(self):
+        self.add_vintages()
+
+        self.assertEqual(self.archive.get_vintages(KEY),
+                         [vintage for vintage, _ in VINTAGES])
+        self.assertEqual([entry["full"] for entry
+                          in self.archive._load_index(KEY)],
+                         [True, False, False])
+
+        # Rows are only mapped once they no longer line up
+        self.assertEqual([ROW_MAP in files for files in self._get_files()],
+                         [False, False, True])
+
+    def test_load(self):
+        self.add_vintages()
+
+        # Without any snapshots reconstructed in memory
+        for vintage, text in VINTAGES + list(reversed(VINTAGES)):
+            self.assert_same_matrix(
+                SnapshotArchive(self.directory.name).load(KEY, vintage), text)
+
+        # Continuing from the last reconstructed snapshot, or going back
+        for vintage, text in VINTAGES + list(reversed(VINTAGES)):
+            self.assert_same_matrix(self.archive.load(KEY, vintage), text)
+
+    def test_load_as_of(self):
+        self.add_vintages()
+
+        self.assertIsNone(self.archive.load(KEY, "2020-01-22"))
+        self.assert_same_matrix(self.archive.load(KEY, "2020-01-24"),
+                                VINTAGE_2)
+        self.assert_same_matrix(self.archive.load(KEY, "2020-02-01"),
+                                VINTAGE_3)
+        self.assert_same_matrix(self.archive.load(KEY), VINTAGE_3)
+
+    def test_load_all(self):
+        self.add_vintages()
+
+        indexes = SnapshotArchive(self.directory.name).load_all(
+            "2020-01-24", keys=[KEY, ("confirmed", "US")])
+
+        self.assertEqual(list(indexes), [KEY])
+        self.assertEqual(
+            indexes[KEY].get_values(Location("US", "Michigan")).tolist(),
+            [1, 4, 11])
+
+    def test_restarted_dates(self):
+        self.archive.add(KEY, _read_matrix(VINTAGE_1), "2020-01-23")
+        self.archive.add(KEY, _read_matrix(RESTARTED), "2020-03-01")
+
+        self.assertEqual([entry["full"] for entry
+                          in self.archive._load_index(KEY)], [True, True])
+        self.assert_same_matrix(
+            SnapshotArchive(self.directory.name).load(KEY), RESTARTED)
+
+    def test_keyframes(self):
+        with mock.patch.object(archive, "KEYFRAME_INTERVAL", 2):
+            self.add_vintages()
+
+        self.assertEqual([entry["full"] for entry
+                          in self.archive._load_index(KEY)],
+                         [True, False, True])
+        self.assert_same_matrix(
+            SnapshotArchive(self.directory.name).load(KEY), VINTAGE_3)
+
+    def test_replace_latest(self):
+        self.archive.add(KEY, _read_matrix(VINTAGE_1), "2020-01-23")
+        self.archive.add(KEY, _read_matrix(VINTAGE_2), "2020-01-24")
+        self.archive.add(KEY, _read_matrix(VINTAGE_3), "2020-01-24")
+
+        self.assertEqual(self.archive.get_vintages(KEY),
+                         ["2020-01-23", "2020-01-24"])
+        self.assert_same_matrix(
+            SnapshotArchive(self.directory.name).load(KEY), VINTAGE_3)
+
+    def test_older_vintage(self):
+        self.archive.add(KEY, _read_matrix(VINTAGE_2), "2020-01-24")
+
+        with self.assertRaises(ValueError):
+            self.archive.add(KEY, _read_matrix(VINTAGE_1), "2020-01-23")
+
+    def _get_files(self):
+        directory = os.path.join(self.directory.name, "%s_%s" % KEY)
+        files = []
+
+        for entry in self.archive._load_index(KEY):
+            with np.load(os.path.join(directory, entry["file"])) as arrays:
+                files.append(arrays.files)
+
+        return files
+
+
+def _read_matrix(text):
+    return SeriesMatrix.from_frame(pd.read_csv(io.StringIO(text)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+"""
+Fetcher Tests
+=============
+
+Tests of :mod:`covid19plotter.data.fetch` against a local HTTP server serving
+fixture CSV files, covering revalidation, gzip decoding, retrying dropped
+keep-alive connections and range requests.
+"""
+
+import gzip
+import io
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from covid19plotter.data.fetch import ETAG
+from covid19plotter.data.fetch import FetchError
+from covid19plotter.data.fetch import Fetcher
+from covid19plotter.data.fetch import LAST_MODIFIED
+
+FIXTURE = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20\n"
+           ",Afghanistan,33.0,65.0,0,1\n"
+           "Ontario,Canada,51.2,-85.3,2,3\n")
+HEADER = ["Province/State", "Country/Region", "Lat", "Long", "1/22/20",
+          "1/23/20"]
+
+FIXTURE_ETAG = '"fixture-1"'
+FIXTURE_LAST_MODIFIED = "Sat, 21 Mar 2020 00:00:00 GMT"
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Serves ``FIXTURE`` at every path, the way the server is configured on the
+    class (see :class:`FetcherTest`).
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        server.encodings.append(self.headers.get("Accept-Encoding", ""))
+
+        if self.path == "/missing.csv":
+            self._send(404, b"")
+            return
+
+        if self.headers.get("If-None-Match") == FIXTURE_ETAG or \
+                self.headers.get("If-Modified-Since") == \
+                FIXTURE_LAST_MODIFIED:
+            self._send(304, None)
+            return
+
+        body = FIXTURE.encode("utf-8")
+        headers = {"Last-Modified": FIXTURE_LAST_MODIFIED}
+
+        if server.send_etag:
+            headers["ETag"] = FIXTURE_ETAG
+
+        range_header = self.headers.get("Range")
+
+        if range_header and server.honor_ranges:
+            start, end = range_header.split("=")[1].split("-")
+            self._send(206, body[int(start):int(end) + 1], headers)
+            return
+
+        if "gzip" in server.encodings[-1]:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+
+            if server.truncate_gzip:
+                body = body[:len(body) // 2]
+
+        self._send(200, body, headers)
+
+        # Drop the connection without telling the client, the way a server
+        # closes an idle keep-alive connection
+        if server.drop_connections:
+            self.close_connection = True
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        if body is not None:
+            self.send_header("Content-Length", str(len(body)))
+
+        self.end_headers()
+
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.encodings = []
+        self.server.send_etag = True
+        self.server.honor_ranges = True
+        self.server.drop_connections = False
+        self.server.truncate_gzip = False
+
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={"poll_interval": 0.05})
+        self.thread.start()
+
+        self.url = "http://127.0.0.1:%d/fixture.csv" % \
+            self.server.server_address[1]
+        self.fetcher = Fetcher(timeout=5)
+
+    def tearDown(self):
+        self.fetcher.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_fetch(self):
+        result = self.fetcher.fetch(self.url)
+
+        self.assertEqual(result.text, FIXTURE)
+        self.assertEqual(result.meta[ETAG], FIXTURE_ETAG)
+        self.assertEqual(result.meta[LAST_MODIFIED], FIXTURE_LAST_MODIFIED)
+
+    def test_gzip(self):
+        # The fixture is only compressed when the fetcher asks for it
+        result = self.fetcher.fetch(self.url)
+
+        self.assertIn("gzip", self.server.encodings[0])
+        self.assertEqual(result.text, FIXTURE)
+
+    def test_truncated_gzip(self):
+        self.server.truncate_gzip = True
+
+        with self.assertRaises(FetchError):
+            self.fetcher.fetch(self.url)
+
+        with self.assertRaises(FetchError):
+            self.fetcher.fetch_to(self.url, io.BytesIO())
+
+    def test_fetch_to(self):
+        f = io.BytesIO()
+        meta = self.fetcher.fetch_to(self.url, f)
+
+        self.assertEqual(f.getvalue().decode("utf-8"), FIXTURE)
+        self.assertEqual(meta[ETAG], FIXTURE_ETAG)
+        self.assertIsNone(self.fetcher.fetch_to(self.url, io.BytesIO(), meta))
+
+    def test_not_modified_etag(self):
+        meta = self.fetcher.fetch(self.url).meta
+        result = self.fetcher.fetch(self.url, {ETAG: meta[ETAG]})
+
+        self.assertIsNone(result.text)
+        self.assertEqual(result.meta, {ETAG: FIXTURE_ETAG})
+
+    def test_not_modified_last_modified(self):
+        self.server.send_etag = False
+
+        meta = self.fetcher.fetch(self.url).meta
+        self.assertIsNone(meta[ETAG])
+
+        result = self.fetcher.fetch(self.url, meta)
+
+        self.assertIsNone(result.text)
+        self.assertEqual(result.meta, meta)
+
+    def test_error(self):
+        url = self.url.replace("fixture.csv", "missing.csv")
+
+        with self.assertRaises(FetchError):
+            self.fetcher.fetch(url)
+
+    def test_retry_dropped_connection(self):
+        self.server.drop_connections = True
+        connect = self.fetcher._connect
+        connections = []
+
+        def count_connect(key):
+            connections.append(key)
+            return connect(key)
+
+        self.fetcher._connect = count_connect
+
+        # Each connection is returned to the pool, but the server has closed
+        # it by the time it is used again, so every later request is retried
+        # on a new one
+        for _ in range(3):
+            self.assertEqual(self.fetcher.fetch(self.url).text, FIXTURE)
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(connections), 3)
+
+    def test_fetch_header(self):
+        self.assertEqual(self.fetcher.fetch_header(self.url), HEADER)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_fetch_header_ignored_range(self):
+        self.server.honor_ranges = False
+
+        self.assertEqual(self.fetcher.fetch_header(self.url), HEADER)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Incremental Update Tests
+========================
+
+Tests of :mod:`covid19plotter.data.incremental`, applying new versions of
+small fixture CSV files to the data frames parsed from their previous
+versions (straight from the text, and as reloaded from the cache) and
+comparing the results to parsing the new versions in full.
+"""
+
+import io
+import tempfile
+import unittest
+
+import pandas as pd
+
+from covid19plotter.data.cache import FrameCache
+from covid19plotter.data.incremental import LineHasher
+from covid19plotter.data.incremental import apply_update
+from covid19plotter.data.incremental import get_data_lines
+from covid19plotter.data.incremental import hash_lines
+from covid19plotter.data.stream import read_arrays
+
+URL = "http://example.com/fixture.csv"
+
+OLD = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20\n"
+       ",Afghanistan,33.0,65.0,0,1\n"
+       "Ontario,Canada,51.2,-85.3,2,3\n"
+       "Hubei,China,30.9,112.2,444,444\n")
+
+# One more day for every row
+NEW_DAY = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20,1/24/20\n"
+           ",Afghanistan,33.0,65.0,0,1,1\n"
+           "Ontario,Canada,51.2,-85.3,2,3,5\n"
+           "Hubei,China,30.9,112.2,444,444,549\n")
+
+# One more day, a revised row with a missing value and a new row without a
+# province
+REVISED = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20,1/24/20\n"
+           ",Afghanistan,33.0,65.0,0,1,1\n"
+           "Ontario,Canada,51.2,-85.3,,4,5\n"
+           "Hubei,China,30.9,112.2,444,444,549\n"
+           ",Italy,43.0,12.0,0,0,2\n")
+
+# One more day, with a missing value in a row that is otherwise unchanged
+MISSING_DAY = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20,"
+               "1/24/20\n"
+               ",Afghanistan,33.0,65.0,0,1,1\n"
+               "Ontario,Canada,51.2,-85.3,2,3,\n"
+               "Hubei,China,30.9,112.2,444,444,549\n")
+
+# Every row has a province, and only a new row without one changes
+PROVINCES = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20\n"
+             "Ontario,Canada,51.2,-85.3,2,3\n"
+             "Hubei,China,30.9,112.2,444,444\n")
+NEW_COUNTRY = PROVINCES + ",Italy,43.0,12.0,0,0\n"
+
+# The metadata columns changed
+NEW_COLUMNS = ("Province_State,Country_Region,Lat,Long_,1/22/20,1/23/20\n"
+               ",Afghanistan,33.0,65.0,0,1\n")
+
+
+class ApplyUpdateTest(unittest.TestCase):
+
+    def assert_updates(self, old_text, new_text, old_df=None):
+        """
+        Asserts that applying the given new version to the given data frame
+        of the old version (parsed from its text by default) gives the same
+        data frame as parsing the new version in full, whether it is given as
+        text or as a file object.
+        """
+
+        if old_df is None:
+            old_df = _read(old_text)
+
+        line_hashes = hash_lines(get_data_lines(old_text)[1])
+        expected = _read(new_text)
+
+        for text in [new_text, io.StringIO(new_text)]:
+            updated_df = apply_update(old_df, line_hashes, text)
+            pd.testing.assert_frame_equal(updated_df, expected)
+
+    def test_new_day(self):
+        self.assert_updates(OLD, NEW_DAY)
+
+    def test_revised_rows(self):
+        self.assert_updates(OLD, REVISED)
+
+    def test_missing_value_in_new_day(self):
+        self.assert_updates(OLD, MISSING_DAY)
+
+    def test_new_row_without_province(self):
+        # The missing province alone would be parsed as a float
+        self.assert_updates(PROVINCES, NEW_COUNTRY)
+
+    def test_unchanged(self):
+        self.assert_updates(OLD, OLD)
+
+    def test_cached_frame(self):
+        # Files read in chunks are cached with the dates as one matrix of the
+        # smallest dtype, so the reloaded frame has different dtypes than a
+        # parsed one
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FrameCache(directory)
+            cache.save_arrays(URL, *read_arrays(io.StringIO(OLD)))
+            old_df, _ = cache.load(URL)
+
+        self.assertNotEqual(old_df["1/22/20"].dtype, _read(OLD)["1/22/20"]
+                            .dtype)
+
+        for new_text in [NEW_DAY, REVISED, MISSING_DAY]:
+            self.assert_updates(OLD, new_text, old_df)
+
+    def test_changed_columns(self):
+        line_hashes = hash_lines(get_data_lines(OLD)[1])
+        self.assertIsNone(apply_update(_read(OLD), line_hashes, NEW_COLUMNS))
+
+    def test_different_rows(self):
+        # Hashes of another file than the data frame was parsed from
+        line_hashes = hash_lines(get_data_lines(PROVINCES)[1])
+        self.assertIsNone(apply_update(_read(OLD), line_hashes, NEW_DAY))
+
+
+class LineHasherTest(unittest.TestCase):
+
+    def test_hashes(self):
+        # Windows line endings, a blank line and no final line ending
+        text = REVISED.replace("\n", "\r\n") + "\r\n" + ",Spain,40.0,-4.0,0"
+        data = text.encode("utf-8")
+        expected = hash_lines(get_data_lines(text)[1])
+
+        for chunk_size in [1, 7, len(data)]:
+            f = io.BytesIO()
+            hasher = LineHasher(f)
+
+            for i in range(0, len(data), chunk_size):
+                hasher.write(data[i:i + chunk_size])
+
+            self.assertEqual(f.getvalue(), data)
+            self.assertEqual(hasher.get_hashes().tolist(), expected.tolist())
+
+
+def _read(text):
+    return pd.read_csv(io.StringIO(text))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Series Matrix Tests
+===================
+
+Tests of :mod:`covid19plotter.data.matrix`, normalizing a small fixture CSV
+file and checking its group sums and row selections against summing and
+filtering the parsed data frame.
+"""
+
+import io
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.matrix import SeriesMatrix
+from covid19plotter.data.sources import COUNTRY
+from covid19plotter.data.sources import STATE
+
+# Groups that first appear out of their sorted order, rows without a state,
+# and a country whose only row has no state
+FIXTURE = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20,1/24/20\n"
+           "Zhejiang,China,29.2,120.1,1,2,3\n"
+           ",Afghanistan,33.0,65.0,0,1,1\n"
+           "Ontario,Canada,51.2,-85.3,2,3,5\n"
+           "Hubei,China,30.9,112.2,444,444,549\n"
+           ",Canada,,,0,0,1\n"
+           "Zhejiang,China,29.2,120.1,10,20,30\n"
+           "Quebec,Canada,52.9,-73.5,1,1,40000\n"
+           "Hubei,China,30.9,112.2,1,1,1\n")
+
+
+class SeriesMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.df = pd.read_csv(io.StringIO(FIXTURE))
+        self.matrix = SeriesMatrix.from_frame(self.df)
+        self.date_columns = ["1/22/20", "1/23/20", "1/24/20"]
+
+    def assert_group_sum(self, columns):
+        keys, sums, counts = self.matrix.group_sum(columns)
+        grouped = self.df.dropna(subset=columns).groupby(columns)
+        expected = grouped[self.date_columns].sum()
+        expected_counts = grouped.size()
+
+        self.assertEqual(len(keys), len(expected))
+        self.assertEqual(sums.dtype, np.int64)
+
+        for key, row_sums, count in zip(keys, sums, counts.tolist()):
+            label = key if len(key) > 1 else key[0]
+            self.assertEqual(row_sums.tolist(),
+                             expected.loc[label].tolist())
+            self.assertEqual(count, expected_counts.loc[label])
+
+    def test_compact(self):
+        self.assertEqual(self.matrix.values.dtype, np.int32)
+        self.assertEqual(self.matrix.values.tolist(),
+                         self.df[self.date_columns].to_numpy().tolist())
+
+    def test_group_sum_countries(self):
+        self.assert_group_sum([COUNTRY])
+
+    def test_group_sum_states(self):
+        # Rows without a state are left out
+        self.assert_group_sum([COUNTRY, STATE])
+
+    def test_group_sum_values(self):
+        keys, sums, counts = self.matrix.group_sum(
+            [COUNTRY], np.arange(len(self.df), dtype=np.float64))
+        row_sums = dict(zip([key[0] for key in keys], sums.tolist()))
+
+        self.assertEqual(row_sums, {"China": 0 + 3 + 5 + 7,
+                                    "Afghanistan": 1, "Canada": 2 + 4 + 6})
+
+    def test_get_rows(self):
+        self.assertEqual(self.matrix.get_rows(STATE, "Hubei").tolist(),
+                         [3, 7])
+        self.assertEqual(self.matrix.get_rows(STATE, ["Quebec", "Ontario"])
+                         .tolist(), [2, 6])
+        self.assertEqual(self.matrix.get_rows(STATE, "Texas").tolist(), [])
+
+    def test_select(self):
+        rows = self.matrix.select({COUNTRY: "China", STATE: "Zhejiang"})
+        self.assertEqual(rows.tolist(), [0, 5])
+
+        taken = self.matrix.take(rows)
+        self.assertEqual(taken.values.tolist(), [[1, 2, 3], [10, 20, 30]])
+        self.assertEqual(taken.meta[STATE].tolist(), ["Zhejiang"] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Ranking Tests
+=============
+
+Tests of :mod:`covid19plotter.data.rankings`, ranking the locations of a small
+fixture US file, whose counties grow in simple patterns over two weeks, by
+every metric.
+"""
+
+import io
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.aggregates import AggregateIndex
+from covid19plotter.data.aggregates import COUNTY_LEVEL
+from covid19plotter.data.aggregates import Location
+from covid19plotter.data.aggregates import STATE_LEVEL
+from covid19plotter.data.matrix import SeriesMatrix
+from covid19plotter.data.rankings import AVERAGE
+from covid19plotter.data.rankings import DAILY
+from covid19plotter.data.rankings import GROWTH
+from covid19plotter.data.rankings import TOTAL
+from covid19plotter.data.rankings import get_metric
+from covid19plotter.data.rankings import get_name
+from covid19plotter.data.rankings import get_top
+from covid19plotter.data.rankings import rank
+
+DAYS = range(15)
+DATES = ["1/%d/20" % (day + 1) for day in DAYS]
+
+# County, state, population and running total on each day. On the last day:
+#
+#   County      Total  Daily  Average  Growth
+#   Kent          140     10       10       0%
+#   Oakland       196     27       21     200%
+#   Wayne         135      5        5        - (nothing the week before)
+#   Unassigned   1000      0        0        - (no population)
+#   Franklin       42      3        3       0%
+COUNTIES = [
+    ("Kent", "Michigan", 100000, [10 * day for day in DAYS]),
+    ("Oakland", "Michigan", 200000, [day * day for day in DAYS]),
+    ("Wayne", "Michigan", 1000000, [100 + 5 * max(day - 7, 0)
+                                    for day in DAYS]),
+    ("Unassigned", "Michigan", 0, [1000 for _ in DAYS]),
+    ("Franklin", "Ohio", 50000, [3 * day for day in DAYS]),
+]
+
+FIXTURE = "\n".join(
+    ["Admin2,Province_State,Country_Region,Population," + ",".join(DATES)] +
+    ["%s,%s,US,%d,%s" % (county, state, population,
+                         ",".join(str(total) for total in totals))
+     for county, state, population, totals in COUNTIES]) + "\n"
+
+US = Location("US")
+MICHIGAN = Location("US", "Michigan")
+
+
+class RankTest(unittest.TestCase):
+
+    def setUp(self):
+        df = pd.read_csv(io.StringIO(FIXTURE))
+        self.index = AggregateIndex(SeriesMatrix.from_frame(df), {})
+        self.no_populations = AggregateIndex(
+            SeriesMatrix.from_frame(df.drop(columns="Population")), {})
+
+    def assert_ranking(self, ranking, expected):
+        self.assertEqual([entry.rank for entry in ranking],
+                         list(range(1, len(expected) + 1)))
+        self.assertEqual([(entry.location.county or entry.location.state,
+                           entry.value) for entry in ranking], expected)
+
+    def test_total(self):
+        self.assert_ranking(
+            rank(self.index, COUNTY_LEVEL, TOTAL, top=3, parent=MICHIGAN),
+            [("Unassigned", 1000), ("Oakland", 196), ("Kent", 140)])
+
+    def test_all_counties(self):
+        ranking = rank(self.index, COUNTY_LEVEL, DAILY, parent=US)
+
+        self.assert_ranking(ranking, [("Oakland", 27), ("Kent", 10),
+                                      ("Wayne", 5), ("Franklin", 3),
+                                      ("Unassigned", 0)])
+        self.assertEqual(ranking[3].location,
+                         Location("US", "Ohio", county="Franklin"))
+
+    def test_average(self):
+        self.assert_ranking(rank(self.index, STATE_LEVEL, AVERAGE),
+                            [("Michigan", 36), ("Ohio", 3)])
+
+    def test_growth(self):
+        # Counties without cases the week before have no growth
+        self.assert_ranking(
+            rank(self.index, COUNTY_LEVEL, GROWTH, parent=MICHIGAN),
+            [("Oakland", 200), ("Kent", 0)])
+
+    def test_per_capita(self):
+        # Counties without a population are left out
+        self.assert_ranking(
+            rank(self.index, COUNTY_LEVEL, DAILY, per_capita_values=True),
+            [("Oakland", 13.5), ("Kent", 10), ("Franklin", 6),
+             ("Wayne", 0.5)])
+
+        # The growth does not depend on the population
+        self.assertEqual(
+            rank(self.index, COUNTY_LEVEL, GROWTH, per_capita_values=True),
+            rank(self.index, COUNTY_LEVEL, GROWTH))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            rank(self.index, STATE_LEVEL, parent=MICHIGAN)
+
+        with self.assertRaises(ValueError):
+            rank(self.no_populations, COUNTY_LEVEL, per_capita_values=True)
+
+        with self.assertRaises(ValueError):
+            rank(self.index, COUNTY_LEVEL, "median")
+
+
+class RankingsTest(unittest.TestCase):
+
+    def test_get_metric_short_series(self):
+        totals = np.array([[1, 3, 6], [0, 0, 0]])
+
+        np.testing.assert_array_equal(get_metric(totals, TOTAL), [6, 0])
+        np.testing.assert_array_equal(get_metric(totals, DAILY), [3, 0])
+        self.assertTrue(np.isnan(get_metric(totals, AVERAGE)).all())
+        self.assertTrue(np.isnan(get_metric(totals, GROWTH)).all())
+
+    def test_get_top(self):
+        values = np.array([3, np.nan, 5, 3, 1, 5])
+
+        self.assertEqual(get_top(values, 3).tolist(), [2, 5, 0])
+        self.assertEqual(get_top(values, 10).tolist(), [2, 5, 0, 3, 4])
+        self.assertEqual(get_top(values, 0).tolist(), [])
+
+    def test_get_name(self):
+        wayne = Location("US", "Michigan", county="Wayne")
+
+        self.assertEqual(get_name(wayne, US), "Wayne, Michigan")
+        self.assertEqual(get_name(wayne, MICHIGAN), "Wayne")
+        self.assertEqual(get_name(MICHIGAN), "Michigan, US")
+
+
+if __name__ == "__main__":
+    unittest.main()
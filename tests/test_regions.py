@@ -0,0 +1,164 @@
+"""
+Region Definition Tests
+=======================
+
+Tests of :mod:`covid19plotter.data.regions`, loading region definitions from
+JSON and CSV files and compiling overlapping regions against a small fixture
+US file, and of the region series the
+:class:`~covid19plotter.data.aggregates.AggregateIndex` sums from them.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.aggregates import AggregateIndex
+from covid19plotter.data.aggregates import Location
+from covid19plotter.data.matrix import SeriesMatrix
+from covid19plotter.data.regions import NO_REGION
+from covid19plotter.data.regions import Region
+from covid19plotter.data.regions import RegionDefinitions
+
+FIXTURE = ("UID,FIPS,Admin2,Province_State,Country_Region,1/22/20,1/23/20\n"
+           "84026081,26081,Kent,Michigan,US,1,2\n"
+           "84026125,26125,Oakland,Michigan,US,10,20\n"
+           "84026163,26163,Wayne,Michigan,US,100,200\n"
+           "84080026,,Unassigned,Michigan,US,1000,2000\n"
+           "84039049,39049,Franklin,Ohio,US,5,5\n"
+           "84039041,39041,Delaware,Ohio,US,7,7\n")
+
+# Two regions of Michigan overlapping in Wayne county, one of them with a
+# county without a FIPS code, and a region of Ohio made of FIPS codes, one of
+# which is a county of Michigan
+REGIONS = {
+    "Michigan": {"Metro": ["Oakland", "Wayne"],
+                 "District": [26163, "Kent", "Unassigned"]},
+    "Ohio": {"Columbus": [39049, "39041", 26081]},
+}
+
+CSV_REGIONS = ("state,region,county,fips\n"
+               "Michigan,Metro,Oakland,\n"
+               "Michigan,Metro,,26163\n"
+               "Michigan,District,Wayne,\n"
+               "Michigan,District,Kent,\n"
+               "Michigan,District,Unassigned,\n"
+               "Ohio,Columbus,Franklin,39049\n"
+               "Ohio,Columbus,,39041\n"
+               "Ohio,Columbus,,26081\n"
+               ",Nowhere,Kent,\n")
+
+
+class RegionDefinitionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.matrix = SeriesMatrix.from_frame(
+            pd.read_csv(io.StringIO(FIXTURE)))
+        self.regions = RegionDefinitions.from_dict(REGIONS)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_from_dict(self):
+        self.assertEqual(self.regions.regions, [
+            Region("Michigan", "Metro", ["Oakland", "Wayne"]),
+            Region("Michigan", "District", [26163, "Kent", "Unassigned"]),
+            Region("Ohio", "Columbus", [39049, 39041, 26081]),
+        ])
+
+    def test_replace(self):
+        regions = self.regions + RegionDefinitions.from_dict(
+            {"Michigan": {"Metro": ["Kent"]}})
+
+        self.assertEqual(len(regions), 3)
+        self.assertEqual(regions.regions[0],
+                         Region("Michigan", "Metro", ["Kent"]))
+
+    def test_compile(self):
+        region_map = self.regions.compile(self.matrix)
+
+        self.assertEqual(region_map.regions, [("Michigan", "Metro"),
+                                              ("Michigan", "District"),
+                                              ("Ohio", "Columbus")])
+
+        # Wayne is in two regions, so they are in separate layers, and every
+        # county is in each layer at most once
+        layers = [ids.tolist()
+                  for ids in region_map.get_row_regions(self.matrix)]
+        metro, district, columbus = 0, 1, 2
+
+        self.assertEqual(layers, [
+            [columbus, metro, metro, NO_REGION, columbus, columbus],
+            [district, NO_REGION, district, district, NO_REGION, NO_REGION],
+        ])
+
+        for codes, _ in region_map.layers:
+            self.assertEqual(codes.tolist(), sorted(set(codes.tolist())))
+
+    def test_index(self):
+        index = AggregateIndex(self.matrix, self.regions)
+
+        self.assertEqual(sorted(index.get_regions("US", "Michigan")),
+                         ["District", "Metro"])
+        self.assertEqual(
+            index.get_values(Location("US", "Michigan", "Metro")).tolist(),
+            [110, 220])
+        self.assertEqual(
+            index.get_values(Location("US", "Michigan", "District")).tolist(),
+            [1101, 2202])
+        self.assertEqual(
+            sorted(index.get_counties("US", "Michigan", "District")),
+            ["Kent", "Unassigned", "Wayne"])
+
+        # The county of Michigan given by its FIPS code is left out of Ohio
+        self.assertEqual(
+            index.get_values(Location("US", "Ohio", "Columbus")).tolist(),
+            [12, 12])
+        self.assertEqual(index.get_count(Location("US", "Ohio", "Columbus")),
+                         2)
+
+        # Overlapping regions do not change the totals of the state
+        np.testing.assert_array_equal(
+            index.get_values(Location("US", "Michigan")), [1111, 2222])
+
+    def test_load_json(self):
+        path = self._write("regions.json", '{"Michigan": {"Metro": '
+                                           '["Oakland", 26163]}}')
+
+        self.assertEqual(RegionDefinitions.load(path).regions,
+                         [Region("Michigan", "Metro", ["Oakland", 26163])])
+
+    def test_load_csv(self):
+        path = self._write("regions.csv", CSV_REGIONS)
+        regions = RegionDefinitions.load(path)
+
+        # Rows without a state are skipped
+        self.assertEqual(len(regions), 3)
+
+        layers = regions.compile(self.matrix).get_row_regions(self.matrix)
+        expected = self.regions.compile(self.matrix) \
+            .get_row_regions(self.matrix)
+
+        self.assertEqual([ids.tolist() for ids in layers],
+                         [ids.tolist() for ids in expected])
+
+    def test_load_invalid(self):
+        for name, text in [("regions.csv", "state,county\nOhio,Franklin\n"),
+                           ("regions.txt", "")]:
+            with self.assertRaises(ValueError):
+                RegionDefinitions.load(self._write(name, text))
+
+    def _write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+
+        with open(path, "w") as f:
+            f.write(text)
+
+        return path
+
+
+if __name__ == "__main__":
+    unittest.main()
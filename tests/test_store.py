@@ -0,0 +1,158 @@
+"""
+Series Store Tests
+==================
+
+Tests of :mod:`covid19plotter.data.store`, writing the index of a small
+fixture CSV file to a store in a temporary directory and reading it back
+memory-mapped, including saving new generations while an older one is open.
+"""
+
+import glob
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from covid19plotter.data.aggregates import AggregateIndex
+from covid19plotter.data.aggregates import COUNTRY_LEVEL
+from covid19plotter.data.aggregates import Location
+from covid19plotter.data.aggregates import STATE_LEVEL
+from covid19plotter.data.matrix import SeriesMatrix
+from covid19plotter.data.store import SeriesStore
+
+KEY = ("confirmed", "global")
+
+FIXTURE = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20,1/24/20\n"
+           ",Afghanistan,33.0,65.0,0,1,1\n"
+           "Ontario,Canada,51.2,-85.3,2,3,5\n"
+           "Quebec,Canada,52.9,-73.5,1,1,4\n"
+           "Hubei,China,30.9,112.2,444,444,549\n")
+
+# The same file a day later
+NEXT_DAY = ("Province/State,Country/Region,Lat,Long,1/22/20,1/23/20,1/24/20,"
+            "1/25/20\n"
+            ",Afghanistan,33.0,65.0,0,1,1,2\n"
+            "Ontario,Canada,51.2,-85.3,2,3,5,8\n"
+            "Quebec,Canada,52.9,-73.5,1,1,4,4\n"
+            "Hubei,China,30.9,112.2,444,444,549,761\n")
+
+
+class SeriesStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = SeriesStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_same_index(self, index, expected):
+        self.assertEqual(index.labels.tolist(), expected.labels.tolist())
+
+        for level in [COUNTRY_LEVEL, STATE_LEVEL]:
+            locations = expected.get_locations(level)
+            self.assertEqual(index.get_locations(level), locations)
+
+            for location in locations:
+                self.assertEqual(index.get_values(location).tolist(),
+                                 expected.get_values(location).tolist())
+
+        for daily in [False, True]:
+            self.assertEqual(index.stats.get_starting_days(daily).tolist(),
+                             expected.stats.get_starting_days(daily).tolist())
+
+        np.testing.assert_array_equal(index.stats.get_daily(),
+                                      expected.stats.get_daily())
+
+    def test_round_trip(self):
+        index = _build_index(FIXTURE)
+        self.store.save(KEY, index)
+
+        loaded = self.store.load(KEY)
+        self.assert_same_index(loaded, index)
+
+        # The matrices are mapped read-only rather than read into memory
+        self.assertIsInstance(loaded.stats.totals, np.memmap)
+        self.assertFalse(loaded.stats.totals.flags.writeable)
+        self.assertEqual(
+            loaded.get_values(Location("Canada")).tolist(), [3, 4, 9])
+
+    def test_missing(self):
+        self.assertIsNone(self.store.load(KEY))
+        self.assertEqual(self.store.load_all([KEY]), {})
+
+    def test_version(self):
+        self.store.save(KEY, _build_index(FIXTURE))
+        path = self._get_json_path()
+
+        with open(path) as f:
+            parts = json.load(f)
+
+        parts["version"] = 0
+
+        with open(path, "w") as f:
+            json.dump(parts, f)
+
+        self.assertIsNone(self.store.load(KEY))
+
+    def test_generations(self):
+        self.store.save(KEY, _build_index(FIXTURE))
+        old = self.store.load(KEY)
+        old_files = self._get_matrix_files()
+
+        new_index = _build_index(NEXT_DAY)
+        self.store.save(KEY, new_index)
+        new_files = self._get_matrix_files()
+
+        # Only the files of the latest save are left
+        self.assertEqual(len(new_files), len(old_files))
+        self.assertFalse(set(old_files) & set(new_files))
+
+        # The index that was already open keeps reading the old matrices
+        self.assert_same_index(old, _build_index(FIXTURE))
+        self.assert_same_index(self.store.load(KEY), new_index)
+
+    def test_saved_while_loading(self):
+        self.store.save(KEY, _build_index(FIXTURE))
+
+        with open(self._get_json_path()) as f:
+            old_parts = json.load(f)
+
+        new_index = _build_index(NEXT_DAY)
+        self.store.save(KEY, new_index)
+
+        with open(self._get_json_path()) as f:
+            new_parts = json.load(f)
+
+        # The JSON file is read just before the save removes the matrices it
+        # refers to, so the store is read again
+        with mock.patch("json.load", side_effect=[old_parts, new_parts]):
+            self.assert_same_index(self.store.load(KEY), new_index)
+
+    def test_missing_generation(self):
+        self.store.save(KEY, _build_index(FIXTURE))
+
+        for path in self._get_matrix_files():
+            os.remove(path)
+
+        self.assertIsNone(self.store.load(KEY))
+
+    def _get_json_path(self):
+        return os.path.join(self.directory.name, "%s_%s.json" % KEY)
+
+    def _get_matrix_files(self):
+        return sorted(glob.glob(os.path.join(self.directory.name, "*.npy")))
+
+
+def _build_index(text):
+    return AggregateIndex(SeriesMatrix.from_frame(
+        pd.read_csv(io.StringIO(text))))
+
+
+if __name__ == "__main__":
+    unittest.main()